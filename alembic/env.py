@@ -26,6 +26,7 @@ sys.path.append(os.getcwd())
 # 2. 导入你的 Base 和所有模型
 from app.db.base import Base
 from app.models.product import Product
+from app.models.product_stats import ProductStats
 from app.models.user import User
 from app.models.audit import AuditLog
 from app.models.feature import FeatureFlag
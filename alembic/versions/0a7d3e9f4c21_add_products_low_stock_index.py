@@ -0,0 +1,34 @@
+"""add products low stock partial index
+
+Revision ID: 0a7d3e9f4c21
+Revises: f3c8a1d5b902
+Create Date: 2026-10-18 21:10:03.671845
+
+低库存提醒任务用的部分索引，只包含 stock_qty < 10 的商品
+任务里的阈值 (LOW_STOCK_THRESHOLD) 不超过 10 时，PG 能推出查询条件蕴含索引条件，直接用这个小索引
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7d3e9f4c21'
+down_revision: Union[str, Sequence[str], None] = 'f3c8a1d5b902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 大表上用 CONCURRENTLY 避免锁表
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_low_stock', 'products', ['owner_id', 'id'], unique=False,
+                        postgresql_where=sa.text('stock_qty < 10'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_low_stock', table_name='products', postgresql_concurrently=True)
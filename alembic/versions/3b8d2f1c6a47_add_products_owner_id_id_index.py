@@ -0,0 +1,32 @@
+"""add products owner_id id index
+
+Revision ID: 3b8d2f1c6a47
+Revises: f99ccd52ac2f
+Create Date: 2026-10-18 10:12:41.203518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8d2f1c6a47'
+down_revision: Union[str, Sequence[str], None] = 'f99ccd52ac2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 游标分页用的复合索引，大表上用 CONCURRENTLY 避免锁表
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_owner_id_id', 'products', ['owner_id', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_owner_id_id', table_name='products', postgresql_concurrently=True)
@@ -0,0 +1,53 @@
+"""add audit_logs action index
+
+Revision ID: 5f1b9c3e7a82
+Revises: 0a7d3e9f4c21
+Create Date: 2026-10-18 22:41:37.205318
+
+管理后台按操作类型 (action) 查询审计日志用的索引，排序和游标分页同样走 (created_at, id)
+分区表的父表不支持 CREATE INDEX CONCURRENTLY，直接在父表上建会锁住所有分区的写入，所以分三步:
+1. CREATE INDEX ... ON ONLY audit_logs 只建父表上的索引 (不扫数据，此时是 invalid)
+2. 每个分区单独 CREATE INDEX CONCURRENTLY，不阻塞写入
+3. ALTER INDEX ... ATTACH PARTITION 挂到父表索引上，全部挂完后父表索引自动变成 valid
+之后新建的分区会自动带上这个索引
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1b9c3e7a82'
+down_revision: Union[str, Sequence[str], None] = '0a7d3e9f4c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEX = 'ix_audit_logs_action_created_at'
+COLUMNS = '(action, created_at, id)'
+
+
+def _partitions() -> list[str]:
+    return list(op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'audit_logs' ORDER BY c.relname"
+    )).scalars())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(f'CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY audit_logs {COLUMNS}')
+    partitions = _partitions()
+    # CONCURRENTLY 不能在事务里执行；中途失败留下的 invalid 索引要先手动删掉再重跑
+    with op.get_context().autocommit_block():
+        for name in partitions:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{name}_action_created_at ON {name} {COLUMNS}')
+    for name in partitions:
+        op.execute(f'ALTER INDEX {INDEX} ATTACH PARTITION ix_{name}_action_created_at')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 删父表索引会连同挂在上面的分区索引一起删掉
+    op.drop_index('ix_audit_logs_action_created_at', table_name='audit_logs')
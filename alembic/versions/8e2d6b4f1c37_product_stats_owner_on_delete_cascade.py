@@ -0,0 +1,33 @@
+"""product_stats owner_id on delete cascade
+
+Revision ID: 8e2d6b4f1c37
+Revises: 5f1b9c3e7a82
+Create Date: 2026-10-18 20:31:08.514270
+
+product_stats.owner_id 的外键没有 ON DELETE，有汇总行的用户删不掉；改成 CASCADE，汇总行跟着用户一起删
+product_stats 每个用户只有一行，重建外键的校验很快
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2d6b4f1c37'
+down_revision: Union[str, Sequence[str], None] = '5f1b9c3e7a82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('product_stats_owner_id_fkey', 'product_stats', type_='foreignkey')
+    op.create_foreign_key('product_stats_owner_id_fkey', 'product_stats', 'users', ['owner_id'], ['id'],
+                          ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('product_stats_owner_id_fkey', 'product_stats', type_='foreignkey')
+    op.create_foreign_key('product_stats_owner_id_fkey', 'product_stats', 'users', ['owner_id'], ['id'])
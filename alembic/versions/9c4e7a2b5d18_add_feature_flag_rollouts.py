@@ -0,0 +1,34 @@
+"""add feature flag rollouts
+
+Revision ID: 9c4e7a2b5d18
+Revises: 3b8d2f1c6a47
+Create Date: 2026-10-18 13:05:17.482911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e7a2b5d18'
+down_revision: Union[str, Sequence[str], None] = '3b8d2f1c6a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('feature_flags', sa.Column('rollout_percentage', sa.Integer(), server_default='0', nullable=False,
+                                             comment='灰度百分比 0-100'))
+    op.add_column('feature_flags', sa.Column('allow_user_ids', sa.JSON(), nullable=True, comment='白名单用户ID列表'))
+    op.add_column('feature_flags', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'),
+                                             nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('feature_flags', 'updated_at')
+    op.drop_column('feature_flags', 'allow_user_ids')
+    op.drop_column('feature_flags', 'rollout_percentage')
@@ -0,0 +1,119 @@
+"""partition audit_logs by month
+
+Revision ID: c71f0e9a3d25
+Revises: 9c4e7a2b5d18
+Create Date: 2026-10-18 14:21:08.936120
+
+audit_logs 改为按 created_at 每月一个分区的分区表
+之前 audit_logs 是启动时 create_all 建的 (没有迁移脚本)，如果已经存在，
+先改名为 audit_logs_legacy，数据搬到新表后删除
+后续月份的分区由 AuditPartitionService (启动时 + 每日定时任务) 自动创建
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71f0e9a3d25'
+down_revision: Union[str, Sequence[str], None] = '9c4e7a2b5d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 迁移时提前建好未来几个月的分区
+MONTHS_AHEAD = 3
+
+
+def _add_months(d: date, months: int) -> date:
+    year, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + year, month + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    has_legacy = sa.inspect(conn).has_table('audit_logs')
+    if has_legacy:
+        op.rename_table('audit_logs', 'audit_logs_legacy')
+        # 旧表的主键、序列、索引名会跟新表冲突
+        op.execute('ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_pkey TO audit_logs_legacy_pkey')
+        op.execute('ALTER SEQUENCE IF EXISTS audit_logs_id_seq RENAME TO audit_logs_legacy_id_seq')
+        op.execute('DROP INDEX IF EXISTS ix_audit_logs_id')
+        op.execute('DROP INDEX IF EXISTS ix_audit_logs_user_id')
+
+    op.create_table('audit_logs',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=50), nullable=False, comment='CREATE/UPDATE/DELETE'),
+    sa.Column('target_resource', sa.String(length=50), nullable=False, comment='User/Product'),
+    sa.Column('target_id', sa.String(length=50), nullable=False, comment='被操作对象的ID'),
+    sa.Column('details', sa.JSON(), nullable=True, comment='修改前后的快照'),
+    sa.Column('ip_address', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('ix_audit_logs_created_at_id', 'audit_logs', ['created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_user_id_created_at', 'audit_logs', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_resource_created_at', 'audit_logs',
+                    ['target_resource', 'target_id', 'created_at', 'id'], unique=False)
+
+    # 分区范围: 旧数据最早的月份 (没有旧数据就是当前月) 到未来 MONTHS_AHEAD 个月
+    today = datetime.now(timezone.utc).date().replace(day=1)
+    first = today
+    if has_legacy:
+        oldest = conn.execute(sa.text('SELECT min(created_at) FROM audit_logs_legacy')).scalar()
+        if oldest is not None:
+            first = min(first, oldest.astimezone(timezone.utc).date().replace(day=1))
+
+    month = first
+    while month <= _add_months(today, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS audit_logs_y{month.year}m{month.month:02d} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{upper} 00:00:00+00')"
+        )
+        month = upper
+
+    if has_legacy:
+        op.execute(
+            'INSERT INTO audit_logs (id, user_id, action, target_resource, target_id, details, ip_address, created_at) '
+            'SELECT id, user_id, action, target_resource, target_id, details, ip_address, coalesce(created_at, now()) '
+            'FROM audit_logs_legacy'
+        )
+        op.execute("SELECT setval('audit_logs_id_seq', (SELECT coalesce(max(id), 0) + 1 FROM audit_logs), false)")
+        op.drop_table('audit_logs_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 恢复成升级前 (create_all 建的) 不分区的表，数据搬回去
+    op.rename_table('audit_logs', 'audit_logs_partitioned')
+    op.execute('ALTER TABLE audit_logs_partitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_partitioned_pkey')
+    op.execute('ALTER SEQUENCE audit_logs_id_seq RENAME TO audit_logs_partitioned_id_seq')
+
+    op.create_table('audit_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=50), nullable=False, comment='CREATE/UPDATE/DELETE'),
+    sa.Column('target_resource', sa.String(length=50), nullable=False, comment='User/Product'),
+    sa.Column('target_id', sa.String(length=50), nullable=False, comment='被操作对象的ID'),
+    sa.Column('details', sa.JSON(), nullable=True, comment='修改前后的快照'),
+    sa.Column('ip_address', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_logs_id', 'audit_logs', ['id'], unique=False)
+    op.create_index('ix_audit_logs_user_id', 'audit_logs', ['user_id'], unique=False)
+
+    # 旧表的 id 是 integer，超出范围时这里会报错中止，不会丢数据
+    op.execute(
+        'INSERT INTO audit_logs (id, user_id, action, target_resource, target_id, details, ip_address, created_at) '
+        'SELECT id, user_id, action, target_resource, target_id, details, ip_address, created_at '
+        'FROM audit_logs_partitioned'
+    )
+    op.execute("SELECT setval('audit_logs_id_seq', (SELECT coalesce(max(id), 0) + 1 FROM audit_logs), false)")
+    # 分区、索引和序列随父表一起删除
+    op.drop_table('audit_logs_partitioned')
@@ -0,0 +1,101 @@
+"""add products full-text and trigram search
+
+Revision ID: d4a9c2e7f813
+Revises: c71f0e9a3d25
+Create Date: 2026-10-18 19:32:10.482105
+
+products.search_vector: 标题 (A) + SEO 关键词 (B) + 描述 (C) 的 tsvector，由触发器维护
+没有用 GENERATED ALWAYS AS ... STORED 生成列: 给已有的表加生成列要在排它锁下重写整张表，
+普通的可空列是瞬间完成的，存量数据再分批回填
+所有索引都用 CONCURRENTLY 创建，可以在线上直接执行
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9c2e7f813'
+down_revision: Union[str, Sequence[str], None] = 'c71f0e9a3d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 回填时每批更新多少个 id
+BACKFILL_BATCH = 5000
+
+# 和 app.services.product_search.SEARCH_CONFIG 保持一致
+SEARCH_DOCUMENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_document(
+    title text, seo_keywords text, description_ai text, description_original text
+) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(seo_keywords, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(description_ai, '') || ' ' || coalesce(description_original, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE
+"""
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := products_search_document(
+        NEW.title, NEW.seo_keywords, NEW.description_ai, NEW.description_original
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGER = """
+CREATE TRIGGER products_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, seo_keywords, description_ai, description_original ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('products', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True,
+                                        comment="全文检索向量 (触发器维护)"))
+    op.execute(SEARCH_DOCUMENT_FUNCTION)
+    op.execute(TRIGGER_FUNCTION)
+    op.execute(TRIGGER)
+
+    with op.get_context().autocommit_block():
+        # 按 id 区间分批回填，每批单独提交，不会长时间锁住大量行
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text("SELECT max(id) FROM products")).scalar() or 0
+        for start in range(0, max_id + 1, BACKFILL_BATCH):
+            conn.execute(
+                sa.text(
+                    "UPDATE products SET search_vector = products_search_document("
+                    "title, seo_keywords, description_ai, description_original) "
+                    "WHERE id >= :start AND id < :end AND search_vector IS NULL"
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH},
+            )
+
+        op.create_index('ix_products_search_vector', 'products', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_products_title_trgm', 'products', ['title'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+        op.create_index('ix_products_sku_trgm', 'products', ['sku'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'sku': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_sku_trgm', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_title_trgm', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_search_vector', table_name='products', postgresql_concurrently=True)
+
+    op.execute("DROP TRIGGER IF EXISTS products_search_vector_update ON products")
+    op.execute("DROP FUNCTION IF EXISTS products_search_vector_update()")
+    op.execute("DROP FUNCTION IF EXISTS products_search_document(text, text, text, text)")
+    op.drop_column('products', 'search_vector')
+    # pg_trgm 扩展保留 (可能被其它表用到)
@@ -0,0 +1,43 @@
+"""add products list filter indexes
+
+Revision ID: e8b1f4c92a60
+Revises: d4a9c2e7f813
+Create Date: 2026-10-18 20:05:44.120937
+
+产品列表按 status / 价格 / 更新时间 / 标题过滤和排序用的索引
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b1f4c92a60'
+down_revision: Union[str, Sequence[str], None] = 'd4a9c2e7f813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_products_owner_id_status_updated_at', ['owner_id', 'status', 'updated_at'], None),
+    ('ix_products_owner_id_price_id', ['owner_id', 'price', 'id'], None),
+    ('ix_products_owner_id_updated_at_id', ['owner_id', 'updated_at', 'id'], None),
+    ('ix_products_owner_id_title_id', ['owner_id', 'title', 'id'], None),
+    ('ix_products_owner_id_id_not_optimized', ['owner_id', 'id'], 'is_ai_optimized = false'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 大表上用 CONCURRENTLY 避免锁表
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(name, 'products', columns, unique=False, postgresql_concurrently=True,
+                            postgresql_where=sa.text(where) if where else None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products', postgresql_concurrently=True)
@@ -0,0 +1,121 @@
+"""add product_stats summary table
+
+Revision ID: f3c8a1d5b902
+Revises: e8b1f4c92a60
+Create Date: 2026-10-18 20:41:27.553016
+
+product_stats: 每个用户一行的库存统计，由 products 上的语句级触发器增量维护
+- 触发器用 transition table (REFERENCING NEW/OLD TABLE)，每条 SQL 只按用户聚合一次增量再 upsert，
+  批量插入 5000 行也只写一次汇总行，不是 5000 次
+- INSERT ... ON CONFLICT DO UPDATE (导入) 会分别触发 INSERT 和 UPDATE 的语句级触发器，两部分都能算到
+- 多个用户的汇总行按 owner_id 顺序 upsert，并发的批量写入加锁顺序一致，不会死锁
+建触发器和回填在同一个事务里: 建触发器时会短暂阻塞 products 的写入，直到回填完成，回填结果和触发器不会错开
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d5b902'
+down_revision: Union[str, Sequence[str], None] = 'e8b1f4c92a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 和 app.services.product_stats.STAT_EXPRESSIONS 保持一致
+STAT_EXPRESSIONS = {
+    "product_count": "1",
+    "total_stock": "stock_qty",
+    "stock_value": "price::numeric * stock_qty",
+    "stock_cost": "supplier_cost::numeric * stock_qty",
+    "margin_sum": "price::numeric - supplier_cost::numeric",
+    "draft_count": "(status = 'draft')::int",
+    "published_count": "(status = 'published')::int",
+    "archived_count": "(status = 'archived')::int",
+    "ai_optimized_count": "is_ai_optimized::int",
+    "out_of_stock_count": "(stock_qty <= 0)::int",
+}
+COLUMNS = ", ".join(STAT_EXPRESSIONS)
+
+
+def _delta_sql(sources: list[tuple[str, int]]) -> str:
+    """把 transition table 里的行按用户聚合成增量，合并进 product_stats (增量全为 0 的用户跳过)"""
+    rows = " UNION ALL ".join(
+        f"SELECT owner_id, {', '.join(f'{sign} * ({expr}) AS {name}' for name, expr in STAT_EXPRESSIONS.items())} "
+        f"FROM {table}"
+        for table, sign in sources
+    )
+    return f"""
+        INSERT INTO product_stats AS s (owner_id, {COLUMNS}, updated_at)
+        SELECT owner_id, {', '.join(f'sum({name})' for name in STAT_EXPRESSIONS)}, now()
+        FROM ({rows}) AS d
+        GROUP BY owner_id
+        HAVING {' OR '.join(f'sum({name}) <> 0' for name in STAT_EXPRESSIONS)}
+        ORDER BY owner_id
+        ON CONFLICT (owner_id) DO UPDATE SET
+            {', '.join(f'{name} = s.{name} + EXCLUDED.{name}' for name in STAT_EXPRESSIONS)},
+            updated_at = EXCLUDED.updated_at;
+    """
+
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION product_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_delta_sql([("new_rows", 1)])}
+    ELSIF TG_OP = 'UPDATE' THEN
+        {_delta_sql([("new_rows", 1), ("old_rows", -1)])}
+    ELSE
+        {_delta_sql([("old_rows", -1)])}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = {
+    "product_stats_insert": "AFTER INSERT ON products REFERENCING NEW TABLE AS new_rows",
+    "product_stats_update": "AFTER UPDATE ON products REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "product_stats_delete": "AFTER DELETE ON products REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    zero = sa.text("0")
+    op.create_table(
+        'product_stats',
+        sa.Column('owner_id', sa.Integer(), nullable=False, comment='所属用户ID'),
+        sa.Column('product_count', sa.BigInteger(), server_default=zero, nullable=False, comment='商品数'),
+        sa.Column('total_stock', sa.BigInteger(), server_default=zero, nullable=False, comment='库存总数'),
+        sa.Column('stock_value', sa.Numeric(), server_default=zero, nullable=False,
+                  comment='库存货值 sum(price * stock_qty)'),
+        sa.Column('stock_cost', sa.Numeric(), server_default=zero, nullable=False,
+                  comment='库存成本 sum(supplier_cost * stock_qty)'),
+        sa.Column('margin_sum', sa.Numeric(), server_default=zero, nullable=False,
+                  comment='毛利合计 sum(price - supplier_cost)，除以商品数得平均毛利'),
+        sa.Column('draft_count', sa.Integer(), server_default=zero, nullable=False),
+        sa.Column('published_count', sa.Integer(), server_default=zero, nullable=False),
+        sa.Column('archived_count', sa.Integer(), server_default=zero, nullable=False),
+        sa.Column('ai_optimized_count', sa.Integer(), server_default=zero, nullable=False),
+        sa.Column('out_of_stock_count', sa.Integer(), server_default=zero, nullable=False, comment='stock_qty <= 0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('owner_id'),
+    )
+
+    op.execute(TRIGGER_FUNCTION)
+    for name, definition in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {definition} FOR EACH STATEMENT EXECUTE FUNCTION product_stats_apply()")
+
+    actual = ", ".join(f"coalesce(sum({expr}), 0)" for expr in STAT_EXPRESSIONS.values())
+    op.execute(f"INSERT INTO product_stats (owner_id, {COLUMNS}) SELECT owner_id, {actual} FROM products GROUP BY owner_id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON products")
+    op.execute("DROP FUNCTION IF EXISTS product_stats_apply()")
+    op.drop_table('product_stats')
@@ -1,39 +1,95 @@
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.core import security
 from app.core.config import settings
+from app.db.replica import replica_router
 from app.db.session import get_db
 from app.models.user import User
+from app.schemas.user import UserPrincipal
+from app.services.user_cache import PrincipalCache
 
 # 定义 Token 获取路径 (Swagger UI 会用这个地址去登录)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
 
 
+# 不会修改数据的请求方法
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
 async def get_current_user(
+        request: Request,
         db: AsyncSession = Depends(get_db),
         token: str = Depends(oauth2_scheme)
-) -> User:
+) -> UserPrincipal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        # 同一个 token 只校验一次签名，之后直接读缓存
+        payload = security.decode_access_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    # 从数据库查找用户
+    # 先查缓存，命中时不查数据库
+    principal = await PrincipalCache.get(email)
+    if principal is None:
+        principal = await _load_principal(db, email)
+        if principal is None:
+            raise credentials_exception
+
+    # 被禁用的用户: 禁用时会清除缓存 (见 PrincipalCache)，这里拿到的是最新状态
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+
+    # 写请求: 接下来一段时间内这个用户的读请求都走主库 (read-your-writes)
+    if request.method not in SAFE_METHODS:
+        await replica_router.mark_write(principal.id)
+    return principal
+
+
+async def _load_principal(db: AsyncSession, email: str) -> Optional[UserPrincipal]:
+    # 从数据库查找用户 (走主库: 刚被禁用的用户不能因为副本延迟还能登录)
     result = await db.execute(select(User).filter(User.email == email))
     user = result.scalars().first()
-
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        return None
+
+    principal = UserPrincipal.model_validate(user)
+    await PrincipalCache.set(principal)
+    return principal
+
+
+async def get_read_db(
+        current_user: UserPrincipal = Depends(get_current_user)
+):
+    """只读接口用的会话: 配置了只读副本时分摊到副本上，否则和 get_db 一样走主库"""
+    session_factory = await replica_router.session_factory_for(current_user.id)
+    async with session_factory() as session:
+        yield session
+
+
+async def get_current_active_superuser(
+        current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="The user doesn't have enough privileges")
+    return current_user
+
+
+def get_client_ip(request: Request) -> Optional[str]:
+    """客户端真实 IP: 在代理后面时 (TRUST_PROXY_HEADERS) 取 X-Forwarded-For 的第一个地址"""
+    if settings.TRUST_PROXY_HEADERS:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else None
\ No newline at end of file
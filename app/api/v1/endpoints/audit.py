@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.api import deps
+from app.core.pagination import encode_cursor, decode_cursor
+from app.db.session import get_db
+from app.models.audit import AuditLog
+from app.schemas.audit import AuditLogResponse
+from app.schemas.user import UserPrincipal
+
+router = APIRouter()
+
+
+# 查询审计日志 (仅超级管理员)
+# 按时间倒序，游标分页 (下一页游标在响应头 X-Next-Cursor 里)
+# 带上 since / until 时 PG 只扫描对应月份的分区
+@router.get("/", response_model=List[AuditLogResponse])
+async def read_audit_logs(
+        response: Response,
+        user_id: Optional[int] = None,
+        resource: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: UserPrincipal = Depends(deps.get_current_active_superuser)
+):
+    query = select(AuditLog)
+    if user_id is not None:
+        query = query.filter(AuditLog.user_id == user_id)
+    if resource:
+        query = query.filter(AuditLog.target_resource == resource)
+    if resource_id:
+        query = query.filter(AuditLog.target_id == resource_id)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if since:
+        query = query.filter(AuditLog.created_at >= since)
+    if until:
+        query = query.filter(AuditLog.created_at < until)
+
+    if cursor:
+        try:
+            payload = decode_cursor(cursor)
+            last = (datetime.fromisoformat(payload["t"]), int(payload["id"]))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(AuditLog.created_at, AuditLog.id) < last)
+
+    query = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit)
+    result = await db.execute(query)
+    logs = result.scalars().all()
+
+    if logs and len(logs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor({"t": logs[-1].created_at.isoformat(), "id": logs[-1].id})
+    return logs
@@ -6,6 +6,7 @@ from app.core.config import settings
 from app.db.session import get_db
 from app.models.user import User
 from app.core.logger import logger
+from app.services.user_cache import PrincipalCache
 
 router = APIRouter()
 
@@ -46,5 +47,6 @@ async def stripe_webhook(
                 # 这里简单处理，实际应根据 plan 计算时间
                 # user.vip_expire_at = datetime.now() + timedelta(days=30)
                 await db.commit()
+                await PrincipalCache.invalidate(user.email)
 
     return {"status": "success"}
\ No newline at end of file
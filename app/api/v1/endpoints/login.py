@@ -10,7 +10,7 @@ from app.core import security
 from app.core.config import settings
 from app.db.session import get_db
 from app.models.user import User
-from app.schemas.user import Token, UserCreate, UserResponse
+from app.schemas.user import Token, UserCreate, UserResponse, UserPrincipal
 
 router = APIRouter()
 
@@ -28,13 +28,21 @@ async def login_access_token(
     result = await db.execute(select(User).filter(User.email == form_data.username))
     user = result.scalars().first()
 
-    # 校验密码
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    # 校验密码 (bcrypt 在线程池里跑，不阻塞事件循环)
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    verified, new_hash = await security.verify_and_update_password(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
+    # bcrypt 成本参数调整过，顺便用新参数重新保存密码
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     # 生成 Token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
@@ -61,7 +69,7 @@ async def create_user(
     # 创建新用户
     user = User(
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password),
+        hashed_password=await security.get_password_hash_async(user_in.password),
         full_name=user_in.full_name,
     )
     db.add(user)
@@ -73,6 +81,6 @@ async def create_user(
 # 3. 测试接口：获取当前用户信息 (需要登录)
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
-        current_user: User = Depends(deps.get_current_user),
+        current_user: UserPrincipal = Depends(deps.get_current_user),
 ) -> Any:
     return current_user
\ No newline at end of file
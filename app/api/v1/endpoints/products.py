@@ -1,44 +1,92 @@
-from typing import List, Any
+from typing import List, Any, Optional, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import update, delete
 
 from app.api import deps
+from app.core.pagination import decode_cursor
+from app.core.profiling import query_budget
+from app.db.redis import redis_client
+from app.db.replica import replica_router
 from app.db.session import get_db
 from app.models.product import Product
-from app.models.user import User
-from app.schemas.product import ProductCreate, ProductResponse
+from app.schemas.user import UserPrincipal
+from app.schemas.product import (
+    ProductCreate, ProductResponse, ProductUpdate, ProductBulkRequest, ProductBulkResponse, ProductSearchHit,
+    ProductListFilter, ProductStatsResponse,
+)
 from app.services.audit import AuditService
 from app.services.data_processing import DataService
-
-# 如果你有定义 ProductUpdate Schema，也可以引入，这里暂时用 ProductCreate 代替或新建一个
+from app.services.import_job import ImportJobService
+from app.services.product_bulk import NOT_NULL_FIELDS, ProductBulkService
+from app.services.product_cache import ProductCache
+from app.services.product_import import ProductImportService
+from app.services.product_list import ProductListService
+from app.services.product_search import ProductSearchService
+from app.services.product_stats import ProductStatsService
+from app.workers.tasks import import_products_task
 
 router = APIRouter()
 
+# query_budget: 每个接口最多执行的 SQL 条数 (包括用户缓存未命中时 get_current_user 的那一条)，
+# 超出说明出现了 N+1 或多余的查询
+
 
 # 1. 获取产品列表 (只返回当前用户的产品)
-@router.get("/", response_model=List[ProductResponse])
+# 支持两种分页方式:
+#   - skip/limit: 旧的 OFFSET 分页，保留兼容，但翻到深页时 PG 要扫描并丢弃前面所有行
+#   - cursor: 游标分页，按 (owner_id, 排序字段, id) 索引直接定位，任意深度的页耗时都一样
+# 过滤: status / price_min / price_max / stock_lt / is_ai_optimized / updated_since
+# 排序: sort=price / -price / updated_at / -updated_at / title / -title / id (默认)，游标只能用于发出它的排序
+# 下一页游标放在响应头 X-Next-Cursor 里 (没有下一页时不返回)，响应体仍是产品列表
+# 结果按页缓存在 Redis 里 (ProductCache)，该用户的产品有任何变更都会整体失效
+@router.get("/", response_model=List[ProductResponse], dependencies=[Depends(query_budget(2))])
 async def read_products(
+        response: Response,
         skip: int = 0,
         limit: int = 10,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)  # <--- 必须登录
+        cursor: Optional[str] = None,
+        filters: ProductListFilter = Depends(),
+        db: AsyncSession = Depends(deps.get_read_db),  # 只读，可以走副本
+        current_user: UserPrincipal = Depends(deps.get_current_user)  # <--- 必须登录
 ):
-    # 核心逻辑：增加 .filter(Product.owner_id == current_user.id)
-    query = select(Product).filter(Product.owner_id == current_user.id).offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+            query = ProductListService.build_query(current_user.id, filters, after)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        query = ProductListService.build_query(current_user.id, filters).offset(skip)
+    page_key = ProductListService.page_key(filters, after, skip, limit)
+
+    async def load_page():
+        result = await db.execute(query.limit(limit))
+        products = result.scalars().all()
+        next_cursor = None
+        if products and len(products) == limit:
+            next_cursor = ProductListService.next_cursor(products[-1], filters.sort)
+        return {
+            "items": [ProductResponse.model_validate(p).model_dump(mode="json") for p in products],
+            "next_cursor": next_cursor,
+        }
+
+    page = await ProductCache.get_or_load(current_user.id, page_key, load_page)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
 
 
 # 2. 创建产品 (自动绑定当前用户)
-@router.post("/", response_model=ProductResponse)
+@router.post("/", response_model=ProductResponse, dependencies=[Depends(query_budget(3))])
 async def create_product(
         item: ProductCreate,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
     # 将 Pydantic 对象转为字典，并额外注入 owner_id
     product_data = item.model_dump()
@@ -47,139 +95,243 @@ async def create_product(
     db.add(new_product)
     await db.commit()
     await db.refresh(new_product)
+    await ProductCache.invalidate(current_user.id)
 
-    # 这里可以继续加 Celery 任务触发 AI
-    # generate_ai_content_task.delay(new_product.id, new_product.title)
+    # 新商品 is_ai_optimized = False，由定时任务 generate_ai_content 分批生成 AI 文案
 
     return new_product
 
 
-# 3. 获取单个产品详情 (需校验权限)
-@router.get("/{product_id}", response_model=ProductResponse)
-async def read_product(
-        product_id: int,
+# 2.1 批量增删改 (一次最多 5000 个操作)
+# allow_partial=False (默认): 全部成功才提交，否则整批不写入并返回 422
+# allow_partial=True: 失败的项跳过，其余照常提交
+# 响应里 results 和 operations 一一对应
+@router.post("/bulk", response_model=ProductBulkResponse)
+async def bulk_products(
+        body: ProductBulkRequest,
+        response: Response,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: UserPrincipal = Depends(deps.get_current_user),
+        client_ip: Optional[str] = Depends(deps.get_client_ip)
+):
+    result, audit = await ProductBulkService.apply(db, current_user.id, body)
+
+    if audit:
+        await ProductCache.invalidate(current_user.id)
+        await AuditService.log_many(user_id=current_user.id, resource="Product", entries=audit, ip=client_ip)
+    if result.failed and not body.allow_partial:
+        response.status_code = 422
+    return result
+
+
+# 2.2 搜索 (全文检索 + 标题 / SKU 模糊匹配，按相关度排序)
+# q 支持 websearch 语法: "red shoes" 短语、-leather 排除、cotton or linen
+# 要放在 /{product_id} 之前，否则 search 会被当成商品 id
+@router.get("/search", response_model=List[ProductSearchHit], dependencies=[Depends(query_budget(2))])
+async def search_products(
+        q: str = Query(..., min_length=1, max_length=200),
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(deps.get_read_db),
+        current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=422, detail="搜索词不能为空")
+    return await ProductSearchService.search(db, current_user.id, q, skip, limit)
+
+
+# 2.3 库存统计 (商品数、库存货值 / 成本、平均毛利、各状态数量)
+# 读的是按用户维护好的汇总行，商品再多耗时也一样
+@router.get("/stats", response_model=ProductStatsResponse, dependencies=[Depends(query_budget(2))])
+async def read_product_stats(
+        db: AsyncSession = Depends(deps.get_read_db),
+        current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    query = select(Product).filter(Product.id == product_id)
-    result = await db.execute(query)
-    product = result.scalars().first()
+    return await ProductStatsService.get(db, current_user.id)
 
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
 
-    # 严防越权访问：如果这个商品不是你的，报错！
-    if product.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to access this product")
+# 3. 获取单个产品详情 (需校验权限)
+@router.get("/{product_id}", response_model=ProductResponse, dependencies=[Depends(query_budget(2))])
+async def read_product(
+        product_id: int,
+        db: AsyncSession = Depends(deps.get_read_db),
+        current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    async def load_product():
+        query = select(Product).filter(Product.id == product_id)
+        result = await db.execute(query)
+        product = result.scalars().first()
+
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        # 严防越权访问：如果这个商品不是你的，报错！
+        if product.owner_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to access this product")
+
+        return ProductResponse.model_validate(product).model_dump(mode="json")
+
+    # 缓存按当前用户隔离，只有自己的产品才会被缓存
+    return await ProductCache.get_or_load(current_user.id, f"item:{product_id}", load_product)
+
+
+async def _missing_or_forbidden(db: AsyncSession, product_id: int) -> HTTPException:
+    """UPDATE / DELETE 一行都没命中时才区分: 商品不存在 (404) 还是不属于当前用户 (403)"""
+    exists = (await db.execute(select(Product.id).filter(Product.id == product_id))).first()
+    if exists is None:
+        return HTTPException(status_code=404, detail="Product not found")
+    return HTTPException(status_code=403, detail="Not authorized")
+
+
+async def _update_owned(db: AsyncSession, product_id: int, owner_id: int, values: dict) -> ProductResponse:
+    """
+    一条 UPDATE ... WHERE id = ? AND owner_id = ? RETURNING * 完成 查询 + 权限校验 + 更新 + 取回新值，
+    不再先 SELECT 再 UPDATE 再 refresh
+    """
+    empty = sorted(name for name in NOT_NULL_FIELDS if name in values and values[name] is None)
+    if empty:
+        raise HTTPException(status_code=422, detail=f"{', '.join(empty)}: 不能为空")
+    if not values:
+        raise HTTPException(status_code=422, detail="没有要更新的字段")
+
+    query = (
+        update(Product)
+        .filter(Product.id == product_id, Product.owner_id == owner_id)
+        .values(**values)
+        .returning(Product)
+        .execution_options(synchronize_session=False)
+    )
+    product = (await db.execute(query)).scalars().first()
+    if product is None:
+        raise await _missing_or_forbidden(db, product_id)
 
-    return product
+    await db.commit()
+    await ProductCache.invalidate(owner_id)
+    return ProductResponse.model_validate(product)
 
 
-# 4. 更新产品
-@router.put("/{product_id}", response_model=ProductResponse)
+# 4. 更新产品 (整体更新，没传的字段保持不变)
+@router.put("/{product_id}", response_model=ProductResponse, dependencies=[Depends(query_budget(3))])
 async def update_product(
         product_id: int,
-        item: ProductCreate,  # 实际开发建议单独定义 ProductUpdate，字段全是 Optional
+        item: ProductCreate,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    # 先查出来
-    query = select(Product).filter(Product.id == product_id)
-    result = await db.execute(query)
-    product = result.scalars().first()
+    return await _update_owned(db, product_id, current_user.id, item.model_dump(exclude_unset=True))
 
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    if product.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
-    # 更新字段
-    update_data = item.model_dump(exclude_unset=True)  # 只更新传进来的字段
-    for key, value in update_data.items():
-        setattr(product, key, value)
-
-    await db.commit()
-    await db.refresh(product)
-    return product
+# 4.1 部分更新 (只更新传进来的字段)
+@router.patch("/{product_id}", response_model=ProductResponse, dependencies=[Depends(query_budget(3))])
+async def patch_product(
+        product_id: int,
+        item: ProductUpdate,
+        db: AsyncSession = Depends(get_db),
+        current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    return await _update_owned(db, product_id, current_user.id, item.model_dump(exclude_unset=True))
 
 
-# 5. 删除产品
-@router.delete("/{product_id}", status_code=204)
+# 5. 删除产品 (一条 DELETE ... RETURNING，没删掉任何行时再区分 404 / 403)
+@router.delete("/{product_id}", status_code=204, dependencies=[Depends(query_budget(3))])
 async def delete_product(
         product_id: int,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: UserPrincipal = Depends(deps.get_current_user),
+        client_ip: Optional[str] = Depends(deps.get_client_ip)
 ):
-    query = select(Product).filter(Product.id == product_id)
-    result = await db.execute(query)
-    product = result.scalars().first()
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    if product.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    query = (
+        delete(Product)
+        .filter(Product.id == product_id, Product.owner_id == current_user.id)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    if (await db.execute(query)).first() is None:
+        raise await _missing_or_forbidden(db, product_id)
 
-    await db.delete(product)
+    await db.commit()
+    await ProductCache.invalidate(current_user.id)
 
-    # 记录审计
+    # 记录审计 (异步批量写入，不占用上面的事务)
     await AuditService.log(
-        db=db,
         user_id=current_user.id,
         action="DELETE",
         resource="Product",
         resource_id=product_id,
-        ip="127.0.0.1"
+        ip=client_ip
     )
-
-    await db.commit()
     return None  # 204 No Content 不需要返回 body
 
 
-# 1. 批量导入
+# 1. 批量导入 (同步，适合小文件；大文件请用下面的 /import 后台任务)
+# 支持 CSV / XLSX，流式分批读取，每批一条多行 INSERT ... ON CONFLICT (sku) DO UPDATE
+# 返回新增、更新、拒绝的数量，以及被拒绝的行号和原因
 @router.post("/import/excel")
 async def import_products(
         file: UploadFile,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    # 解析 Excel
-    items = await DataService.parse_excel(file)
-
-    # 批量入库 (Bulk Insert)
-    # 注意：这里需要处理数据校验，如果数据量大建议扔给 Celery
-    products_to_add = []
-    for item in items:
-        products_to_add.append(Product(
-            title=item.get("Title"),
-            sku=item.get("SKU"),
-            price=float(item.get("Price", 0)),
-            owner_id=current_user.id
-        ))
-
-    db.add_all(products_to_add)
-    await db.commit()
+    if not DataService.is_supported_import(file.filename):
+        raise HTTPException(status_code=400, detail="只支持 .csv / .xlsx 文件")
 
-    return {"message": f"成功导入 {len(items)} 条数据"}
+    chunks = DataService.aiter_import_chunks(file.file, file.filename)
+    result = await ProductImportService.import_chunks(db, current_user.id, chunks)
+    await ProductCache.invalidate(current_user.id)
 
+    return {"message": f"成功导入 {result.inserted + result.updated} 条数据", **result.to_dict()}
 
-# 2. 批量导出
-@router.get("/export/excel")
-async def export_products(
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(deps.get_current_user)
+
+# 1.1 后台导入 (大文件)
+# 文件落盘后交给 Celery 处理，接口立刻返回 job_id，进度通过下面的查询接口获取
+@router.post("/import", status_code=202)
+async def create_import_job(
+        file: UploadFile,
+        current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    if not DataService.is_supported_import(file.filename):
+        raise HTTPException(status_code=400, detail="只支持 .csv / .xlsx 文件")
+
+    job_id = await ImportJobService.create(redis_client, current_user.id, file)
+    import_products_task.delay(job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+
+# 1.2 查询导入进度
+@router.get("/import/{job_id}")
+async def read_import_job(
+        job_id: str,
+        current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    # 查出数据
-    query = select(Product).filter(Product.owner_id == current_user.id)
-    result = await db.execute(query)
-    products = result.scalars().all()
+    job = await ImportJobService.get(redis_client, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this import job")
+    return job
 
-    # 转为字典列表 (利用 Pydantic 的 model_dump)
-    data = [ProductResponse.model_validate(p).model_dump() for p in products]
 
-    # 生成 Excel 流
-    excel_file = DataService.export_excel(data)
+# 2. 批量导出
+# 支持 excel / csv / ndjson 三种格式，数据用服务端游标分批读取、边读边写，
+# 导出多少行内存占用都是平的
+EXPORT_FORMATS = {
+    "excel": ("products.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+              DataService.stream_excel),
+    "csv": ("products.csv", "text/csv; charset=utf-8", DataService.stream_csv),
+    "ndjson": ("products.ndjson", "application/x-ndjson", DataService.stream_ndjson),
+}
+
+
+@router.get("/export/{export_format}")
+async def export_products(
+        export_format: Literal["excel", "csv", "ndjson"],
+        current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    filename, media_type, stream = EXPORT_FORMATS[export_format]
+    # 导出是长时间的大查询，优先放到只读副本上
+    session_factory = await replica_router.session_factory_for(current_user.id)
 
     # 返回文件流供浏览器下载
-    headers = {'Content-Disposition': 'attachment; filename="products.xlsx"'}
-    return StreamingResponse(excel_file, headers=headers,
-                             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
\ No newline at end of file
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return StreamingResponse(stream(current_user.id, session_factory), headers=headers, media_type=media_type)
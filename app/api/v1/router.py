@@ -1,7 +1,8 @@
 # app/api/v1/router.py
 from fastapi import APIRouter
-from app.api.v1.endpoints import products, login
+from app.api.v1.endpoints import products, login, audit
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
-api_router.include_router(products.router, prefix="/products", tags=["products"])
\ No newline at end of file
+api_router.include_router(products.router, prefix="/products", tags=["products"])
+api_router.include_router(audit.router, prefix="/admin/audit-logs", tags=["audit"])
\ No newline at end of file
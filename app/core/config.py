@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -8,6 +9,10 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: str
     SECRET_KEY: str
+    # 调试模式: 响应头里带上 X-DB-Queries / X-DB-Time
+    DEBUG: bool = False
+    ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
     MAIL_FROM: str
@@ -15,6 +20,130 @@ class Settings(BaseSettings):
     MAIL_SERVER: str
     MAIL_TLS: bool = True
     MAIL_SSL: bool = False
+    # 邮件发送: 写进 Redis 发件箱，由 Celery 任务 deliver_emails 用常驻的 SMTP 连接批量发送
+    # 每秒最多发多少封 (全局，0 表示不限速)、每批从发件箱取多少封、每次任务最多运行多少秒
+    EMAIL_RATE_PER_SECOND: float = 10
+    EMAIL_BATCH_SIZE: int = 100
+    EMAIL_DRAIN_SECONDS: float = 50
+    # 临时错误 (断线、4xx) 最多发送几次，第 n 次失败后等 EMAIL_RETRY_BACKOFF_SECONDS * 2^(n-1) 秒再试
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BACKOFF_SECONDS: float = 30
+    # SMTP 连接空闲超过这么多秒，下次发送前先 NOOP 检查一下是否还活着
+    EMAIL_SMTP_IDLE_CHECK_SECONDS: float = 30
+    EMAIL_SMTP_TIMEOUT_SECONDS: float = 30
+
+    # 日志: 级别、是否输出 JSON (每行一个对象，带 request_id，方便日志平台解析)
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = False
+    # 采样比例 (0~1)，按级别，例如 {"DEBUG": 0.01, "INFO": 0.2}；没列出的级别全部保留
+    LOG_SAMPLE_RATES: dict[str, float] = {}
+    # 按路由模板采样 (只作用于 ERROR 以下)，例如 {"/health": 0, "/api/v1/products/": 0.1}
+    LOG_ROUTE_SAMPLE_RATES: dict[str, float] = {}
+    # 同一行代码在窗口期内最多输出多少条日志，超出的丢弃 (0 表示不限制)
+    LOG_REPEAT_WINDOW_SECONDS: float = 10
+    LOG_REPEAT_LIMIT: int = 20
+    # 日志写出队列长度，满了直接丢弃 (不阻塞请求)
+    LOG_QUEUE_SIZE: int = 10000
+
+    # 数据库连接池 (每个 API 进程一个池，总连接数最多 DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    # 池子满了之后等待空闲连接的秒数，超时抛出 "QueuePool limit ... overflow" 错误
+    DB_POOL_TIMEOUT: float = 30
+    # 连接用了这么多秒之后重建，避免被数据库或中间的防火墙静默断开
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg 每个连接缓存的预编译语句数量
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # 通过 PgBouncer (transaction 模式) 连接时打开: 关闭预编译语句缓存，语句名随机生成避免冲突
+    DB_PGBOUNCER: bool = False
+
+    # 超过这么多毫秒的 SQL 记一条慢查询日志 (带上接口路由)
+    DB_SLOW_QUERY_MS: float = 200
+    # 接口用 query_budget(n) 声明了 SQL 条数上限时，超出直接报错 (测试 / CI 里打开，生产环境只记警告)
+    DB_QUERY_BUDGET_STRICT: bool = False
+
+    # 就绪探针 (/readyz): 每项依赖检查的超时，以及检查结果缓存多久
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 1.0
+    HEALTH_CACHE_SECONDS: float = 2.0
+
+    # 只读副本 (可选)，多个地址用逗号分隔；为空时所有读请求都走主库
+    DATABASE_REPLICA_URLS: str = ""
+    # 副本延迟超过这么多秒就暂时不用，每隔 REPLICA_LAG_CHECK_SECONDS 检查一次
+    REPLICA_MAX_LAG_SECONDS: float = 5
+    REPLICA_LAG_CHECK_SECONDS: float = 5
+    # 用户自己写过数据之后的这段时间内，他的读请求都走主库 (必须大于 REPLICA_MAX_LAG_SECONDS)
+    READ_YOUR_WRITES_SECONDS: int = 15
+
+    # 密码哈希: bcrypt 成本参数 (改了之后老用户下次登录时会自动用新参数重新哈希)
+    BCRYPT_ROUNDS: int = 12
+    # bcrypt 专用线程池大小，以及排队上限 (超过直接返回 503，防止登录风暴拖垮整个服务)
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # 已校验 JWT 的缓存 (token 摘要 -> claims)，条目不会超过 token 自身的 exp
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+
+    # 登录用户缓存: 进程内 LRU (第一层) + Redis (第二层，可关闭)
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_REDIS: bool = True
+    AUTH_CACHE_REDIS_TTL_SECONDS: int = 300
+
+    # 功能开关快照: 变更靠 Redis Pub/Sub 推送，另外每隔这么多秒比对一次版本号兜底
+    FEATURE_FLAG_POLL_SECONDS: int = 30
+
+    # 审计日志异步批量写入: 攒够 N 条或者等待 M 毫秒就写一次
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    AUDIT_QUEUE_SIZE: int = 10000
+    # 队列满了怎么办: block 等待 / drop 丢弃 / spill 写到本地文件 (下次启动时补写入库)
+    AUDIT_OVERFLOW: Literal["block", "drop", "spill"] = "spill"
+    AUDIT_SPILL_PATH: str = "logs/audit_spill.jsonl"
+    # 数据本身有问题、逐条重试也写不进去的记录放这里，不会自动重放，需要人工处理
+    AUDIT_DEAD_LETTER_PATH: str = "logs/audit_dead_letter.jsonl"
+
+    # 审计日志分区: 提前建好未来几个月的分区；保留最近多少个月 (0 表示永久保留)
+    AUDIT_PARTITION_MONTHS_AHEAD: int = 3
+    AUDIT_RETENTION_MONTHS: int = 12
+
+    # 产品读接口缓存 (Redis) 的过期时间，数据变更时会主动失效，这里只是兜底
+    PRODUCT_CACHE_TTL_SECONDS: int = 300
+
+    # 部署在负载均衡 / 反向代理后面时打开，客户端 IP 从 X-Forwarded-For 里取
+    TRUST_PROXY_HEADERS: bool = False
+
+    # 后台导入任务: 上传文件先落盘到这个目录，API 和 Celery Worker 必须能访问同一个目录
+    IMPORT_SPOOL_DIR: str = "uploads/imports"
+    # 导入任务状态在 Redis 里保留多久 (秒)，过期后落盘文件也会被每日清理任务删掉
+    IMPORT_JOB_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # 低库存提醒 (每小时): stock_qty 低于阈值的商品按用户汇总成一封邮件，已经提醒过的不再重复提醒
+    # 阈值不要超过 10，扫描用的部分索引只包含 stock_qty < 10 的商品
+    LOW_STOCK_THRESHOLD: int = 5
+    # 每批扫描多少个商品 (每批一个短事务)
+    LOW_STOCK_SCAN_BATCH: int = 5000
+    # 一封邮件里最多列出多少个商品，其余的只给出数量
+    LOW_STOCK_DIGEST_MAX_ITEMS: int = 50
+    # 扫描锁的过期时间 (秒)，扫描过程中每过三分之一就续期；worker 崩溃后最多等这么久下一轮就能接着跑
+    LOW_STOCK_LOCK_SECONDS: int = 300
+
+    # AI 内容生成 (定时任务 generate_ai_content，走 ai-queue): 分批读取 is_ai_optimized = false 的商品
+    # provider 名字见 app.services.ai_content.PROVIDERS；fake 是本地假实现，延迟由 AI_FAKE_LATENCY_MS 控制
+    AI_PROVIDER: str = "fake"
+    AI_BATCH_SIZE: int = 100
+    # 同时在途的请求数，以及按 provider 名字的限速 (每秒请求数，没列出的用 provider 自己的默认值，0 表示不限速)
+    # 限速是每个 Worker 进程各自计算的，同一时间只有一个生成任务在跑
+    AI_CONCURRENCY: int = 16
+    AI_RATE_LIMITS: dict[str, float] = {}
+    # 每轮最多运行多少秒，剩下的留给下一轮
+    AI_RUN_SECONDS: float = 240
+    AI_FAKE_LATENCY_MS: float = 200
+
+    @property
+    def replica_urls(self) -> list[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
 
     # 动态计算 .env 文件的绝对路径
     # __file__ 是当前文件 (config.py) 的路径
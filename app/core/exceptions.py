@@ -5,8 +5,10 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from loguru import logger
 
 # 1. 处理 HTTP 错误 (如 404 Not Found, 403 Forbidden)
+# 404 量大且基本没有排查价值，只记 DEBUG；只记路径不记完整 URL (查询参数里可能有敏感信息，格式化也更便宜)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    logger.warning(f"HTTP Error: {exc.status_code} - {exc.detail} - URL: {request.url}")
+    level = "DEBUG" if exc.status_code == 404 else "WARNING"
+    logger.log(level, "HTTP Error: {} - {} - {} {}", exc.status_code, exc.detail, request.method, request.url.path)
     return JSONResponse(
         status_code=exc.status_code,
         content={"code": exc.status_code, "message": exc.detail, "data": None},
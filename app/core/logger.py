@@ -1,38 +1,254 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
 import sys
+import threading
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
+from typing import Callable, Optional
+
 from loguru import logger
 from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED, route_template
 
 # 定义日志路径
 LOG_PATH = Path("logs")
 LOG_PATH.mkdir(parents=True, exist_ok=True)
+# 日志文件保留天数
+LOG_RETENTION_DAYS = 10
+
+# 文本格式 (不带颜色，颜色转义在文件里是乱码，写控制台也不值得多花这份 CPU)
+TEXT_FORMAT = "{time} | {level: <8} | {name}:{function}:{line} - {request_id}{message}"
+
+# 当前请求的 ID 和 ASGI scope (RequestIdMiddleware 设置)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+request_scope_var: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+
+class LogFilter:
+    """
+    在调用方线程里执行，决定一条日志要不要进队列:
+    1. 按级别采样 (LOG_SAMPLE_RATES)
+    2. 按路由采样 (LOG_ROUTE_SAMPLE_RATES，只作用于 ERROR 以下的日志)
+    3. 同一行代码在 LOG_REPEAT_WINDOW_SECONDS 内最多输出 LOG_REPEAT_LIMIT 条，
+       其余的丢弃，下一个窗口的第一条日志里注明丢了多少条
+    通过的日志顺便带上 request_id
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (文件, 行号) -> [窗口开始时间, 窗口内条数, 上个窗口被丢弃的条数]
+        self._repeats: dict[tuple, list] = {}
+
+    def __call__(self, record: dict) -> bool:
+        level = record["level"]
+        rate = settings.LOG_SAMPLE_RATES.get(level.name)
+        if rate is not None and random.random() >= rate:
+            LOG_RECORDS_DROPPED.labels("sampled").inc()
+            return False
+
+        scope = request_scope_var.get()
+        if scope is not None and settings.LOG_ROUTE_SAMPLE_RATES and level.no < logging.ERROR:
+            rate = settings.LOG_ROUTE_SAMPLE_RATES.get(route_template(scope))
+            if rate is not None and random.random() >= rate:
+                LOG_RECORDS_DROPPED.labels("sampled").inc()
+                return False
+
+        if settings.LOG_REPEAT_LIMIT > 0 and not self._allow_repeat(record):
+            LOG_RECORDS_DROPPED.labels("suppressed").inc()
+            return False
+
+        record["extra"]["request_id"] = request_id_var.get()
+        return True
+
+    def _allow_repeat(self, record: dict) -> bool:
+        key = (record["file"].path, record["line"])
+        now = time.monotonic()
+        with self._lock:
+            state = self._repeats.get(key)
+            if state is None or now - state[0] >= settings.LOG_REPEAT_WINDOW_SECONDS:
+                suppressed = state[1] - settings.LOG_REPEAT_LIMIT if state else 0
+                state = self._repeats[key] = [now, 0]
+                if suppressed > 0:
+                    record["extra"]["suppressed"] = suppressed
+            state[1] += 1
+            return state[1] <= settings.LOG_REPEAT_LIMIT
+
+
+def _format_exception(record: dict) -> Optional[str]:
+    if record["exception"] is None:
+        return None
+    error_type, error, tb = record["exception"]
+    return "".join(traceback.format_exception(error_type, error, tb)).rstrip()
+
+
+def format_text(record: dict) -> str:
+    extra = record["extra"]
+    request_id = extra.get("request_id")
+    message = record["message"]
+    if extra.get("suppressed"):
+        message += f" (前 {settings.LOG_REPEAT_WINDOW_SECONDS:g} 秒内同一位置另有 {extra['suppressed']} 条日志被丢弃)"
+    line = TEXT_FORMAT.format(
+        time=record["time"].strftime("%Y-%m-%d %H:%M:%S"),
+        level=record["level"].name,
+        name=record["name"],
+        function=record["function"],
+        line=record["line"],
+        request_id=f"[{request_id}] " if request_id else "",
+        message=message,
+    )
+    error = _format_exception(record)
+    return f"{line}\n{error}" if error else line
+
+
+def format_json(record: dict) -> str:
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    data.update(record["extra"])
+    error = _format_exception(record)
+    if error:
+        data["exception"] = error
+    return json.dumps(data, ensure_ascii=False, default=str)
+
 
-# 日志格式
-LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+class QueueSink:
+    """
+    非阻塞的日志输出
+    业务代码 (事件循环线程) 只把日志记录放进有界队列，格式化和写控制台 / 文件都在后台线程里做；
+    队列满了 (磁盘或者日志采集跟不上) 直接丢弃并计数，绝不阻塞事件循环
+    注意 loguru 自带的 enqueue=True 用的是管道，写满之后照样会阻塞调用方
+    """
+
+    def __init__(self, formatter: Callable[[dict], str], writers: list[Callable[[str], None]], maxsize: int):
+        self._formatter = formatter
+        self._writers = writers
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(message.record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            try:
+                line = self._formatter(record)
+                for write in self._writers:
+                    write(line)
+            except Exception as e:
+                sys.__stderr__.write(f"日志写入失败: {e}\n")
+
+    def stop(self, timeout: float = 5) -> None:
+        """进程退出前把队列里剩下的日志写完"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+def _stderr_writer(line: str) -> None:
+    sys.stderr.write(line + "\n")
+    sys.stderr.flush()
+
+
+def _file_writer() -> Callable[[str], None]:
+    """
+    每个进程写自己的文件 (app.<pid>.log)，每天午夜切割，保留最近 LOG_RETENTION_DAYS 天
+    多个 uvicorn / Celery 进程共用一个 TimedRotatingFileHandler 文件时，各自切割会互相覆盖、丢日志
+    (只在后台线程里写，切割时的磁盘 IO 不影响请求)
+    """
+    suffix = "jsonl" if settings.LOG_JSON else "log"
+    _remove_expired_logs(suffix)
+    handler = TimedRotatingFileHandler(
+        LOG_PATH / f"app.{os.getpid()}.{suffix}",
+        when="midnight",
+        backupCount=LOG_RETENTION_DAYS,
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return lambda line: handler.emit(logging.makeLogRecord({"msg": line}))
+
+
+def _remove_expired_logs(suffix: str) -> None:
+    """已经退出的进程留下的日志文件不会再被切割，超过保留期的在这里删掉"""
+    expire_before = time.time() - LOG_RETENTION_DAYS * 86400
+    for path in LOG_PATH.glob(f"app.*.{suffix}*"):
+        try:
+            if path.stat().st_mtime < expire_before:
+                path.unlink()
+        except FileNotFoundError:
+            # 其他进程同时在清理
+            pass
 
 
 def setup_logging():
     # 1. 移除默认的 handler (避免重复输出)
     logger.remove()
 
-    # 2. 输出到控制台 (Console)
-    logger.add(
-        sys.stderr,
-        format=LOG_FORMAT,
-        level="INFO",  # 生产环境可以改成 WARNING
-        enqueue=True,
+    # 2. 控制台 + 文件，都通过后台线程写出
+    sink = QueueSink(
+        formatter=format_json if settings.LOG_JSON else format_text,
+        writers=[_stderr_writer, _file_writer()],
+        maxsize=settings.LOG_QUEUE_SIZE,
     )
+    atexit.register(sink.stop)
 
-    # 3. 输出到文件 (File) - 每天一个文件，保留 10 天
-    logger.add(
-        str(LOG_PATH / "app_{time:YYYY-MM-DD}.log"),
-        rotation="00:00",  # 每天午夜切割
-        retention="10 days",  # 只保留最近10天
-        compression="zip",  # 历史日志压缩
-        format=LOG_FORMAT,
-        level="INFO",
-        enqueue=True,
-        encoding="utf-8"
-    )
+    # format 只保留 message，真正的格式化放到后台线程
+    logger.add(sink, level=settings.LOG_LEVEL, format="{message}", filter=LogFilter())
+    return logger
+
+
+class RequestIdMiddleware:
+    """
+    给每个请求分配 ID (优先用上游传来的 X-Request-ID)，写进日志和响应头，方便串起一个请求的所有日志
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                # 只取前 64 个字符，防止日志被超长的请求头撑爆
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-request-id", request_id.encode("latin-1"))]}
+            await send(message)
 
-    return logger
\ No newline at end of file
+        id_token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(id_token)
+            request_scope_var.reset(scope_token)
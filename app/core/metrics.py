@@ -0,0 +1,119 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 多个 uvicorn / gunicorn worker 时，启动前设置环境变量 PROMETHEUS_MULTIPROC_DIR (每次启动前清空该目录)，
+# 各进程把指标写到这个目录下的 mmap 文件里，/metrics 汇总所有进程的数据
+
+# HTTP 请求耗时的分桶 (秒)；DB / Redis 单次调用通常快得多，用更细的分桶
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# route 用路由模板 (比如 /api/v1/products/{product_id})，不用实际 URL，防止标签无限增长
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+                         buckets=HTTP_BUCKETS)
+
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency", ["operation"],
+                             buckets=CALL_BUCKETS)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised", ["operation"])
+
+REDIS_LATENCY = Histogram("redis_command_duration_seconds", "Redis command latency", ["command"],
+                          buckets=CALL_BUCKETS)
+REDIS_ERRORS = Counter("redis_command_errors_total", "Redis commands that raised", ["command"])
+
+# 被采样丢弃 (sampled)、重复抑制 (suppressed)、输出队列满 (queue_full) 的日志条数
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records not written", ["reason"])
+
+# 没匹配到任何路由的请求 (404、被 TrustedHost 拦截等) 统一归到这个标签
+UNMATCHED_ROUTE = "unmatched"
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """返回 (内容, Content-Type)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的耗时和状态码 (纯 ASGI 中间件，不读取也不缓冲响应体)
+    流式响应的耗时算到最后一个字节发完为止
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            HTTP_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+
+
+def route_template(scope) -> str:
+    # 路由匹配成功后 FastAPI 会把 route 写进 scope；
+    # 新版 FastAPI 的 include_router 不再复制路由，带前缀的完整路径在 effective_route_context 里
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(context, "path", None) or getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def _operation(statement: str) -> str:
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """给引擎加上 SQL 计时 (传入 AsyncEngine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_LATENCY.labels(_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # 只有执行语句时出错才有对应的开始时间 (连接失败等情况 execution_context 为空)
+        if context.connection is not None and context.execution_context is not None:
+            stack = context.connection.info.get("query_started")
+            if stack:
+                stack.pop()
+        DB_QUERY_ERRORS.labels(_operation(context.statement or "")).inc()
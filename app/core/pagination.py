@@ -0,0 +1,23 @@
+import base64
+import json
+from typing import Any
+
+
+# 游标分页 (Keyset Pagination)
+# 游标对前端是不透明的字符串，内部是 base64 编码的 JSON，记录上一页最后一行的排序键
+def encode_cursor(payload: dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """解析游标，格式不对时抛 ValueError (由接口层转成 400)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
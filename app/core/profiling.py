@@ -0,0 +1,130 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import route_template
+
+# 慢查询日志里 SQL 最多保留多少个字符
+SLOW_QUERY_LOG_CHARS = 500
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """请求执行的 SQL 条数超过了接口声明的上限 (只在 DB_QUERY_BUDGET_STRICT 下抛出)"""
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    budget: Optional[int] = None
+    scope: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope) if self.scope else "-"
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def profile_queries(scope: Optional[dict] = None) -> Iterator[QueryStats]:
+    """统计 with 块里执行的 SQL (请求级别由 QueryProfilerMiddleware 调用，测试和脚本里也可以直接用)"""
+    stats = QueryStats(scope=scope or {})
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def before_query(statement: str) -> None:
+    """SQL 执行前调用 (before_cursor_execute)，严格模式下超出预算直接报错，让测试失败"""
+    stats = _current.get()
+    if stats is None or stats.budget is None or not settings.DB_QUERY_BUDGET_STRICT:
+        return
+    if stats.count >= stats.budget:
+        raise QueryBudgetExceeded(
+            f"{stats.route} 声明最多 {stats.budget} 条 SQL，第 {stats.count + 1} 条: {statement[:SLOW_QUERY_LOG_CHARS]}"
+        )
+
+
+def record_query(statement: str, seconds: float) -> None:
+    """SQL 执行完调用 (after_cursor_execute)"""
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_seconds += seconds
+
+    if seconds * 1000 >= settings.DB_SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning(f"慢查询 {seconds * 1000:.1f} ms [{route}]: {' '.join(statement.split())[:SLOW_QUERY_LOG_CHARS]}")
+
+
+def profile_engine(engine: Engine) -> None:
+    """给引擎挂上按请求统计和慢查询日志 (传入 AsyncEngine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        before_query(statement)
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - conn.info["profile_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None and context.execution_context is not None:
+            stack = context.connection.info.get("profile_started")
+            if stack:
+                stack.pop()
+
+
+def query_budget(max_queries: int):
+    """
+    声明接口最多执行多少条 SQL (包括认证依赖里的查询)，用法:
+        @router.get("/{id}", dependencies=[Depends(query_budget(2))])
+    超出时记一条警告；DB_QUERY_BUDGET_STRICT 打开时 (测试 / CI) 直接报错
+    """
+    async def dependency() -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = max_queries
+    return dependency
+
+
+class QueryProfilerMiddleware:
+    """
+    按请求统计 SQL 条数和耗时
+    DEBUG 模式下在响应头里带上 X-DB-Queries / X-DB-Time (毫秒)，方便在浏览器里直接看到 N+1
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(scope) as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and settings.DEBUG:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.count).encode()))
+                    headers.append((b"x-db-time", f"{stats.total_seconds * 1000:.2f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        if stats.budget is not None and stats.count > stats.budget:
+            logger.warning(f"{stats.route} 执行了 {stats.count} 条 SQL，超出声明的 {stats.budget} 条")
@@ -1,11 +1,34 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Union
+from typing import Any, Optional, Union
+from fastapi import HTTPException, status
 from jose import jwt
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 from app.core.config import settings
 
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds / max_rounds 和 default_rounds 一致: 成本参数不同的旧 hash 会被判定为需要更新
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt 单次要 200~300ms，直接在 async 接口里调用会卡住整个事件循环
+# 放到专用线程池里跑 (bcrypt 计算时会释放 GIL，线程池就够用，不需要进程池)
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
+# 已校验 token 的缓存: 同一个 token 在有效期内只做一次签名校验和 JSON 解析
+# 缓存时记下当时的密钥，SECRET_KEY / ALGORITHM 变了 (密钥轮换) 就整个清空
+_token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+_token_cache_secret: Optional[tuple[str, str]] = None
 
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
@@ -19,9 +42,64 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> dict:
+    """
+    校验 JWT 并返回 claims (只读，不要修改)，校验失败抛 JWTError
+    缓存 key 用 token 的 sha256 摘要，不在内存里长期保存 token 原文
+    """
+    global _token_cache_secret
+    secret = (settings.SECRET_KEY, settings.ALGORITHM)
+    if secret != _token_cache_secret:
+        _token_cache.clear()
+        _token_cache_secret = secret
+
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _token_cache.get(key)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    # 缓存条目最晚在 token 过期时失效 (exp 是墙上时间，换算成 monotonic 时间)
+    expires_at = None
+    if "exp" in claims:
+        expires_at = time.monotonic() + (claims["exp"] - time.time())
+    _token_cache.set(key, claims, expires_at=expires_at)
+    return claims
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+async def _run_in_hash_pool(func, *args):
+    global _hash_pending
+    # 排队的请求太多时直接拒绝 (503)，而不是让所有请求一起排队超时
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    异步校验密码 (在 async 接口里请用这个)
+    返回 (是否正确, 新 hash)；BCRYPT_ROUNDS 改了之后，新 hash 不为空，调用方应保存下来
+    """
+    return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
@@ -0,0 +1,89 @@
+import asyncio
+import inspect
+import secrets
+import time
+from typing import Awaitable, Callable
+
+from redis import Redis
+from redis import asyncio as aioredis
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import REDIS_ERRORS, REDIS_LATENCY
+
+# Pub/Sub 断线后多久重连 (秒)
+RESUBSCRIBE_DELAY_SECONDS = 1
+
+# 释放锁: 只有值还是自己获取时写入的 token 才删除 (redis.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
+# 值不一样说明自己的锁已经过期、被别的进程重新拿到了，不能把别人的锁删掉
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# 续期: 同样只在锁还是自己的时候才延长过期时间 (redis.eval(RENEW_LOCK_SCRIPT, 1, key, token, 秒数))
+# 返回 0 说明锁已经丢了，应该停下来，别和拿到锁的进程一起跑
+RENEW_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def new_lock_token() -> str:
+    return secrets.token_hex(16)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """记录每条命令耗时的 Redis 客户端 (Pipeline 和 Pub/Sub 不经过这里)"""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_ERRORS.labels(command).inc()
+            raise
+        finally:
+            REDIS_LATENCY.labels(command).observe(time.perf_counter() - started)
+
+
+# API 进程共用的 Redis 客户端 (连接是懒加载的，第一次执行命令时才会连)
+redis_client = InstrumentedRedis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+
+def new_redis_client() -> aioredis.Redis:
+    """
+    Celery 任务里每次 asyncio.run 都是新的事件循环，不能复用上面的连接池，
+    需要单独创建客户端，用完记得 aclose()
+    """
+    return InstrumentedRedis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+
+# Celery Worker 里同步代码用的客户端 (同一个进程的任务之间共用连接池)
+sync_redis_client = Redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+
+async def subscribe_forever(channel: str, handler: Callable[[str], Awaitable[None] | None]) -> None:
+    """
+    订阅 Redis 频道并把每条消息交给 handler，断线后自动重连
+    在 lifespan 里用 asyncio.create_task 启动，关闭时 cancel 掉
+    """
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    result = handler(message["data"])
+                    if inspect.isawaitable(result):
+                        await result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis 订阅 {channel} 断开，稍后重连: {e}")
+            await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import redis_client
+from app.db.session import AsyncSessionLocal, build_engine
+
+# 用户最近写过数据的标记 (存在即表示还在 read-your-writes 窗口内)
+RECENT_WRITE_KEY = "db:recent_write:{user_id}"
+
+# 副本回放延迟 (秒): 已经回放完收到的 WAL 说明没有积压，算 0；否则看最后一个回放事务距今多久
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """
+    读请求的数据库路由
+    - 没配置副本: 全部走主库
+    - 副本延迟超过 REPLICA_MAX_LAG_SECONDS 或者连不上: 暂时不用，恢复后自动加回来
+    - 用户自己刚写过数据 (READ_YOUR_WRITES_SECONDS 内): 他的读请求走主库，避免刚创建的数据读不到
+    - 其余情况在可用的副本之间轮询
+    """
+
+    def __init__(self, primary: sessionmaker, replica_urls: list[str], redis: Optional[aioredis.Redis] = None):
+        self.primary = primary
+        self.engines = [build_engine(url) for url in replica_urls]
+        self.sessions = [
+            sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+            for engine in self.engines
+        ]
+        # None 表示还没检查过或者连不上
+        self.lag: list[Optional[float]] = [None] * len(self.engines)
+        self._counter = itertools.count()
+        self._recent_writers = TTLCache(maxsize=10000, ttl=settings.READ_YOUR_WRITES_SECONDS)
+        self._redis = redis
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def healthy(self) -> list[int]:
+        return [i for i, lag in enumerate(self.lag) if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS]
+
+    def pick(self) -> sessionmaker:
+        healthy = self.healthy()
+        if not healthy:
+            return self.primary
+        return self.sessions[healthy[next(self._counter) % len(healthy)]]
+
+    async def session_factory_for(self, user_id: int) -> sessionmaker:
+        if not self.enabled or await self.recently_wrote(user_id):
+            return self.primary
+        return self.pick()
+
+    async def mark_write(self, user_id: int, redis: Optional[aioredis.Redis] = None) -> None:
+        """用户发起写操作时调用 (Celery 任务里传入自己的 Redis 客户端)"""
+        if not self.enabled:
+            return
+        self._recent_writers.set(user_id, True)
+        redis = redis or self._redis
+        if redis is None:
+            return
+        try:
+            await redis.set(RECENT_WRITE_KEY.format(user_id=user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+        except RedisError as e:
+            logger.warning(f"记录用户写操作失败: {e}")
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        if self._recent_writers.get(user_id):
+            return True
+        if self._redis is None:
+            return False
+        try:
+            # 写请求可能落在别的进程上，本地没有记录时再查 Redis
+            return bool(await self._redis.exists(RECENT_WRITE_KEY.format(user_id=user_id)))
+        except RedisError as e:
+            # 判断不了就走主库，宁可慢一点也不能读到旧数据
+            logger.warning(f"读取用户写操作记录失败: {e}")
+            return True
+
+    async def check(self) -> None:
+        for i, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    if engine.dialect.name == "postgresql":
+                        lag = float(await conn.scalar(REPLICA_LAG_SQL))
+                    else:
+                        await conn.execute(text("SELECT 1"))
+                        lag = 0.0
+            except Exception as e:
+                if self.lag[i] is not None:
+                    logger.warning(f"只读副本 {i} 不可用: {e}")
+                lag = None
+            else:
+                if lag > settings.REPLICA_MAX_LAG_SECONDS:
+                    logger.warning(f"只读副本 {i} 延迟 {lag:.1f} 秒，暂时不用")
+            self.lag[i] = lag
+
+    async def monitor(self) -> None:
+        """定时检查副本延迟 (在 lifespan 里启动)"""
+        while True:
+            await asyncio.sleep(settings.REPLICA_LAG_CHECK_SECONDS)
+            await self.check()
+
+    def status(self) -> list[dict]:
+        return [
+            {"url": engine.url.render_as_string(hide_password=True), "lag_seconds": lag,
+             "healthy": i in self.healthy()}
+            for i, (engine, lag) in enumerate(zip(self.engines, self.lag))
+        ]
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replica_router = ReplicaRouter(AsyncSessionLocal, settings.replica_urls, redis_client)
@@ -1,9 +1,131 @@
+import time
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.profiling import profile_engine
+
+
+def _connect_args() -> dict:
+    """asyncpg 的预编译语句设置 (API 引擎和 Celery 任务引擎共用)"""
+    if settings.DB_PGBOUNCER:
+        # PgBouncer transaction 模式下，同一个客户端的前后两条语句可能落在不同的服务端连接上，
+        # 预编译语句不能缓存，语句名也必须全局唯一
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+class PoolStats:
+    """
+    连接池统计 (当前进程)
+    - 等待时间: 从申请连接到拿到连接 (包括池子满了排队、新建连接)
+    - 连接的打开 / 关闭 / 失效次数，用来观察连接是不是在频繁重建
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.opened = 0
+        self.closed = 0
+        self.invalidated = 0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "connections_opened": self.opened,
+            "connections_closed": self.closed,
+            "connections_invalidated": self.invalidated,
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # 连接池事件只在拿到连接之后触发，等待时间只能在取连接的地方计时
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started)
+
+
+def build_engine(url: str, **kwargs):
+    """按配置的连接池参数创建引擎，并加上 SQL 计时和慢查询日志 (主库和只读副本共用)"""
+    if url.startswith("postgresql+asyncpg"):
+        kwargs.setdefault("connect_args", _connect_args())
+    async_engine = create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        **kwargs,
+    )
+    instrument_engine(async_engine.sync_engine)
+    profile_engine(async_engine.sync_engine)
+    return async_engine
+
 
 # 创建异步引擎
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+engine = build_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_stats.opened += 1
+
+
+@event.listens_for(engine.sync_engine, "close")
+def _on_close(dbapi_connection, connection_record):
+    pool_stats.closed += 1
+
+
+@event.listens_for(engine.sync_engine, "close_detached")
+def _on_close_detached(dbapi_connection):
+    pool_stats.closed += 1
+
+
+@event.listens_for(engine.sync_engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_stats.invalidated += 1
+
+
+def get_pool_status() -> dict:
+    return pool_stats.snapshot(engine.pool)
+
 
 # 创建异步会话工厂
 AsyncSessionLocal = sessionmaker(
@@ -16,4 +138,17 @@ AsyncSessionLocal = sessionmaker(
 # 依赖注入函数 (用于 API 接口获取 DB 会话)
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# Celery 任务用的会话
+# 每个任务在自己的事件循环里跑 (asyncio.run)，asyncpg 连接不能跨事件循环复用，
+# 所以每个任务单独建一个不带连接池的引擎，任务结束就释放
+@asynccontextmanager
+async def task_session():
+    task_engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool, connect_args=_connect_args())
+    try:
+        async with AsyncSession(task_engine, expire_on_commit=False, autoflush=False) as session:
+            yield session
+    finally:
+        await task_engine.dispose()
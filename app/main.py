@@ -1,25 +1,36 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from app.api import deps
 from app.api.v1.router import api_router
 from app.core.config import settings
-from app.db.session import engine
+from app.db.replica import replica_router
+from app.db.session import engine, get_pool_status
 from app.models.product import Base
-from app.core.logger import setup_logging
+from app.core.logger import setup_logging, RequestIdMiddleware
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.profiling import QueryProfilerMiddleware
+from app.db.redis import InstrumentedRedis
+from app.services.audit import audit_writer, AuditPartitionService
+from app.services.feature import FeatureService
+from app.services.health import HealthService
+from app.services.product_cache import ProductCache
+from app.services.product_search import ProductSearchService
+from app.services.product_stats import ProductStatsService
+from app.services.user_cache import PrincipalCache
 from app.core.exceptions import (
     http_exception_handler,
     validation_exception_handler,
     general_exception_handler
 )
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis_limit
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
-from redis import asyncio as aioredis # 注意：fastapi-cache2 依赖 redis-py 的 async
 
 # 1. 配置日志
 logger = setup_logging()
@@ -30,22 +41,54 @@ async def lifespan(app: FastAPI):
     logger.info("系统启动中...")
     # 自动建表 (仅开发环境使用，生产环境请用 Alembic)
     async with engine.begin() as conn:
+        # 商品表上的 trgm 索引依赖 pg_trgm 扩展，先装扩展再建表 (装不上时跳过 trgm 索引，模糊搜索关闭)
+        await ProductSearchService.ensure_extension(conn)
         await conn.run_sync(Base.metadata.create_all)
+        # create_all 不会建触发器，维护 search_vector 和 product_stats 的触发器单独补上
+        await ProductSearchService.ensure_trigger(conn)
+        await ProductStatsService.ensure_triggers(conn)
+        # 审计日志是分区表，确保当前月和后续几个月的分区存在
+        await AuditPartitionService.ensure_partitions(conn)
     logger.info("数据库连接成功")
 
     # 连接 Redis 做限流
-    redis_connection = redis_limit.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+    redis_connection = InstrumentedRedis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(redis_connection)
 
     # --- 缓存初始化开始 ---
-    redis = aioredis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
+    redis = InstrumentedRedis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
     FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
     logger.info("Redis 缓存系统已挂载")
     # --- 缓存初始化结束 ---
 
+    # 启动审计日志后台写入
+    await audit_writer.start()
+
+    # 检查只读副本延迟，之后定时检查
+    if replica_router.enabled:
+        await replica_router.check()
+        logger.info(f"只读副本: {replica_router.status()}")
+
+    # 加载功能开关快照
+    await FeatureService.refresh()
+
+    # 后台任务: 用户缓存失效通知、功能开关变更通知与版本号兜底检查
+    background_tasks = [
+        asyncio.create_task(PrincipalCache.listen()),
+        asyncio.create_task(FeatureService.listen()),
+        asyncio.create_task(FeatureService.poll()),
+    ]
+    if replica_router.enabled:
+        background_tasks.append(asyncio.create_task(replica_router.monitor()))
+
     yield
 
     logger.info("系统关闭中...")
+    for task in background_tasks:
+        task.cancel()
+    # 把还在队列里的审计日志写完再断开数据库
+    await audit_writer.stop()
+    await replica_router.dispose()
     await engine.dispose()
 
 
@@ -69,6 +112,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Request-ID"],  # 游标分页的下一页游标、请求 ID 在响应头里，浏览器需要显式放行
 )
 
 # 限制 Host 头，防止 HTTP Host Header 攻击
@@ -78,14 +122,57 @@ app.add_middleware(
 )
 
 
+# 按请求统计 SQL 条数和耗时 (慢查询日志、query_budget、DEBUG 下的 X-DB-* 响应头)
+app.add_middleware(QueryProfilerMiddleware)
+
+# 请求耗时统计 (后添加的中间件在外层，耗时包含其它中间件)
+app.add_middleware(MetricsMiddleware)
+
+# 请求 ID 放在最外层，请求里所有的日志都能带上
+app.add_middleware(RequestIdMiddleware)
+
+
 @app.get("/")
 def root():
-    logger.info("有人访问了首页")  # 测试日志
     return {"message": "SaaS AI Backend is Running!"}
+
+
+# 存活探针: 只要进程能响应就返回 200，不检查依赖
+@app.get("/livez", tags=["system"])
+async def livez():
+    return HealthService.live()
+
+
+# 就绪探针: 数据库 / Redis 不可用或连接池占满时返回 503，负载均衡把流量切走
+@app.get("/readyz", tags=["system"])
+async def readyz(response: Response):
+    result = await HealthService.ready()
+    if result["status"] != "ready":
+        response.status_code = 503
+    return result
+
+
+# 兼容旧的健康检查地址，内容和 /readyz 一样
 @app.get("/health", tags=["system"])
-async def health_check():
-    return {
-        "status": "ok",
-        "db": "connected",
-        "redis": "connected"
-    }
\ No newline at end of file
+async def health_check(response: Response):
+    return await readyz(response)
+
+
+# 内部统计 (缓存命中、连接池、副本地址和延迟) 只给超级管理员看，探针用上面的 /livez、/readyz
+@app.get("/health/cache", tags=["system"], dependencies=[Depends(deps.get_current_active_superuser)])
+async def cache_stats():
+    # 当前进程的产品缓存命中统计
+    return {"products": ProductCache.stats()}
+
+
+@app.get("/health/db", tags=["system"], dependencies=[Depends(deps.get_current_active_superuser)])
+async def db_pool_stats():
+    # 当前进程的数据库连接池状态 (等待时间、使用中 / 空闲连接数、连接重建次数) 和只读副本延迟
+    return {**get_pool_status(), "replicas": replica_router.status()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus 抓取入口
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
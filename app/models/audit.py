@@ -1,17 +1,26 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, DateTime, JSON
+from sqlalchemy import BigInteger, Integer, String, DateTime, JSON, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from app.db.base import Base
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    # 按 created_at 每月一个分区 (分区由 AuditPartitionService 提前创建，过期分区直接 DROP)
+    # 分区表的主键必须包含分区键，所以主键是 (id, created_at)
+    __table_args__ = (
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_audit_logs_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_audit_logs_resource_created_at", "target_resource", "target_id", "created_at", "id"),
+        Index("ix_audit_logs_action_created_at", "action", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    user_id: Mapped[int] = mapped_column(Integer, index=True, nullable=True) # 可能有系统自动操作
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=True) # 可能有系统自动操作
     action: Mapped[str] = mapped_column(String(50), comment="CREATE/UPDATE/DELETE")
     target_resource: Mapped[str] = mapped_column(String(50), comment="User/Product")
     target_id: Mapped[str] = mapped_column(String(50), comment="被操作对象的ID")
     details: Mapped[dict] = mapped_column(JSON, nullable=True, comment="修改前后的快照")
     ip_address: Mapped[str] = mapped_column(String(50), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
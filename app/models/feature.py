@@ -1,5 +1,8 @@
-from sqlalchemy import String, Boolean, Integer
+from datetime import datetime
+from typing import Optional, List
+from sqlalchemy import String, Boolean, Integer, DateTime, JSON
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
 from app.db.base import Base
 
 class FeatureFlag(Base):
@@ -8,4 +11,12 @@ class FeatureFlag(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True, index=True)
     is_global_enabled: Mapped[bool] = mapped_column(Boolean, default=False)
-    description: Mapped[str] = mapped_column(String, nullable=True)
\ No newline at end of file
+    description: Mapped[str] = mapped_column(String, nullable=True)
+
+    # 灰度发布: 按用户 ID 哈希分桶，命中前 N% 的用户开启
+    rollout_percentage: Mapped[int] = mapped_column(Integer, default=0, server_default="0",
+                                                    comment="灰度百分比 0-100")
+    # 白名单: 这些用户 ID 始终开启
+    allow_user_ids: Mapped[Optional[List[int]]] = mapped_column(JSON, nullable=True, comment="白名单用户ID列表")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
+                                                 onupdate=func.now())
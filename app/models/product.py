@@ -1,14 +1,40 @@
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, Text, Float, Boolean, Integer, DateTime, JSON
+from sqlalchemy import String, Text, Float, Boolean, Integer, DateTime, JSON, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from app.db.base import Base
 from sqlalchemy import ForeignKey
 
 
+def _has_pg_trgm(ddl, target, bind, **kw) -> bool:
+    # create_all 建 trgm 索引前检查扩展是否装上，没有 pg_trgm 时跳过 (模糊搜索关闭)
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # 游标分页: WHERE owner_id = ? AND id > ? ORDER BY id
+        Index("ix_products_owner_id_id", "owner_id", "id"),
+        # 列表过滤 / 排序: 每个可排序字段一个 (owner_id, 字段, id)，游标分页按行比较直接定位
+        Index("ix_products_owner_id_status_updated_at", "owner_id", "status", "updated_at"),
+        Index("ix_products_owner_id_price_id", "owner_id", "price", "id"),
+        Index("ix_products_owner_id_updated_at_id", "owner_id", "updated_at", "id"),
+        Index("ix_products_owner_id_title_id", "owner_id", "title", "id"),
+        # 待 AI 优化的商品通常只占一小部分，部分索引只包含这些行
+        Index("ix_products_owner_id_id_not_optimized", "owner_id", "id",
+              postgresql_where=text("is_ai_optimized = false")),
+        # 低库存提醒的定时扫描，按 (owner_id, id) 分批读取，天然按用户分组
+        Index("ix_products_low_stock", "owner_id", "id", postgresql_where=text("stock_qty < 10")),
+        # 搜索: 全文检索 + 标题 / SKU 的三元组模糊匹配 (pg_trgm)
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_products_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(callable_=_has_pg_trgm),
+        Index("ix_products_sku_trgm", "sku", postgresql_using="gin",
+              postgresql_ops={"sku": "gin_trgm_ops"}).ddl_if(callable_=_has_pg_trgm),
+    )
 
     # 1. 新增：所有者ID (外键关联 User 表)
     # nullable=False 表示这个商品必须属于某个人
@@ -48,5 +74,11 @@ class Product(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
                                                  onupdate=func.now())
 
+    # 6. 搜索 (Search)
+    # 标题 + SEO 关键词 + 描述的 tsvector，由数据库触发器维护，应用里不要写；
+    # deferred: 普通查询不加载这一列
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True,
+                                                         comment="全文检索向量 (触发器维护)")
+
     def __repr__(self):
         return f"<Product(sku={self.sku}, title={self.title})>"
\ No newline at end of file
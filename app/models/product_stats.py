@@ -0,0 +1,34 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import BigInteger, Integer, Numeric, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ProductStats(Base):
+    """
+    每个用户一行的商品汇总 (GET /products/stats 直接读这一行)
+    由 products 表上的语句级触发器增量维护，不要在应用里写；
+    定时任务 reconcile_product_stats 会和 products 实际聚合结果对账，修正偏差
+    """
+    __tablename__ = "product_stats"
+
+    # 删除用户时汇总行跟着删掉
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True,
+                                          comment="所属用户ID")
+    product_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", comment="商品数")
+    total_stock: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", comment="库存总数")
+    # 金额用 numeric 累加，增量维护和全量聚合的结果完全一致，不会有浮点误差
+    stock_value: Mapped[Decimal] = mapped_column(Numeric, default=0, server_default="0",
+                                                 comment="库存货值 sum(price * stock_qty)")
+    stock_cost: Mapped[Decimal] = mapped_column(Numeric, default=0, server_default="0",
+                                                comment="库存成本 sum(supplier_cost * stock_qty)")
+    margin_sum: Mapped[Decimal] = mapped_column(Numeric, default=0, server_default="0",
+                                                comment="毛利合计 sum(price - supplier_cost)，除以商品数得平均毛利")
+    draft_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    published_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    archived_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    ai_optimized_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    out_of_stock_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", comment="stock_qty <= 0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Literal, Optional, List, Union
 from datetime import datetime
 
 
@@ -39,4 +39,102 @@ class ProductResponse(ProductBase):
     updated_at: datetime
 
     # 允许从 ORM 对象读取数据 (旧版叫 orm_mode = True)
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# 4. 部分更新 (只更新传进来的字段)
+class ProductUpdate(BaseModel):
+    title: Optional[str] = None
+    sku: Optional[str] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    stock_qty: Optional[int] = None
+    description_original: Optional[str] = None
+    source_url: Optional[str] = None
+    supplier_cost: Optional[float] = None
+
+
+# 4.1 列表的过滤和排序 (GET /products 的查询参数)
+# 排序字段只能从白名单里选，前面加 - 表示倒序；每个排序字段都有 (owner_id, 字段, id) 索引
+ProductSort = Literal["id", "-id", "price", "-price", "updated_at", "-updated_at", "title", "-title"]
+
+
+class ProductListFilter(BaseModel):
+    status: Optional[Literal["draft", "published", "archived"]] = None
+    price_min: Optional[float] = Field(None, ge=0)
+    price_max: Optional[float] = Field(None, ge=0)
+    # 低库存: stock_qty < stock_lt
+    stock_lt: Optional[int] = None
+    is_ai_optimized: Optional[bool] = None
+    updated_since: Optional[datetime] = None
+    sort: ProductSort = "id"
+
+
+# 5. 批量操作 (POST /products/bulk)
+# 一批最多多少个操作
+MAX_BULK_OPERATIONS = 5000
+
+
+class BulkCreate(BaseModel):
+    op: Literal["create"]
+    data: ProductCreate
+
+
+class BulkUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: ProductUpdate
+
+
+class BulkDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+class ProductBulkRequest(BaseModel):
+    operations: List[Annotated[Union[BulkCreate, BulkUpdate, BulkDelete], Field(discriminator="op")]] = Field(
+        ..., min_length=1, max_length=MAX_BULK_OPERATIONS
+    )
+    # False: 全部成功才提交，任何一项失败整批回滚
+    # True: 失败的项单独跳过，其余照常提交
+    allow_partial: bool = False
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    op: str
+    # ok: 已提交；error: 这一项失败；skipped: 本身没问题，但整批回滚了 (allow_partial=False)
+    status: Literal["ok", "error", "skipped"]
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ProductBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+
+# 6. 搜索结果 (GET /products/search)
+class ProductSearchHit(ProductResponse):
+    # 相关度: 全文检索的排名 + 标题 / SKU 的模糊匹配相似度，越大越相关
+    score: float
+    # 命中的词用 <mark></mark> 包起来；只有模糊匹配命中时和原文一样
+    title_highlight: str
+    # 描述的摘要，命中的词同样高亮 (没有描述时为 None)
+    snippet: Optional[str] = None
+
+
+# 7. 库存统计 (GET /products/stats)
+class ProductStatsResponse(BaseModel):
+    product_count: int = 0
+    total_stock: int = 0
+    # 库存货值 sum(price * stock_qty) / 库存成本 sum(supplier_cost * stock_qty)
+    stock_value: float = 0.0
+    stock_cost: float = 0.0
+    # 平均毛利 avg(price - supplier_cost)，没有商品时为 None
+    average_margin: Optional[float] = None
+    status_counts: dict[str, int] = Field(default_factory=lambda: {"draft": 0, "published": 0, "archived": 0})
+    ai_optimized_count: int = 0
+    out_of_stock_count: int = 0
+    # 汇总最后一次变化的时间 (没有数据时为 None)
+    updated_at: Optional[datetime] = None
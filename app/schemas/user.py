@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
 
 
@@ -22,6 +22,17 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+# 当前登录用户 (认证依赖返回的轻量对象，会被缓存，所以是只读的)
+class UserPrincipal(BaseModel):
+    id: int
+    email: str
+    full_name: Optional[str] = None
+    is_active: bool = True
+    is_superuser: bool = False
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 # Token 响应格式
 class Token(BaseModel):
     access_token: str
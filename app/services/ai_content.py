@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from redis import asyncio as aioredis
+from sqlalchemy import literal_column, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import RELEASE_LOCK_SCRIPT, new_lock_token
+from app.db.replica import replica_router
+from app.models.product import Product
+from app.services.product_cache import ProductCache
+
+# 同一时间只跑一轮 (Celery 重复投递、上一轮还没结束时，新的一轮直接跳过)
+LOCK_KEY = "ai_content:lock"
+
+# seo_keywords 列的长度上限，写回前统一截断，不依赖各个 provider 自己控制
+SEO_KEYWORDS_MAX_LENGTH = Product.__table__.c.seo_keywords.type.length
+
+# 一批生成结果用一条 UPDATE 写回；只写仍然待优化的商品，期间被用户手工标记过的不覆盖
+WRITE_BACK_SQL = text("""
+UPDATE products AS p
+SET description_ai = v.description_ai, seo_keywords = v.seo_keywords, is_ai_optimized = true, updated_at = now()
+FROM unnest(CAST(:ids AS integer[]), CAST(:descriptions AS text[]), CAST(:keywords AS text[]))
+    AS v(id, description_ai, seo_keywords)
+WHERE p.id = v.id AND p.is_ai_optimized = false
+RETURNING p.owner_id
+""")
+
+
+@dataclass(frozen=True)
+class AIContent:
+    description_ai: str
+    seo_keywords: str
+
+
+class RateLimiter:
+    """按固定间隔放行请求 (每秒 rate 个，0 表示不限速)；多个协程共用时按到达顺序排队"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AIProvider(ABC):
+    """
+    AI 内容生成的接口，接新的模型服务就继承它实现 generate，再登记到 PROVIDERS
+    rate_per_second 是默认限速，可以用 AI_RATE_LIMITS 按名字覆盖
+    """
+    name = "base"
+    rate_per_second: float = 0
+
+    def __init__(self):
+        self.limiter = RateLimiter(settings.AI_RATE_LIMITS.get(self.name, self.rate_per_second))
+
+    @abstractmethod
+    async def generate(self, product: dict) -> AIContent:
+        ...
+
+
+class FakeAIProvider(AIProvider):
+    """本地假实现: 等待固定的延迟后返回由标题拼出来的内容，用来开发和压测吞吐量"""
+    name = "fake"
+
+    def __init__(self, latency_ms: Optional[float] = None):
+        super().__init__()
+        self.latency = (settings.AI_FAKE_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+
+    async def generate(self, product: dict) -> AIContent:
+        await asyncio.sleep(self.latency)
+        title = product["title"]
+        words = list(dict.fromkeys(word.strip(",.").lower() for word in title.split() if len(word) > 2))
+        return AIContent(
+            description_ai=f"{title}: {product.get('description_original') or 'quality product'}, ready to ship.",
+            seo_keywords=",".join(words[:8] + [hashlib.md5(title.encode()).hexdigest()[:6]]),
+        )
+
+
+PROVIDERS: dict[str, type[AIProvider]] = {
+    FakeAIProvider.name: FakeAIProvider,
+}
+
+
+def get_provider(name: Optional[str] = None) -> AIProvider:
+    name = name or settings.AI_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"未知的 AI_PROVIDER: {name}，可选: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+class AIContentService:
+    """
+    批量生成商品的 AI 文案 (Celery 任务 generate_ai_content 调用，走 ai-queue)
+    1. 按 (owner_id, id) 游标分批读取 is_ai_optimized = false 的商品 (部分索引 ix_products_owner_id_id_not_optimized)，
+       读完立即提交，调用模型期间不占数据库连接里的事务
+    2. 一批里的商品并发调用 provider: 并发数不超过 AI_CONCURRENCY，请求速率受 provider 的限速控制
+    3. 生成成功的一条 UPDATE 写回 (seo_keywords 截断到列的长度)；失败的保持待优化，下一轮再试
+    """
+
+    @staticmethod
+    async def run(db: AsyncSession, redis: aioredis.Redis, provider: Optional[AIProvider] = None,
+                  max_seconds: Optional[float] = None) -> dict:
+        token = new_lock_token()
+        if not await redis.set(LOCK_KEY, token, nx=True, ex=int(settings.AI_RUN_SECONDS) + 60):
+            logger.warning("上一轮 AI 内容生成还没结束，跳过本轮")
+            return {"skipped": True}
+
+        provider = provider or get_provider()
+        deadline = time.monotonic() + (settings.AI_RUN_SECONDS if max_seconds is None else max_seconds)
+        summary = {"optimized": 0, "failed": 0}
+        try:
+            async for batch in AIContentService._pending(db):
+                results = await AIContentService.generate_batch(provider, batch)
+                done = {product_id: content for product_id, content in results.items()
+                        if isinstance(content, AIContent)}
+                summary["failed"] += len(results) - len(done)
+                summary["optimized"] += await AIContentService._write_back(db, redis, done)
+                if time.monotonic() >= deadline:
+                    break
+            return summary
+        finally:
+            await redis.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+
+    @staticmethod
+    async def generate_batch(provider: AIProvider, batch: list[dict]) -> dict[int, AIContent | Exception]:
+        """并发生成一批商品的内容，返回 {商品 id: 结果或异常}"""
+        semaphore = asyncio.Semaphore(settings.AI_CONCURRENCY)
+
+        async def generate(product: dict) -> AIContent:
+            async with semaphore:
+                await provider.limiter.acquire()
+                return await provider.generate(product)
+
+        results = await asyncio.gather(*(generate(product) for product in batch), return_exceptions=True)
+        for product, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning(f"AI 内容生成失败 (product_id={product['id']}, provider={provider.name}): {result}")
+        return {product["id"]: result for product, result in zip(batch, results)}
+
+    @staticmethod
+    async def _pending(db: AsyncSession) -> AsyncIterator[list[dict]]:
+        # 条件写成 SQL 字面量，PG 才能匹配上部分索引的 is_ai_optimized = false
+        pending = Product.is_ai_optimized == literal_column("false")
+        last = (0, 0)
+        while True:
+            rows = (await db.execute(
+                select(Product.owner_id, Product.id, Product.title, Product.description_original)
+                .filter(pending, tuple_(Product.owner_id, Product.id) > tuple_(*last))
+                .order_by(Product.owner_id, Product.id)
+                .limit(settings.AI_BATCH_SIZE)
+            )).all()
+            await db.commit()
+            if not rows:
+                return
+
+            yield [{"id": row.id, "title": row.title, "description_original": row.description_original}
+                   for row in rows]
+            if len(rows) < settings.AI_BATCH_SIZE:
+                return
+            last = (rows[-1].owner_id, rows[-1].id)
+
+    @staticmethod
+    async def _write_back(db: AsyncSession, redis: aioredis.Redis, done: dict[int, AIContent]) -> int:
+        if not done:
+            return 0
+        owner_ids = (await db.execute(WRITE_BACK_SQL, {
+            "ids": list(done),
+            "descriptions": [content.description_ai for content in done.values()],
+            "keywords": [content.seo_keywords[:SEO_KEYWORDS_MAX_LENGTH] for content in done.values()],
+        })).scalars().all()
+        await db.commit()
+
+        for owner_id in set(owner_ids):
+            await ProductCache.invalidate(owner_id, redis)
+            await replica_router.mark_write(owner_id, redis)
+        return len(owner_ids)
@@ -1,10 +1,230 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Optional, Union
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.session import AsyncSessionLocal
 from app.models.audit import AuditLog
 
+# 队列里的停止标记
+_STOP = object()
+
+# 分区命名: audit_logs_y2025m01 存 2025-01-01 ~ 2025-02-01 (UTC) 的数据
+PARTITION_NAME = "audit_logs_y{year}m{month:02d}"
+PARTITION_PATTERN = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+
+
+def _add_months(d: date, months: int) -> date:
+    year, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + year, month + 1, 1)
+
+
+def _append_lines(path: Path, records: list[dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps({**record, "created_at": record["created_at"].isoformat()}, ensure_ascii=False) + "\n")
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """连不上 / 连接断开: 过一会儿重试可能成功；其他错误 (数据超长、约束冲突等) 重试多少次都一样"""
+    if isinstance(e, (OSError, asyncio.TimeoutError)):
+        return True
+    return isinstance(e, DBAPIError) and (e.connection_invalidated or isinstance(e, (InterfaceError, OperationalError)))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned_replaying(path: Path) -> list[Path]:
+    """已经退出的进程重放到一半留下的 <溢出文件>.<pid>.replaying"""
+    orphaned = []
+    for candidate in path.parent.glob(f"{path.name}.*.replaying"):
+        try:
+            pid = int(candidate.name[len(path.name) + 1:-len(".replaying")])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            orphaned.append(candidate)
+    return orphaned
+
+
+def _take_spilled(path: Path) -> list[dict]:
+    """
+    取出溢出文件 (以及之前进程没重放完的文件) 里的记录，并删除文件
+    多个进程同时启动时靠 os.replace 的原子性抢文件: 改名成带自己 pid 的文件后再读，
+    被别的进程抢先改名的 (FileNotFoundError) 直接跳过
+    """
+    mine = path.with_name(f"{path.name}.{os.getpid()}.replaying")
+    records = []
+    for source in [mine, *_orphaned_replaying(path), path]:
+        try:
+            if source != mine:
+                os.replace(source, mine)
+            with open(mine, encoding="utf-8") as f:
+                records += [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            continue
+        mine.unlink()
+    for record in records:
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+    return records
+
+
+class AuditWriter:
+    """
+    审计日志异步批量写入
+    业务代码只负责把记录放进内存队列，后台任务攒够 AUDIT_BATCH_SIZE 条
+    或者等满 AUDIT_FLUSH_INTERVAL_MS 毫秒后，用一条多行 INSERT 写入，不占用业务事务
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.spilled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+        # 上次溢出到文件的记录先补写入库
+        spilled = await run_in_threadpool(_take_spilled, Path(settings.AUDIT_SPILL_PATH))
+        for i in range(0, len(spilled), settings.AUDIT_BATCH_SIZE):
+            await self._flush(spilled[i:i + settings.AUDIT_BATCH_SIZE])
+        if spilled:
+            logger.info(f"补写溢出的审计日志 {len(spilled)} 条")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """关闭时把队列里剩下的记录全部写完 (在 lifespan 关闭阶段调用)"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+
+    async def put(self, record: dict) -> None:
+        if not self.running:
+            # 没有启动后台任务 (比如脚本里直接调用)，直接写库
+            await self._flush([record])
+            return
+
+        if settings.AUDIT_OVERFLOW == "block":
+            await self._queue.put(record)
+            return
+
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if settings.AUDIT_OVERFLOW == "drop":
+                self.dropped += 1
+                logger.warning(f"审计队列已满，丢弃记录 (累计 {self.dropped} 条)")
+            else:
+                self.spilled += 1
+                await run_in_threadpool(_append_lines, Path(settings.AUDIT_SPILL_PATH), [record])
+
+    async def put_many(self, records: list[dict]) -> None:
+        if not self.running:
+            for i in range(0, len(records), settings.AUDIT_BATCH_SIZE):
+                await self._flush(records[i:i + settings.AUDIT_BATCH_SIZE])
+            return
+        for record in records:
+            await self.put(record)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + settings.AUDIT_FLUSH_INTERVAL_MS / 1000
+            while len(batch) < settings.AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]) -> None:
+        # 写库失败不能丢数据，也不能让后台任务退出
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(AuditLog).values(batch))
+                await db.commit()
+            return
+        except Exception as e:
+            if _is_connection_error(e):
+                await self._spill(batch)
+                return
+            logger.warning(f"审计日志批量写入失败，逐条重试: {e}")
+        await self._flush_one_by_one(batch)
+
+    async def _flush_one_by_one(self, batch: list[dict]) -> None:
+        """
+        整批里有写不进去的记录时逐条重试，每条一个 SAVEPOINT
+        还是失败的记录转到死信文件；如果不转走，溢出文件每次启动补写都会失败、再溢出，越积越多
+        """
+        dead = []
+        try:
+            async with AsyncSessionLocal() as db:
+                for record in batch:
+                    try:
+                        async with db.begin_nested():
+                            await db.execute(insert(AuditLog).values([record]))
+                    except Exception as e:
+                        if _is_connection_error(e):
+                            raise
+                        logger.error(f"审计日志写入失败，转存到 {settings.AUDIT_DEAD_LETTER_PATH}: {e}")
+                        dead.append(record)
+                await db.commit()
+        except Exception:
+            # 重试过程中连接断了，还没提交的都按溢出处理
+            await self._spill([record for record in batch if record not in dead])
+        if dead:
+            await run_in_threadpool(_append_lines, Path(settings.AUDIT_DEAD_LETTER_PATH), dead)
+
+    async def _spill(self, batch: list[dict]) -> None:
+        # 数据库暂时不可用，先落到本地文件，下次启动时补写
+        logger.exception(f"审计日志写入失败，{len(batch)} 条记录转存到 {settings.AUDIT_SPILL_PATH}")
+        await run_in_threadpool(_append_lines, Path(settings.AUDIT_SPILL_PATH), batch)
+
+
+audit_writer = AuditWriter()
+
+
 class AuditService:
     @staticmethod
     async def log(
-        db: AsyncSession,
         user_id: int,
         action: str,
         resource: str,
@@ -12,14 +232,92 @@ class AuditService:
         details: dict = None,
         ip: str = None
     ):
-        audit = AuditLog(
-            user_id=user_id,
-            action=action,
-            target_resource=resource,
-            target_id=str(resource_id),
-            details=details,
-            ip_address=ip
-        )
-        db.add(audit)
-        # 注意：这里不commit，跟随业务主事务一起commit，或者手动commit
-        # await db.commit()
\ No newline at end of file
+        # 注意：审计记录不再跟随业务事务提交，而是交给 audit_writer 异步批量写入
+        # created_at 在这里生成，保证记录的是操作发生的时间而不是入库时间
+        await audit_writer.put({
+            "user_id": user_id,
+            "action": action,
+            "target_resource": resource,
+            "target_id": str(resource_id),
+            "details": details,
+            "ip_address": ip,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    @staticmethod
+    async def log_many(user_id: int, resource: str, entries: list[dict], ip: str = None):
+        """批量操作的审计，entries 每项包含 action / resource_id / details (可选)"""
+        created_at = datetime.now(timezone.utc)
+        await audit_writer.put_many([
+            {
+                "user_id": user_id,
+                "action": entry["action"],
+                "target_resource": resource,
+                "target_id": str(entry["resource_id"]),
+                "details": entry.get("details"),
+                "ip_address": ip,
+                "created_at": created_at,
+            }
+            for entry in entries
+        ])
+
+
+class AuditPartitionService:
+    """
+    audit_logs 按月分区的维护 (启动时和每日定时任务里调用)
+    - ensure_partitions: 提前创建当前月及未来几个月的分区
+    - drop_expired: 超过保留期的分区整个 DROP，比 DELETE 大量旧数据便宜得多
+    """
+
+    @staticmethod
+    async def _lock(conn: Union[AsyncConnection, AsyncSession]) -> None:
+        # 多个进程同时启动时串行执行，避免并发建同一个分区报错
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('audit_logs_partitions'))"))
+
+    @staticmethod
+    async def ensure_partitions(conn: Union[AsyncConnection, AsyncSession],
+                                months_ahead: int = None) -> list[str]:
+        if months_ahead is None:
+            months_ahead = settings.AUDIT_PARTITION_MONTHS_AHEAD
+        await AuditPartitionService._lock(conn)
+
+        current = datetime.now(timezone.utc).date().replace(day=1)
+        names = []
+        for i in range(months_ahead + 1):
+            lower = _add_months(current, i)
+            upper = _add_months(lower, 1)
+            name = PARTITION_NAME.format(year=lower.year, month=lower.month)
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_logs "
+                f"FOR VALUES FROM ('{lower} 00:00:00+00') TO ('{upper} 00:00:00+00')"
+            ))
+            names.append(name)
+        return names
+
+    @staticmethod
+    async def drop_expired(conn: Union[AsyncConnection, AsyncSession],
+                           retention_months: int = None) -> list[str]:
+        if retention_months is None:
+            retention_months = settings.AUDIT_RETENTION_MONTHS
+        if retention_months <= 0:
+            return []
+        await AuditPartitionService._lock(conn)
+
+        # 整个分区都早于 cutoff 才删除
+        cutoff = _add_months(datetime.now(timezone.utc).date().replace(day=1), -retention_months)
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'audit_logs'"
+        ))
+        dropped = []
+        for (name,) in result.all():
+            match = PARTITION_PATTERN.match(name)
+            if not match:
+                continue
+            upper = _add_months(date(int(match.group(1)), int(match.group(2)), 1), 1)
+            if upper <= cutoff:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        return dropped
@@ -1,29 +1,178 @@
-import pandas as pd
-from io import BytesIO
-from fastapi import UploadFile
+import csv
+import json
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO, TextIOWrapper
+from typing import AsyncIterator, Any, BinaryIO, Iterator
+
+from openpyxl import Workbook, load_workbook
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+
+from app.db.session import AsyncSessionLocal
+from app.models.product import Product
+from app.schemas.product import ProductResponse
+
+# 导出的列 (与 ProductResponse 字段保持一致)
+EXPORT_COLUMNS = list(ProductResponse.model_fields)
+# 每次从服务端游标取多少行，内存占用只跟这个值有关，跟总行数无关
+EXPORT_CHUNK_SIZE = 1000
+# 读取生成好的 xlsx 临时文件时每次发送的字节数
+EXPORT_READ_SIZE = 64 * 1024
+# 导入时每批处理的行数 (一批对应一条多行 INSERT)
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_EXTENSIONS = (".csv", ".xlsx", ".xlsm")
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _flat_value(value: Any):
+    """CSV/Excel 单元格只能放标量，列表类字段 (如 images) 转成 JSON 字符串"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _excel_value(value: Any):
+    # Excel 不支持带时区的时间，统一转成 UTC 后去掉时区
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return _flat_value(value)
+
+
+def _append_rows(ws, rows) -> None:
+    for row in rows:
+        ws.append([_excel_value(v) for v in row])
+
+
+def _iter_csv_rows(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    # utf-8-sig 兼容 Excel 另存为 CSV 时带的 BOM
+    reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    # 行号按表格习惯算: 表头是第 1 行，数据从第 2 行开始
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def _iter_xlsx_rows(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    # read_only 模式按需解析 xml，不会把整张表读进内存
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for row_number, values in enumerate(rows, start=2):
+            if all(v is None for v in values):
+                continue
+            yield row_number, dict(zip(header, values))
+    finally:
+        wb.close()
 
 
 class DataService:
     @staticmethod
-    async def parse_excel(file: UploadFile) -> list[dict]:
-        """读取上传的 Excel 并转为字典列表"""
-        contents = await file.read()
-        # 使用 pandas 读取二进制流
-        df = pd.read_excel(BytesIO(contents))
+    def is_supported_import(filename: str) -> bool:
+        return (filename or "").lower().endswith(IMPORT_EXTENSIONS)
+
+    @staticmethod
+    def iter_import_chunks(file: BinaryIO, filename: str,
+                           chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[list[tuple[int, dict]]]:
+        """
+        流式读取上传的 CSV / XLSX，每次产出 chunk_size 行 [(行号, 行数据), ...]
+        同步生成器，Celery 里可以直接用；在接口里请用 aiter_import_chunks
+        """
+        if (filename or "").lower().endswith(".csv"):
+            rows = _iter_csv_rows(file)
+        else:
+            rows = _iter_xlsx_rows(file)
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-        # 数据清洗：填充空值，转为字典
-        df = df.fillna("")
-        return df.to_dict(orient="records")
+    @staticmethod
+    def aiter_import_chunks(file: BinaryIO, filename: str,
+                            chunk_size: int = IMPORT_CHUNK_SIZE) -> AsyncIterator[list[tuple[int, dict]]]:
+        """解析文件是阻塞操作，放到线程池里逐批读取，不阻塞事件循环"""
+        return iterate_in_threadpool(DataService.iter_import_chunks(file, filename, chunk_size))
+
+    @staticmethod
+    async def iter_product_rows(owner_id: int,
+                                session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[list[tuple]]:
+        """
+        用服务端游标 (yield_per) 分批读取某个用户的商品
+        只查导出需要的列，不构造 ORM 对象，也不逐行走 Pydantic 校验
+        session_factory 可以传只读副本的会话工厂
+        """
+        query = (
+            select(*[getattr(Product, column) for column in EXPORT_COLUMNS])
+            .filter(Product.owner_id == owner_id)
+            .order_by(Product.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        # 注意：StreamingResponse 在接口函数返回之后才开始迭代，
+        # 这时依赖注入的 db 会话可能已经关闭，所以这里自己开一个会话
+        async with session_factory() as db:
+            result = await db.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+    @staticmethod
+    async def stream_csv(owner_id: int,
+                         session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[bytes]:
+        """逐批生成 CSV，每批数据写完就发出去"""
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+
+        # 带 BOM，Excel 直接打开中文不乱码
+        writer.writerow(EXPORT_COLUMNS)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+        async for rows in DataService.iter_product_rows(owner_id, session_factory):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_flat_value(v) for v in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    async def stream_ndjson(owner_id: int,
+                            session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[bytes]:
+        """逐批生成 NDJSON (每行一个 JSON 对象)"""
+        async for rows in DataService.iter_product_rows(owner_id, session_factory):
+            lines = [
+                json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=_json_default)
+                for row in rows
+            ]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
 
     @staticmethod
-    def export_excel(data: list[dict]) -> BytesIO:
-        """将字典列表导出为 Excel 二进制流"""
-        df = pd.DataFrame(data)
-        output = BytesIO()
+    async def stream_excel(owner_id: int,
+                           session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[bytes]:
+        """
+        用 openpyxl 的 write-only 模式逐行写 xlsx
+        行数据由 openpyxl 写进磁盘临时文件，内存占用不随行数增长；
+        xlsx 是 zip 格式，必须整个文件生成完才能开始发送，要边查边发请用 CSV / NDJSON
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        ws.append(EXPORT_COLUMNS)
 
-        # 写入 Excel
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
+        async for rows in DataService.iter_product_rows(owner_id, session_factory):
+            # 写 xml 是纯 CPU 操作，放到线程池里，不阻塞事件循环
+            await run_in_threadpool(_append_rows, ws, rows)
 
-        output.seek(0)
-        return output
\ No newline at end of file
+        with tempfile.TemporaryFile() as output:
+            await run_in_threadpool(wb.save, output)
+            output.seek(0)
+            while chunk := await run_in_threadpool(output.read, EXPORT_READ_SIZE):
+                yield chunk
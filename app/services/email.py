@@ -1,33 +1,267 @@
+import json
+import smtplib
+import time
+import uuid
+from email.message import EmailMessage
 from pathlib import Path
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from typing import Any, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from redis import Redis
+from redis import asyncio as aioredis
+
 from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import RELEASE_LOCK_SCRIPT, new_lock_token, redis_client
+
+# Redis key 设计:
+#   email:outbox         list，待发送的邮件 (RPUSH 入队，消费者从头部取)
+#   email:outbox:retry   zset，临时失败等待重试的邮件，score 是下次重试的时间戳
+#   email:outbox:dead    list，永久失败 / 重试次数用完的邮件，留给人工排查
+#   email:outbox:lock    同一时间只有一个消费者，限速才是全局的
+OUTBOX_KEY = "email:outbox"
+RETRY_KEY = "email:outbox:retry"
+DEAD_KEY = "email:outbox:dead"
+LOCK_KEY = "email:outbox:lock"
 
-# 配置项
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=settings.MAIL_TLS,
-    MAIL_SSL_TLS=settings.MAIL_SSL,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True
-)
+# 邮件模板目录 (Jinja2，.html 自动转义)
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+templates = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
 
 
 class EmailService:
+    """
+    发邮件只是写进 Redis 里的发件箱，不在请求里连 SMTP；
+    Celery 定时任务 deliver_emails 用常驻的 SMTP 连接批量、限速发送 (见 EmailDelivery)
+    """
+
+    @staticmethod
+    async def send_email(subject: str, email_to: str, body: str,
+                         redis: Optional[aioredis.Redis] = None) -> str:
+        """直接给出 HTML 正文"""
+        return await EmailService._enqueue(redis, {"to": email_to, "subject": subject, "body": body})
+
     @staticmethod
-    async def send_email(subject: str, email_to: str, body: str):
-        message = MessageSchema(
-            subject=subject,
-            recipients=[email_to],
-            body=body,
-            subtype=MessageType.html
+    async def send_template(subject: str, email_to: str, template: str, context: dict[str, Any],
+                            redis: Optional[aioredis.Redis] = None) -> str:
+        """用 app/templates/email 下的模板，发送时再渲染"""
+        return await EmailService._enqueue(
+            redis, {"to": email_to, "subject": subject, "template": template, "context": context}
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message)
+    @staticmethod
+    async def _enqueue(redis: Optional[aioredis.Redis], message: dict) -> str:
+        message = {"id": uuid.uuid4().hex, "attempts": 0, **message}
+        await (redis or redis_client).rpush(OUTBOX_KEY, json.dumps(message, ensure_ascii=False, default=str))
+        return message["id"]
+
+
+class SmtpUnavailable(Exception):
+    """连不上 / 登录不了 SMTP 服务器 (和具体哪封邮件无关)"""
+
+
+def _is_disconnect(error: Exception) -> bool:
+    # SMTPException 也是 OSError 的子类，这里只要真正的网络错误
+    return isinstance(error, smtplib.SMTPServerDisconnected) or (
+        isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+    )
+
+
+class SmtpConnection:
+    """
+    常驻的 SMTP 连接 (每个 Worker 进程一个，跨任务复用)
+    省掉每封邮件一次的 TCP + TLS 握手和登录；空闲久了先 NOOP 探测，断了就重连
+    """
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def send(self, message: EmailMessage) -> None:
+        try:
+            smtp = self._connection()
+        except (smtplib.SMTPException, OSError) as e:
+            self.close()
+            raise SmtpUnavailable(str(e) or type(e).__name__) from e
+        try:
+            smtp.send_message(message)
+        except Exception as e:
+            if _is_disconnect(e):
+                self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > settings.EMAIL_SMTP_IDLE_CHECK_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+
+        if self._smtp is None:
+            timeout = settings.EMAIL_SMTP_TIMEOUT_SECONDS
+            if settings.MAIL_SSL:
+                self._smtp = smtplib.SMTP_SSL(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=timeout)
+            else:
+                self._smtp = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=timeout)
+                if settings.MAIL_TLS:
+                    self._smtp.starttls()
+            if settings.MAIL_USERNAME:
+                self._smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+            self._last_used = time.monotonic()
+        return self._smtp
+
 
-# 使用示例 (可以在 API 中直接调用):
-# await EmailService.send_email("欢迎注册", "user@example.com", "<h1>你好!</h1>")
\ No newline at end of file
+smtp_connection = SmtpConnection()
+
+
+def _is_transient(error: Exception) -> bool:
+    """连不上、断线、超时、4xx 是临时错误，可以重试；5xx (地址不存在、被拒收等) 重试也没用"""
+    if isinstance(error, SmtpUnavailable) or _is_disconnect(error):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class EmailDelivery:
+    """
+    发件箱的消费者 (Celery 任务 deliver_emails 调用)
+    - 单消费者 (Redis 锁)，按 EMAIL_RATE_PER_SECOND 限速
+    - 每批取 EMAIL_BATCH_SIZE 封，同一批里模板只加载一次，模板和参数都相同的只渲染一次
+    - 先发送再从队列里删除，Worker 中途挂掉最多重复发一封，不会丢
+    - 临时错误按指数退避重试；连接层面的错误 (服务器挂了) 直接结束本轮，不把整个队列都耗在重试上
+    """
+
+    @staticmethod
+    def drain(redis: Redis, smtp: SmtpConnection = smtp_connection) -> dict:
+        token = new_lock_token()
+        if not redis.set(LOCK_KEY, token, nx=True, ex=int(settings.EMAIL_DRAIN_SECONDS) + 60):
+            return {"skipped": True}
+
+        summary = {"sent": 0, "retry": 0, "dead": 0}
+        deadline = time.monotonic() + settings.EMAIL_DRAIN_SECONDS
+        try:
+            EmailDelivery._requeue_due(redis)
+            while time.monotonic() < deadline:
+                raw = redis.lrange(OUTBOX_KEY, 0, settings.EMAIL_BATCH_SIZE - 1)
+                if not raw:
+                    break
+                stop = False
+                for item, outcome in EmailDelivery.send_batch(raw, smtp, deadline):
+                    if outcome == "sent":
+                        summary["sent"] += 1
+                    elif outcome == "dead":
+                        redis.rpush(DEAD_KEY, item)
+                        summary["dead"] += 1
+                    else:
+                        summary[EmailDelivery._schedule_retry(redis, item)] += 1
+                        stop = outcome == "offline"
+                    redis.lpop(OUTBOX_KEY)
+                if stop:
+                    break
+        finally:
+            redis.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+        return summary
+
+    @staticmethod
+    def send_batch(raw: list[str], smtp: SmtpConnection, deadline: float = float("inf")):
+        """
+        逐封发送，每封发完 yield (原始消息, 结果)，结果是 sent / retry / offline / dead
+        到了 deadline 或者 SMTP 服务器连不上时提前结束，剩下的留在队列里
+        """
+        rate = settings.EMAIL_RATE_PER_SECOND
+        interval = 1 / rate if rate > 0 else 0.0
+        rendered = EmailDelivery._render_batch(raw)
+        next_send = time.monotonic()
+        for item, message in zip(raw, rendered):
+            if isinstance(message, Exception):
+                logger.error(f"邮件渲染失败，放入死信队列: {message}")
+                yield item, "dead"
+                continue
+
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if next_send > now:
+                time.sleep(next_send - now)
+            next_send = max(next_send, now) + interval
+
+            try:
+                smtp.send(message)
+            except Exception as e:
+                if not _is_transient(e):
+                    logger.error(f"邮件发送失败 ({message['To']})，放入死信队列: {e}")
+                    yield item, "dead"
+                    continue
+                logger.warning(f"邮件发送临时失败 ({message['To']})，稍后重试: {e}")
+                if isinstance(e, SmtpUnavailable) or _is_disconnect(e):
+                    yield item, "offline"
+                    return
+                yield item, "retry"
+                continue
+            yield item, "sent"
+
+    @staticmethod
+    def _render_batch(raw: list[str]) -> list[EmailMessage | Exception]:
+        loaded: dict[str, Any] = {}
+        bodies: dict[tuple[str, str], str] = {}
+        messages = []
+        for item in raw:
+            try:
+                data = json.loads(item)
+                body = data.get("body")
+                if body is None:
+                    name = data["template"]
+                    key = (name, json.dumps(data.get("context") or {}, sort_keys=True, default=str))
+                    if key not in bodies:
+                        if name not in loaded:
+                            loaded[name] = templates.get_template(name)
+                        bodies[key] = loaded[name].render(**(data.get("context") or {}))
+                    body = bodies[key]
+
+                message = EmailMessage()
+                message["From"] = settings.MAIL_FROM
+                message["To"] = data["to"]
+                message["Subject"] = data["subject"]
+                message["Message-ID"] = f"<{data['id']}@{settings.MAIL_SERVER}>"
+                message.set_content(body, subtype="html")
+                messages.append(message)
+            except Exception as e:
+                messages.append(e)
+        return messages
+
+    @staticmethod
+    def _schedule_retry(redis: Redis, item: str) -> str:
+        """放进重试队列返回 retry；重试次数用完放进死信队列返回 dead"""
+        data = json.loads(item)
+        data["attempts"] = data.get("attempts", 0) + 1
+        if data["attempts"] >= settings.EMAIL_MAX_ATTEMPTS:
+            logger.error(f"邮件发送 {data['attempts']} 次仍然失败，放入死信队列: {data['to']}")
+            redis.rpush(DEAD_KEY, json.dumps(data, ensure_ascii=False))
+            return "dead"
+        delay = settings.EMAIL_RETRY_BACKOFF_SECONDS * 2 ** (data["attempts"] - 1)
+        redis.zadd(RETRY_KEY, {json.dumps(data, ensure_ascii=False): time.time() + delay})
+        return "retry"
+
+    @staticmethod
+    def _requeue_due(redis: Redis) -> None:
+        """到了重试时间的邮件放回发件箱末尾"""
+        due = redis.zrangebyscore(RETRY_KEY, "-inf", time.time())
+        if due:
+            pipe = redis.pipeline(transaction=True)
+            pipe.zrem(RETRY_KEY, *due)
+            pipe.rpush(OUTBOX_KEY, *due)
+            pipe.execute()
@@ -1,25 +1,113 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import redis_client, subscribe_forever
+from app.db.session import AsyncSessionLocal
 from app.models.feature import FeatureFlag
 from app.models.user import User
+from app.schemas.user import UserPrincipal
+
+# 开关变更通知频道 / 版本号 key
+FLAGS_CHANNEL = "feature_flags:changed"
+FLAGS_VERSION_KEY = "feature_flags:version"
+
+
+@dataclass(frozen=True)
+class FlagRule:
+    name: str
+    is_global_enabled: bool
+    rollout_percentage: int
+    allow_user_ids: frozenset[int]
+
+
+def _bucket(feature_name: str, user_id: int) -> int:
+    """用户稳定地落在 0-99 的某个桶里 (同一个开关下同一个用户结果永远一样)"""
+    digest = hashlib.sha256(f"{feature_name}:{user_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") % 100
 
 
 class FeatureService:
-    @staticmethod
-    async def is_enabled(db: AsyncSession, feature_name: str, user: User = None) -> bool:
-        # 1. 查数据库中的全局开关
-        # (生产环境建议把这个结果缓存到 Redis，避免每次都查 DB)
-        result = await db.execute(select(FeatureFlag).filter(FeatureFlag.name == feature_name))
-        flag = result.scalars().first()
+    """
+    功能开关: 启动时把 feature_flags 整表加载成进程内快照，判断开关只是一次字典查找
+    修改开关后调用 notify_changed()，所有进程通过 Pub/Sub 收到通知后重新加载；
+    另外定时比对 Redis 里的版本号，防止漏掉通知
+    """
+    _flags: dict[str, FlagRule] = {}
+    _version: Optional[str] = None
+
+    @classmethod
+    async def load(cls, db: AsyncSession) -> None:
+        result = await db.execute(select(FeatureFlag))
+        # 整体替换字典，读的一方永远看到完整的快照
+        cls._flags = {
+            flag.name: FlagRule(
+                name=flag.name,
+                is_global_enabled=flag.is_global_enabled,
+                rollout_percentage=flag.rollout_percentage or 0,
+                allow_user_ids=frozenset(flag.allow_user_ids or ()),
+            )
+            for flag in result.scalars().all()
+        }
 
+    @classmethod
+    async def refresh(cls) -> None:
+        # 先读版本号再查库: 查库期间如果又有变更，下次比对版本号时还能发现
+        try:
+            version = await redis_client.get(FLAGS_VERSION_KEY)
+        except RedisError as e:
+            logger.warning(f"读取功能开关版本号失败: {e}")
+            version = None
+
+        async with AsyncSessionLocal() as db:
+            await cls.load(db)
+        cls._version = version
+        logger.info(f"功能开关已加载: {len(cls._flags)} 个, 版本 {version}")
+
+    @classmethod
+    async def notify_changed(cls) -> None:
+        """修改 feature_flags 表并提交之后调用"""
+        await redis_client.incr(FLAGS_VERSION_KEY)
+        await redis_client.publish(FLAGS_CHANNEL, "changed")
+
+    @classmethod
+    async def listen(cls) -> None:
+        """订阅变更通知 (在 lifespan 里启动)"""
+        await subscribe_forever(FLAGS_CHANNEL, lambda _: cls.refresh())
+
+    @classmethod
+    async def poll(cls) -> None:
+        """定时比对版本号 (在 lifespan 里启动)，Pub/Sub 丢消息时兜底"""
+        while True:
+            await asyncio.sleep(settings.FEATURE_FLAG_POLL_SECONDS)
+            try:
+                if await redis_client.get(FLAGS_VERSION_KEY) != cls._version:
+                    await cls.refresh()
+            except Exception as e:
+                logger.warning(f"检查功能开关版本失败: {e}")
+
+    @classmethod
+    def is_enabled(cls, feature_name: str, user: Union[User, UserPrincipal, None] = None) -> bool:
+        flag = cls._flags.get(feature_name)
         if not flag:
             return False
 
         if flag.is_global_enabled:
             return True
 
-        # 2. 如果全局没开，检查是不是超级管理员 (灰度测试)
-        if user and user.is_superuser:
+        if user is None:
+            return False
+
+        # 超级管理员始终可以提前体验 (灰度测试)
+        if user.is_superuser or user.id in flag.allow_user_ids:
             return True
 
-        return False
\ No newline at end of file
+        # 按百分比灰度: 本地计算，不需要查库
+        return flag.rollout_percentage > 0 and _bucket(flag.name, user.id) < flag.rollout_percentage
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import redis_client
+from app.db.session import engine, get_pool_status
+
+
+async def _timed(check) -> dict:
+    """执行一项检查，超时或异常都算失败，返回结果和耗时"""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), settings.HEALTH_CHECK_TIMEOUT_SECONDS)
+        result = {"ok": True}
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": "timeout"}
+    except Exception as e:
+        # 探针不需要登录，异常信息里可能有 DSN、主机名，只返回异常类型，详情写日志
+        logger.exception(f"健康检查 {getattr(check, '__name__', check)} 失败")
+        result = {"ok": False, "error": type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+async def _select_one() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+class HealthService:
+    """
+    存活 / 就绪探针
+    - live: 进程和事件循环还能响应就算存活，不检查任何依赖 (依赖挂了重启进程也没用)
+    - ready: 数据库 SELECT 1、Redis PING 都成功，并且连接池没有被占满，才接收流量
+    就绪检查的结果缓存 HEALTH_CACHE_SECONDS 秒，同一时间只有一个检查在跑，探针再密集也不会给依赖加压
+    """
+    _flight = SingleFlight()
+    _result: Optional[dict] = None
+    _checked_at = 0.0
+
+    @staticmethod
+    def live() -> dict:
+        return {"status": "alive"}
+
+    @classmethod
+    async def ready(cls) -> dict:
+        age = time.monotonic() - cls._checked_at
+        if cls._result is not None and age < settings.HEALTH_CACHE_SECONDS:
+            return {**cls._result, "cached": True, "age_seconds": round(age, 3)}
+
+        result, _ = await cls._flight.do("ready", cls._check)
+        return {**result, "cached": False, "age_seconds": 0.0}
+
+    @classmethod
+    async def _check(cls) -> dict:
+        db, redis = await asyncio.gather(cls._check_db(), _timed(redis_client.ping))
+        ready = db["ok"] and redis["ok"]
+        cls._result = {"status": "ready" if ready else "not_ready", "checks": {"db": db, "redis": redis}}
+        cls._checked_at = time.monotonic()
+        return cls._result
+
+    @staticmethod
+    async def _check_db() -> dict:
+        pool = get_pool_status()
+        pool = {key: pool[key] for key in ("size", "in_use", "idle", "overflow", "timeouts")}
+        # 连接池占满时新请求只能排队等连接，这时不应该再接收流量；也不用再去排队做 SELECT 1
+        if pool["in_use"] >= settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW:
+            return {"ok": False, "error": "pool exhausted", "latency_ms": 0.0, "pool": pool}
+
+        return {**await _timed(_select_one), "pool": pool}
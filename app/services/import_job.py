@@ -0,0 +1,147 @@
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+from redis import asyncio as aioredis
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import new_redis_client
+from app.db.replica import replica_router
+from app.db.session import task_session
+from app.services.data_processing import DataService
+from app.services.product_cache import ProductCache
+from app.services.product_import import ProductImportService, ImportResult, MAX_REPORTED_ERRORS
+
+# Redis key 设计:
+#   import_job:{job_id}         Hash，任务状态与进度
+#   import_job:{job_id}:errors  List，被拒绝的行 (最多 MAX_REPORTED_ERRORS 条)
+JOB_KEY = "import_job:{job_id}"
+ERRORS_KEY = "import_job:{job_id}:errors"
+
+
+def _spool_path(job_id: str, filename: str) -> Path:
+    return Path(settings.IMPORT_SPOOL_DIR) / f"{job_id}{Path(filename).suffix.lower()}"
+
+
+def _copy_to_disk(source, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source.seek(0)
+    with open(target, "wb") as f:
+        shutil.copyfileobj(source, f, length=1024 * 1024)
+
+
+class ImportJobService:
+    @staticmethod
+    async def create(redis: aioredis.Redis, owner_id: int, file: UploadFile) -> str:
+        """上传文件落盘，写入任务状态，返回 job_id (投递 Celery 任务由调用方负责)"""
+        job_id = uuid.uuid4().hex
+        path = _spool_path(job_id, file.filename)
+        await run_in_threadpool(_copy_to_disk, file.file, path)
+
+        key = JOB_KEY.format(job_id=job_id)
+        await redis.hset(key, mapping={
+            "status": "queued",
+            "owner_id": owner_id,
+            "filename": file.filename,
+            "path": str(path),
+            "rows_done": 0,
+            "inserted": 0,
+            "updated": 0,
+            "rejected": 0,
+            "created_at": time.time(),
+        })
+        await redis.expire(key, settings.IMPORT_JOB_TTL_SECONDS)
+        return job_id
+
+    @staticmethod
+    async def get(redis: aioredis.Redis, job_id: str) -> Optional[dict]:
+        job = await redis.hgetall(JOB_KEY.format(job_id=job_id))
+        if not job:
+            return None
+
+        errors = await redis.lrange(ERRORS_KEY.format(job_id=job_id), 0, -1)
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "owner_id": int(job["owner_id"]),
+            "filename": job["filename"],
+            "rows_done": int(job["rows_done"]),
+            "inserted": int(job["inserted"]),
+            "updated": int(job["updated"]),
+            "rejected": int(job["rejected"]),
+            "rows_per_second": float(job.get("rows_per_second", 0)),
+            "error": job.get("error") or None,
+            "errors": [json.loads(e) for e in errors],
+        }
+
+    @staticmethod
+    async def run(job_id: str) -> None:
+        """
+        Worker 执行导入 (Celery 任务里调用)
+        每批提交后把进度写回 Redis；Worker 重启后任务会被重新投递，
+        从 rows_done 之后继续，已经处理过的行直接跳过 (Upsert 本身也是幂等的)
+        """
+        redis = new_redis_client()
+        key = JOB_KEY.format(job_id=job_id)
+        errors_key = ERRORS_KEY.format(job_id=job_id)
+        try:
+            job = await redis.hgetall(key)
+            if not job:
+                logger.warning(f"导入任务不存在或已过期: {job_id}")
+                return
+            if job["status"] == "done":
+                return
+
+            # 断点续传: 从上次的进度恢复计数
+            result = ImportResult(
+                inserted=int(job["inserted"]),
+                updated=int(job["updated"]),
+                rejected=int(job["rejected"]),
+                rows_done=int(job["rows_done"]),
+            )
+            resume_after = result.rows_done
+            await redis.hset(key, mapping={"status": "running", "error": ""})
+
+            started = time.monotonic()
+            rows_this_run = 0
+            async with task_session() as db:
+                with open(job["path"], "rb") as f:
+                    for rows in DataService.iter_import_chunks(f, job["filename"]):
+                        rows = [row for row in rows if row[0] > resume_after]
+                        if not rows:
+                            continue
+
+                        error_count = len(result.errors)
+                        await ProductImportService.upsert_chunk(db, int(job["owner_id"]), rows, result)
+                        await ProductCache.invalidate(int(job["owner_id"]), redis)
+                        await replica_router.mark_write(int(job["owner_id"]), redis)
+                        rows_this_run += len(rows)
+
+                        new_errors = result.errors[error_count:]
+                        if new_errors:
+                            await redis.rpush(errors_key, *[json.dumps(e, ensure_ascii=False) for e in new_errors])
+                            await redis.ltrim(errors_key, 0, MAX_REPORTED_ERRORS - 1)
+                        await redis.hset(key, mapping={
+                            "rows_done": result.rows_done,
+                            "inserted": result.inserted,
+                            "updated": result.updated,
+                            "rejected": result.rejected,
+                            "rows_per_second": round(rows_this_run / max(time.monotonic() - started, 1e-6), 1),
+                        })
+
+            await redis.hset(key, "status", "done")
+            await redis.expire(errors_key, settings.IMPORT_JOB_TTL_SECONDS)
+            Path(job["path"]).unlink(missing_ok=True)
+            logger.info(f"导入任务完成: {job_id}, 新增 {result.inserted}, 更新 {result.updated}, 拒绝 {result.rejected}")
+        except Exception as e:
+            # 保留落盘文件，方便重试
+            await redis.hset(key, mapping={"status": "failed", "error": str(e)})
+            raise
+        finally:
+            await redis.aclose()
@@ -0,0 +1,172 @@
+import time
+from typing import AsyncIterator
+
+from redis import asyncio as aioredis
+from sqlalchemy import literal_column, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import RELEASE_LOCK_SCRIPT, RENEW_LOCK_SCRIPT, new_lock_token
+from app.models.product import Product
+from app.models.user import User
+from app.services.email import EmailService
+
+# Redis key 设计:
+#   low_stock:alerted:{owner_id}   hash，已经提醒过的商品 id -> 提醒时的库存
+#   low_stock:owners               set，有提醒记录的用户 (库存都恢复了的用户要清掉记录)
+#   low_stock:lock                 防止上一轮还没跑完又开始下一轮 (值是本轮的随机 token)
+#                                  过期时间 LOW_STOCK_LOCK_SECONDS，扫描过程中续期
+ALERTED_KEY = "low_stock:alerted:{owner_id}"
+OWNERS_KEY = "low_stock:owners"
+LOCK_KEY = "low_stock:lock"
+
+# 攒够这么多封邮件再一起查收件人地址
+NOTIFY_BATCH = 100
+
+
+class LowStockService:
+    """
+    低库存提醒 (每小时的定时任务调用)
+    1. 按 (owner_id, id) 游标分批扫描 stock_qty < 阈值 的商品 (部分索引 ix_products_low_stock)，
+       每批一个短事务，不会长时间占着快照拖慢 vacuum；结果天然按用户排好序，边扫边分组
+    2. 和 Redis 里的提醒记录比对，只提醒有变化的商品: 新进入低库存的、以及提醒之后又降到 0 的；
+       库存恢复的商品从记录里删掉，以后再降下来会重新提醒
+    3. 每个用户一封汇总邮件 (放进发件箱，模板 low_stock_digest.html)；
+       邮件放进发件箱之后才记下已提醒，中途出错的下一轮会重新提醒，不会漏掉
+    """
+
+    @staticmethod
+    async def run(db: AsyncSession, redis: aioredis.Redis) -> dict:
+        token = new_lock_token()
+        lock_seconds = settings.LOW_STOCK_LOCK_SECONDS
+        if not await redis.set(LOCK_KEY, token, nx=True, ex=lock_seconds):
+            logger.warning("上一轮低库存扫描还没结束，跳过本轮")
+            return {"skipped": True}
+
+        try:
+            summary = {"owners": 0, "low_stock": 0, "alerted": 0, "emails": 0}
+            seen: set[int] = set()
+            pending: list[tuple[int, list[dict], int]] = []
+            renew_at = time.monotonic() + lock_seconds / 3
+
+            async for owner_id, items in LowStockService._scan(db):
+                # 锁的过期时间不长，跑得久就续期；续不上说明锁过期后被别的进程拿走了，本轮到此为止
+                if time.monotonic() >= renew_at:
+                    if not await redis.eval(RENEW_LOCK_SCRIPT, 1, LOCK_KEY, token, lock_seconds):
+                        logger.warning("低库存扫描锁已失效，本轮提前结束")
+                        return {**summary, "aborted": True}
+                    renew_at = time.monotonic() + lock_seconds / 3
+                seen.add(owner_id)
+                summary["owners"] += 1
+                summary["low_stock"] += len(items)
+                new, recovered = LowStockService.changes(items, await LowStockService._alerted(redis, owner_id))
+                # 恢复的先删掉；新的提醒等邮件进了发件箱再记 (_notify 里)
+                await LowStockService._save(redis, owner_id, [], recovered)
+                if new:
+                    summary["alerted"] += len(new)
+                    pending.append((owner_id, new, len(items)))
+                if len(pending) >= NOTIFY_BATCH:
+                    summary["emails"] += await LowStockService._notify(db, redis, pending)
+                    pending = []
+            summary["emails"] += await LowStockService._notify(db, redis, pending)
+
+            # 这一轮没有任何低库存商品的用户，清掉他们的提醒记录
+            cleared = [int(owner_id) for owner_id in await redis.smembers(OWNERS_KEY) if int(owner_id) not in seen]
+            if cleared:
+                await redis.delete(*[ALERTED_KEY.format(owner_id=owner_id) for owner_id in cleared])
+                await redis.srem(OWNERS_KEY, *cleared)
+            return summary
+        finally:
+            await redis.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+
+    @staticmethod
+    def changes(items: dict[int, dict], alerted: dict[int, int]) -> tuple[list[dict], list[int]]:
+        """返回 (需要提醒的商品, 库存已经恢复的商品 id)"""
+        new = [
+            item for product_id, item in items.items()
+            if product_id not in alerted or item["stock_qty"] <= 0 < alerted[product_id]
+        ]
+        recovered = [product_id for product_id in alerted if product_id not in items]
+        return new, recovered
+
+    @staticmethod
+    async def _scan(db: AsyncSession) -> AsyncIterator[tuple[int, dict[int, dict]]]:
+        """按用户依次产出 (owner_id, {商品 id: 商品})"""
+        # 阈值写成 SQL 字面量，PG 才能推出它蕴含部分索引的 stock_qty < 10
+        below = Product.stock_qty < literal_column(str(int(settings.LOW_STOCK_THRESHOLD)))
+        last = (0, 0)
+        owner_id, items = None, {}
+        while True:
+            rows = (await db.execute(
+                select(Product.owner_id, Product.id, Product.sku, Product.title, Product.stock_qty)
+                .filter(below, tuple_(Product.owner_id, Product.id) > tuple_(*last))
+                .order_by(Product.owner_id, Product.id)
+                .limit(settings.LOW_STOCK_SCAN_BATCH)
+            )).all()
+            await db.commit()
+
+            for row in rows:
+                if row.owner_id != owner_id:
+                    if items:
+                        yield owner_id, items
+                    owner_id, items = row.owner_id, {}
+                items[row.id] = {"id": row.id, "sku": row.sku, "title": row.title, "stock_qty": row.stock_qty}
+
+            if len(rows) < settings.LOW_STOCK_SCAN_BATCH:
+                break
+            last = (rows[-1].owner_id, rows[-1].id)
+
+        if items:
+            yield owner_id, items
+
+    @staticmethod
+    async def _alerted(redis: aioredis.Redis, owner_id: int) -> dict[int, int]:
+        data = await redis.hgetall(ALERTED_KEY.format(owner_id=owner_id))
+        return {int(product_id): int(stock_qty) for product_id, stock_qty in data.items()}
+
+    @staticmethod
+    async def _save(redis: aioredis.Redis, owner_id: int, new: list[dict], recovered: list[int]) -> None:
+        key = ALERTED_KEY.format(owner_id=owner_id)
+        pipe = redis.pipeline(transaction=False)
+        if new:
+            pipe.hset(key, mapping={item["id"]: item["stock_qty"] for item in new})
+        if recovered:
+            pipe.hdel(key, *recovered)
+        pipe.sadd(OWNERS_KEY, owner_id)
+        await pipe.execute()
+
+    @staticmethod
+    async def _notify(db: AsyncSession, redis: aioredis.Redis, pending: list[tuple[int, list[dict], int]]) -> int:
+        """一次查出这一批用户的邮箱，每个用户一封邮件，放进发件箱后记下已提醒；返回发出的邮件数"""
+        if not pending:
+            return 0
+        emails = dict((await db.execute(
+            select(User.id, User.email).filter(User.id.in_([owner_id for owner_id, _, _ in pending]),
+                                               User.is_active.is_(True))
+        )).all())
+        await db.commit()
+
+        sent = 0
+        for owner_id, new, total in pending:
+            if owner_id in emails:
+                await EmailService.send_template(
+                    f"库存提醒: {len(new)} 个商品库存不足", emails[owner_id], "low_stock_digest.html",
+                    LowStockService.digest_context(new, total), redis,
+                )
+                await LowStockService._save(redis, owner_id, new, [])
+                sent += 1
+        return sent
+
+    @staticmethod
+    def digest_context(items: list[dict], total: int) -> dict:
+        """邮件模板参数: 本次新增的低库存商品 (库存少的排前面)，以及当前低库存商品总数"""
+        items = sorted(items, key=lambda item: (item["stock_qty"], item["id"]))
+        shown = items[:settings.LOW_STOCK_DIGEST_MAX_ITEMS]
+        return {
+            "threshold": settings.LOW_STOCK_THRESHOLD,
+            "items": shown,
+            "more": len(items) - len(shown),
+            "total": total,
+        }
@@ -0,0 +1,256 @@
+from typing import Union
+
+from sqlalchemy import Integer, column, delete, insert, update, values as values_table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.logger import logger
+from app.models.product import Product
+from app.schemas.product import (
+    BulkCreate, BulkDelete, BulkItemResult, BulkUpdate, ProductBulkRequest, ProductBulkResponse, ProductUpdate,
+)
+from app.services.product_import import MAX_LENGTHS
+
+# 不允许更新成 NULL 的字段
+NOT_NULL_FIELDS = {name for name in ProductUpdate.model_fields if not Product.__table__.c[name].nullable}
+
+Operation = Union[BulkCreate, BulkUpdate, BulkDelete]
+
+# asyncpg 一条语句最多 32767 个绑定参数，多行 INSERT / UPDATE ... FROM (VALUES ...) 要按这个拆分
+MAX_BIND_PARAMS = 32767
+
+
+class ConcurrentChange(Exception):
+    """校验之后、写入之前商品被删除或者换了所属用户 (写入时按 owner_id 过滤没有命中)"""
+
+    def __init__(self, indexes: list[int]):
+        super().__init__(f"{len(indexes)} 个商品在写入前已被修改")
+        self.indexes = indexes
+
+
+def _check_values(values: dict) -> None:
+    for name, max_length in MAX_LENGTHS.items():
+        if values.get(name) is not None and len(values[name]) > max_length:
+            raise ValueError(f"{name}: 长度不能超过 {max_length}")
+
+
+class ProductBulkService:
+    """
+    批量增删改
+    1. 先用两条查询 (按 id、按 SKU) 把能提前发现的错误都找出来: 商品不存在 / 不属于自己、SKU 冲突、同一批里重复
+    2. 剩下的操作按类型合并执行: 一条 DELETE ... WHERE id IN、按主键批量 UPDATE、多行 INSERT ... RETURNING (超过绑定参数上限时分几条执行)
+    3. allow_partial=False 时任何一项失败整批不写入；
+       allow_partial=True 时先整体执行，数据库报错再退回到每一项一个 SAVEPOINT，逐项执行
+    """
+
+    @staticmethod
+    async def apply(db: AsyncSession, owner_id: int, request: ProductBulkRequest) -> tuple[ProductBulkResponse, list[dict]]:
+        """返回 (响应, 需要写的审计记录)；调用方负责提交之后写审计"""
+        operations = request.operations
+        results = [BulkItemResult(index=i, op=op.op, status="ok", id=getattr(op, "id", None))
+                   for i, op in enumerate(operations)]
+        values: dict[int, dict] = {}
+
+        def fail(index: int, error: str) -> None:
+            results[index].status = "error"
+            results[index].error = error
+
+        # 1. 单项校验
+        seen_ids: set[int] = set()
+        for i, op in enumerate(operations):
+            if isinstance(op, (BulkUpdate, BulkDelete)):
+                if op.id in seen_ids:
+                    fail(i, "同一个商品在一批里只能操作一次")
+                    continue
+                seen_ids.add(op.id)
+            if isinstance(op, BulkDelete):
+                continue
+
+            data = op.data.model_dump() if isinstance(op, BulkCreate) else op.data.model_dump(exclude_unset=True)
+            empty = sorted(name for name in NOT_NULL_FIELDS if name in data and data[name] is None)
+            if empty:
+                fail(i, f"{', '.join(empty)}: 不能为空")
+                continue
+            if not data:
+                fail(i, "没有要更新的字段")
+                continue
+            try:
+                _check_values(data)
+            except ValueError as e:
+                fail(i, str(e))
+                continue
+            values[i] = data
+
+        # 2. 商品必须存在且属于当前用户 (不区分不存在和无权限，避免泄露别人的商品 id)
+        #    FOR UPDATE 锁住这些行直到提交，校验和写入之间不会被别的请求删除 / 修改；按 id 顺序加锁，避免死锁
+        pending = [i for i, r in enumerate(results) if r.status == "ok"]
+        target_ids = {operations[i].id for i in pending if not isinstance(operations[i], BulkCreate)}
+        if target_ids:
+            owned = set((await db.execute(
+                select(Product.id).filter(Product.id.in_(target_ids), Product.owner_id == owner_id)
+                .order_by(Product.id).with_for_update()
+            )).scalars().all())
+            for i in pending:
+                if not isinstance(operations[i], BulkCreate) and operations[i].id not in owned:
+                    fail(i, "Product not found")
+
+        # 3. SKU 唯一: 同一批里不能重复，也不能和已有商品冲突
+        #    执行顺序是 删除 -> 更新 -> 新增: 被同一批删除的商品的 SKU 可以被更新和新增复用；
+        #    被同一批改成别的 SKU 的商品，它原来的 SKU 只能给新增用 ——
+        #    同一条 UPDATE 里互换 / 接力修改 SKU 会在行与行之间触发唯一约束，要分两批做
+        pending = [i for i, r in enumerate(results) if r.status == "ok"]
+        sku_owner: dict[str, int] = {}
+        for i in pending:
+            sku = values.get(i, {}).get("sku")
+            if sku is None:
+                continue
+            if sku in sku_owner:
+                fail(i, f"SKU {sku} 在这一批里重复")
+                continue
+            sku_owner[sku] = i
+        if sku_owner:
+            existing = (await db.execute(
+                select(Product.id, Product.sku).filter(Product.sku.in_(sku_owner))
+            )).all()
+            deleted = {operations[i].id for i in pending
+                       if results[i].status == "ok" and isinstance(operations[i], BulkDelete)}
+            renamed = {operations[i].id for i in pending
+                       if results[i].status == "ok" and isinstance(operations[i], BulkUpdate) and "sku" in values[i]}
+            for product_id, sku in existing:
+                i = sku_owner[sku]
+                if product_id == getattr(operations[i], "id", None) or product_id in deleted:
+                    continue
+                if product_id in renamed and isinstance(operations[i], BulkCreate):
+                    continue
+                if product_id in renamed:
+                    fail(i, f"SKU {sku} 正被这一批里的另一个商品让出，不能在同一批里互换或接力修改 SKU")
+                else:
+                    fail(i, f"SKU {sku} 已存在")
+
+        failed = any(r.status == "error" for r in results)
+        if failed and not request.allow_partial:
+            for r in results:
+                if r.status == "ok":
+                    r.status = "skipped"
+            return ProductBulkService._response(results), []
+
+        # 4. 写入
+        todo = [i for i, r in enumerate(results) if r.status == "ok"]
+        try:
+            async with db.begin_nested():
+                await ProductBulkService._execute_set(db, owner_id, operations, values, results, todo)
+        except (DBAPIError, ConcurrentChange) as e:
+            logger.warning(f"批量操作写入失败: {getattr(e, 'orig', e)}")
+            if not request.allow_partial:
+                await db.rollback()
+                if isinstance(e, ConcurrentChange):
+                    for i in e.indexes:
+                        fail(i, "Product not found")
+                else:
+                    for i in todo:
+                        fail(i, "数据库写入失败，整批已回滚")
+                for r in results:
+                    if r.status == "ok":
+                        r.status = "skipped"
+                return ProductBulkService._response(results), []
+            for i in todo:
+                await ProductBulkService._execute_one(db, owner_id, operations[i], values.get(i), results[i])
+
+        await db.commit()
+
+        audit = [
+            {
+                "action": r.op.upper(),
+                "resource_id": r.id,
+                "details": {"bulk": True, "fields": sorted(values[r.index])} if r.op == "update" else {"bulk": True},
+            }
+            for r in results if r.status == "ok"
+        ]
+        return ProductBulkService._response(results), audit
+
+    @staticmethod
+    async def _execute_set(db: AsyncSession, owner_id: int, operations: list[Operation], values: dict[int, dict],
+                           results: list[BulkItemResult], todo: list[int]) -> None:
+        deletes = {operations[i].id: i for i in todo if isinstance(operations[i], BulkDelete)}
+        updates = [i for i in todo if isinstance(operations[i], BulkUpdate)]
+        creates = [i for i in todo if isinstance(operations[i], BulkCreate)]
+
+        # 所有写入都带上 owner_id 条件，并用 RETURNING 核对命中的行，没命中的说明商品在校验之后被改动过
+        missing: list[int] = []
+        if deletes:
+            deleted = set((await db.execute(
+                delete(Product).filter(Product.id.in_(deletes), Product.owner_id == owner_id)
+                .returning(Product.id).execution_options(synchronize_session=False)
+            )).scalars().all())
+            missing += [i for product_id, i in deletes.items() if product_id not in deleted]
+        if updates:
+            # 修改的字段组合相同的合并成一条 UPDATE ... FROM (VALUES ...)
+            groups: dict[tuple[str, ...], list[int]] = {}
+            for i in updates:
+                groups.setdefault(tuple(sorted(values[i])), []).append(i)
+            for fields, indexes in groups.items():
+                # 每行 id + 各字段，另外 owner_id 占一个
+                size = (MAX_BIND_PARAMS - 1) // (len(fields) + 1)
+                for start in range(0, len(indexes), size):
+                    chunk = indexes[start:start + size]
+                    rows = values_table(
+                        column("id", Integer), *(column(name, Product.__table__.c[name].type) for name in fields),
+                        name="v",
+                    ).data([(operations[i].id, *(values[i][name] for name in fields)) for i in chunk])
+                    updated = set((await db.execute(
+                        update(Product)
+                        .where(Product.id == rows.c.id, Product.owner_id == owner_id)
+                        .values({name: rows.c[name] for name in fields})
+                        .returning(Product.id)
+                        .execution_options(synchronize_session=False)
+                    )).scalars().all())
+                    missing += [i for i in chunk if operations[i].id not in updated]
+        if missing:
+            raise ConcurrentChange(sorted(missing))
+        if creates:
+            # 没给值的列会用 Python 端默认值补齐，按整张表的列数估算每行的参数个数
+            size = MAX_BIND_PARAMS // len(Product.__table__.c)
+            rows = [{**values[i], "owner_id": owner_id} for i in creates]
+            id_by_sku = {}
+            for start in range(0, len(rows), size):
+                returned = (await db.execute(
+                    insert(Product).values(rows[start:start + size]).returning(Product.id, Product.sku)
+                )).all()
+                id_by_sku.update({sku: product_id for product_id, sku in returned})
+            for i in creates:
+                results[i].id = id_by_sku[values[i]["sku"]]
+
+    @staticmethod
+    async def _execute_one(db: AsyncSession, owner_id: int, op: Operation, data: dict,
+                           result: BulkItemResult) -> None:
+        """逐项执行，每一项一个 SAVEPOINT，失败只回滚这一项"""
+        try:
+            async with db.begin_nested():
+                if isinstance(op, BulkDelete):
+                    matched = (await db.execute(
+                        delete(Product).filter(Product.id == op.id, Product.owner_id == owner_id)
+                        .returning(Product.id).execution_options(synchronize_session=False)
+                    )).first()
+                elif isinstance(op, BulkUpdate):
+                    matched = (await db.execute(
+                        update(Product).filter(Product.id == op.id, Product.owner_id == owner_id).values(**data)
+                        .returning(Product.id).execution_options(synchronize_session=False)
+                    )).first()
+                else:
+                    matched = result.id = (await db.execute(
+                        insert(Product).values(**data, owner_id=owner_id).returning(Product.id)
+                    )).scalar_one()
+        except DBAPIError as e:
+            result.status = "error"
+            result.error = "数据库写入失败"
+            logger.warning(f"批量操作第 {result.index} 项写入失败: {e.orig}")
+            return
+        if matched is None:
+            result.status = "error"
+            result.error = "Product not found"
+
+    @staticmethod
+    def _response(results: list[BulkItemResult]) -> ProductBulkResponse:
+        succeeded = sum(r.status == "ok" for r in results)
+        return ProductBulkResponse(succeeded=succeeded, failed=len(results) - succeeded, results=results)
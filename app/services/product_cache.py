@@ -0,0 +1,84 @@
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import redis_client
+
+# Redis key 设计:
+#   product_cache:{owner_id}:version                 每个用户一个版本号，数据变更时 INCR
+#   product_cache:{owner_id}:v{version}:{suffix}     缓存内容，版本号变了旧 key 就不会再被读到，等 TTL 自然过期
+VERSION_KEY = "product_cache:{owner_id}:version"
+ENTRY_KEY = "product_cache:{owner_id}:v{version}:{suffix}"
+
+
+class ProductCache:
+    """
+    产品读接口的缓存 (按 owner_id 隔离)
+    - 失效: 增删改、导入之后调用 invalidate，只是把版本号 +1，不用扫描删除 key
+    - 防击穿: 同一个 key 同时只有一个请求去查库，其余请求等它的结果
+    - 统计: hits / misses / coalesced 是当前进程的计数
+    """
+    _flight = SingleFlight()
+    hits = 0
+    misses = 0
+    coalesced = 0
+
+    @classmethod
+    async def get_or_load(cls, owner_id: int, suffix: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        loader 返回可以 JSON 序列化的数据；返回 None 表示不缓存 (比如 404)
+        Redis 不可用时直接调用 loader
+        """
+        try:
+            # 先读版本号再查库: 查库期间数据被修改的话，写回的是旧版本的 key，不会被读到
+            version = await redis_client.get(VERSION_KEY.format(owner_id=owner_id)) or "0"
+            key = ENTRY_KEY.format(owner_id=owner_id, version=version, suffix=suffix)
+            raw = await redis_client.get(key)
+        except RedisError as e:
+            logger.warning(f"读取产品缓存失败: {e}")
+            return await loader()
+
+        if raw is not None:
+            cls.hits += 1
+            return json.loads(raw)
+
+        value, shared = await cls._flight.do(key, lambda: cls._load(key, loader))
+        if shared:
+            cls.coalesced += 1
+        else:
+            cls.misses += 1
+        return value
+
+    @staticmethod
+    async def _load(key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        if value is not None:
+            try:
+                await redis_client.set(key, json.dumps(value), ex=settings.PRODUCT_CACHE_TTL_SECONDS)
+            except RedisError as e:
+                logger.warning(f"写入产品缓存失败: {e}")
+        return value
+
+    @staticmethod
+    async def invalidate(owner_id: int, redis: Optional[aioredis.Redis] = None) -> None:
+        """产品数据变更并提交之后调用 (Celery 任务里传入自己的 Redis 客户端)"""
+        try:
+            await (redis or redis_client).incr(VERSION_KEY.format(owner_id=owner_id))
+        except RedisError as e:
+            logger.warning(f"清除产品缓存失败: {e}")
+
+    @classmethod
+    def stats(cls) -> dict:
+        lookups = cls.hits + cls.misses + cls.coalesced
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "coalesced": cls.coalesced,
+            "in_flight": len(cls._flight),
+            "hit_ratio": round(cls.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,158 @@
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import func, literal_column, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logger import logger
+from app.models.product import Product
+from app.schemas.product import ProductCreate
+
+# 表头 -> 字段名 (表头不区分大小写)
+# 既兼容老模板的 Title/SKU/Price，也能直接导入 /export/csv 导出的文件
+COLUMN_ALIASES = {
+    "title": "title",
+    "sku": "sku",
+    "price": "price",
+    "currency": "currency",
+    "stock": "stock_qty",
+    "stock_qty": "stock_qty",
+    "cost": "supplier_cost",
+    "supplier_cost": "supplier_cost",
+    "description": "description_original",
+    "description_original": "description_original",
+    "source_url": "source_url",
+}
+# 导入时可以写入 / 覆盖的字段
+IMPORT_FIELDS = list(ProductCreate.model_fields)
+# 文本字段: Excel 里纯数字的 SKU 会被读成 int，需要转回字符串
+TEXT_FIELDS = {name for name, f in ProductCreate.model_fields.items() if f.annotation in (str, Optional[str])}
+# 字符串字段的长度上限，直接取数据库列定义，超长的行提前拒绝，避免整批 INSERT 失败
+MAX_LENGTHS = {
+    name: Product.__table__.c[name].type.length
+    for name in IMPORT_FIELDS
+    if isinstance(Product.__table__.c[name].type, String) and Product.__table__.c[name].type.length
+}
+# 响应里最多带多少条错误明细 (计数不受影响)
+MAX_REPORTED_ERRORS = 1000
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    rows_done: int = 0  # 已处理完的最大行号 (断点续传用)
+    errors: list[dict] = field(default_factory=list)
+
+    def reject(self, row_number: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
+
+    def to_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def _normalize_row(raw: dict) -> dict:
+    data = {}
+    for key, value in raw.items():
+        name = COLUMN_ALIASES.get(str(key or "").strip().lower())
+        if name is None:
+            continue
+        if isinstance(value, (int, float)) and name in TEXT_FIELDS:
+            value = str(value)
+        if isinstance(value, str):
+            value = value.strip()
+        # 空单元格当作没填，走 Schema 默认值
+        if value is None or value == "":
+            continue
+        data[name] = value
+    return data
+
+
+def _validate_row(raw: dict) -> dict:
+    """校验一行数据，失败抛 ValueError (错误信息直接返回给用户)"""
+    try:
+        item = ProductCreate(**_normalize_row(raw))
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{err['loc'][-1]}: {err['msg']}" for err in e.errors()))
+
+    values = item.model_dump()
+    for name, max_length in MAX_LENGTHS.items():
+        if values.get(name) is not None and len(values[name]) > max_length:
+            raise ValueError(f"{name}: 长度不能超过 {max_length}")
+    return values
+
+
+class ProductImportService:
+    @staticmethod
+    async def upsert_chunk(db: AsyncSession, owner_id: int, rows: list[tuple[int, dict]],
+                           result: ImportResult) -> None:
+        """
+        一批数据 = 一条多行 INSERT ... ON CONFLICT (sku) DO UPDATE ... RETURNING
+        SKU 已存在且属于自己的更新，属于别人的 (WHERE 条件不满足) 不会返回，记为拒绝
+        每批单独提交，失败只影响当前这一批
+        """
+        values_by_sku: dict[str, dict] = {}
+        row_by_sku: dict[str, int] = {}
+        for row_number, raw in rows:
+            try:
+                values = _validate_row(raw)
+            except ValueError as e:
+                result.reject(row_number, str(e))
+                continue
+
+            # 同一条 INSERT 里同一个 SKU 出现两次 PG 会直接报错，以最后一次为准
+            sku = values["sku"]
+            if sku in row_by_sku:
+                result.reject(row_by_sku[sku], f"SKU {sku} 在文件中重复，已被第 {row_number} 行覆盖")
+            values_by_sku[sku] = {**values, "owner_id": owner_id}
+            row_by_sku[sku] = row_number
+
+        if values_by_sku:
+            # 更新已有商品时只覆盖文件里有的列，文件里没有的列 (比如没有库存列) 保持原值
+            columns = {COLUMN_ALIASES.get(str(key or "").strip().lower()) for key in rows[0][1]}
+            stmt = pg_insert(Product).values(list(values_by_sku.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Product.sku],
+                set_={**{name: stmt.excluded[name] for name in IMPORT_FIELDS if name in columns and name != "sku"},
+                      "updated_at": func.now()},
+                where=Product.owner_id == stmt.excluded.owner_id,
+            ).returning(Product.sku, literal_column("xmax = 0").label("inserted"))
+
+            try:
+                returned = (await db.execute(stmt)).all()
+                await db.commit()
+            except DBAPIError as e:
+                await db.rollback()
+                logger.warning(f"导入批次写入失败: {e.orig}")
+                for sku, row_number in row_by_sku.items():
+                    result.reject(row_number, "数据库写入失败")
+            else:
+                for sku, inserted in returned:
+                    row_by_sku.pop(sku)
+                    if inserted:
+                        result.inserted += 1
+                    else:
+                        result.updated += 1
+                for sku, row_number in row_by_sku.items():
+                    result.reject(row_number, f"SKU {sku} 已被其他账号使用")
+
+        result.rows_done = max(result.rows_done, rows[-1][0])
+
+    @staticmethod
+    async def import_chunks(db: AsyncSession, owner_id: int,
+                            chunks: AsyncIterator[list[tuple[int, dict]]]) -> ImportResult:
+        result = ImportResult()
+        async for rows in chunks:
+            await ProductImportService.upsert_chunk(db, owner_id, rows, result)
+        return result
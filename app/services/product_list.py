@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import Select, false, true, tuple_
+from sqlalchemy.future import select
+
+from app.core.pagination import encode_cursor
+from app.models.product import Product
+from app.schemas.product import ProductListFilter
+
+# 允许排序的字段 (和 ProductSort 白名单对应)
+SORT_COLUMNS = {
+    "id": Product.id,
+    "price": Product.price,
+    "updated_at": Product.updated_at,
+    "title": Product.title,
+}
+
+
+class ProductListService:
+    """
+    产品列表的过滤、排序和游标分页
+    - 过滤条件都是 AND，配合 (owner_id, status, updated_at)、(owner_id, price, id) 等索引
+    - 排序按 (字段, id)，id 保证顺序稳定；游标里记录上一页最后一行的 (字段值, id)，
+      下一页用行比较 (price, id) > (?, ?) 直接在索引上定位
+    - 按 id 排序时游标格式仍是 {"id": n}，兼容之前发出去的游标
+    """
+
+    @staticmethod
+    def build_query(owner_id: int, filters: ProductListFilter, after: Optional[dict] = None) -> Select:
+        query = select(Product).filter(Product.owner_id == owner_id)
+
+        if filters.status is not None:
+            query = query.filter(Product.status == filters.status)
+        if filters.price_min is not None:
+            query = query.filter(Product.price >= filters.price_min)
+        if filters.price_max is not None:
+            query = query.filter(Product.price <= filters.price_max)
+        if filters.stock_lt is not None:
+            query = query.filter(Product.stock_qty < filters.stock_lt)
+        if filters.is_ai_optimized is not None:
+            # 用 SQL 字面量而不是绑定参数: 预编译语句切换到通用计划后，绑定参数匹配不上部分索引的条件
+            query = query.filter(Product.is_ai_optimized == (true() if filters.is_ai_optimized else false()))
+        if filters.updated_since is not None:
+            query = query.filter(Product.updated_at >= filters.updated_since)
+
+        descending = filters.sort.startswith("-")
+        field = filters.sort.lstrip("-")
+        column = SORT_COLUMNS[field]
+
+        if after is not None:
+            last_id, last_key = ProductListService._parse_after(after, filters.sort)
+            if field == "id":
+                query = query.filter(Product.id < last_id if descending else Product.id > last_id)
+            else:
+                row, last = tuple_(column, Product.id), tuple_(last_key, last_id)
+                query = query.filter(row < last if descending else row > last)
+
+        if field == "id":
+            return query.order_by(Product.id.desc() if descending else Product.id)
+        if descending:
+            return query.order_by(column.desc(), Product.id.desc())
+        return query.order_by(column, Product.id)
+
+    @staticmethod
+    def next_cursor(product: Product, sort: str) -> str:
+        field = sort.lstrip("-")
+        if field == "id":
+            return encode_cursor({"id": product.id})
+        return encode_cursor({"s": sort, "k": getattr(product, field), "id": product.id})
+
+    @staticmethod
+    def page_key(filters: ProductListFilter, after: Optional[dict], skip: int, limit: int) -> str:
+        """缓存 key 的后缀: 过滤条件 + 分页参数的摘要"""
+        params: dict[str, Any] = {**filters.model_dump(mode="json", exclude_defaults=True), "limit": limit}
+        if after is not None:
+            params["after"] = after
+        else:
+            params["skip"] = skip
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"list:{digest}"
+
+    @staticmethod
+    def _parse_after(after: dict, sort: str) -> tuple[int, Any]:
+        """解析游标，和当前排序不匹配或格式不对时抛 ValueError (由接口层转成 400)"""
+        last_id = int(after["id"])
+        field = sort.lstrip("-")
+        if field == "id":
+            return last_id, None
+        if after.get("s") != sort:
+            raise ValueError("Cursor does not match sort")
+
+        key = after["k"]
+        if field == "updated_at":
+            key = datetime.fromisoformat(key)
+        elif field == "price":
+            key = float(key)
+        elif not isinstance(key, str):
+            raise ValueError("Invalid cursor")
+        return last_id, key
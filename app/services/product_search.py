@@ -0,0 +1,136 @@
+import html
+from typing import Optional, Union
+
+from sqlalchemy import func, literal, or_, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.future import select
+
+from app.core.logger import logger
+from app.models.product import Product
+from app.schemas.product import ProductResponse, ProductSearchHit
+
+# 全文检索的分词配置，必须和迁移里 products_search_document() 用的一致，否则用不上索引
+SEARCH_CONFIG = "english"
+
+# ts_headline 参数: 标题整段返回，描述只截取命中附近的片段
+# 标题和描述是用户 / 采集来的原文，不能直接带着 <mark> 返回 (存储型 XSS)；
+# 先用私有区字符标出命中位置，整段 HTML 转义之后再换成 <mark>
+START_SEL, STOP_SEL = "\ue000", "\ue001"
+TITLE_HEADLINE_OPTIONS = f"StartSel={START_SEL}, StopSel={STOP_SEL}, HighlightAll=true"
+SNIPPET_HEADLINE_OPTIONS = f"StartSel={START_SEL}, StopSel={STOP_SEL}, MaxFragments=2, MaxWords=30, MinWords=10"
+
+# search_vector 的计算函数和触发器，和迁移 d4a9c2e7f813 里的定义一致
+# 开发环境用 create_all 建表时不会建触发器，启动时由 ensure_trigger 补上
+SEARCH_DOCUMENT_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION products_search_document(
+    title text, seo_keywords text, description_ai text, description_original text
+) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(seo_keywords, '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description_ai, '') || ' ' || coalesce(description_original, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE
+"""
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := products_search_document(
+        NEW.title, NEW.seo_keywords, NEW.description_ai, NEW.description_original
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGER = """
+CREATE OR REPLACE TRIGGER products_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, seo_keywords, description_ai, description_original ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()
+"""
+
+
+def _highlight(headline: Optional[str]) -> Optional[str]:
+    # 转义之后只剩我们自己加的 <mark>
+    if headline is None:
+        return None
+    return html.escape(headline).replace(START_SEL, "<mark>").replace(STOP_SEL, "</mark>")
+
+
+class ProductSearchService:
+    """
+    商品搜索 (只搜当前用户的商品)
+    命中条件满足任意一个即可:
+    - 全文检索: search_vector @@ websearch_to_tsquery (支持 "引号短语"、-排除词、or)
+    - SKU 模糊: sku % q (pg_trgm 相似度 >= pg_trgm.similarity_threshold)
+    - 标题模糊: q <% title (标题里有和 q 相近的词，能容忍拼写错误)
+    三个条件各有 GIN 索引，PG 会用 BitmapOr 合并
+    排序: ts_rank_cd + 模糊匹配相似度，相同时按 id
+    高亮 (ts_headline 比较贵) 只对当前页的行计算
+    数据库装不了 pg_trgm 时关闭模糊匹配 (fuzzy_enabled=False)，只用全文检索
+    """
+
+    fuzzy_enabled = True
+
+    @staticmethod
+    async def ensure_extension(conn: Union[AsyncConnection, AsyncSession]) -> bool:
+        # 标题 / SKU 的 gin_trgm_ops 索引和 similarity() 都来自 pg_trgm，要在建表之前装好
+        # 放在 SAVEPOINT 里执行，失败不影响外面的事务
+        try:
+            async with conn.begin_nested():
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            logger.warning(f"pg_trgm 扩展不可用，模糊搜索已关闭: {e.orig}")
+            ProductSearchService.fuzzy_enabled = False
+            return False
+        ProductSearchService.fuzzy_enabled = True
+        return True
+
+    @staticmethod
+    async def ensure_trigger(conn: Union[AsyncConnection, AsyncSession]) -> None:
+        # 维护 search_vector 的触发器 (可重复执行)；products 表要已经存在
+        await conn.execute(text(SEARCH_DOCUMENT_FUNCTION))
+        await conn.execute(text(TRIGGER_FUNCTION))
+        await conn.execute(text(TRIGGER))
+
+    @staticmethod
+    async def search(db: AsyncSession, owner_id: int, q: str, skip: int, limit: int) -> list[ProductSearchHit]:
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        score = func.coalesce(func.ts_rank_cd(Product.search_vector, tsquery), 0)
+        matches = [Product.search_vector.op("@@")(tsquery)]
+        if ProductSearchService.fuzzy_enabled:
+            score = score + func.greatest(func.similarity(Product.sku, q), func.word_similarity(q, Product.title))
+            matches += [Product.sku.op("%")(q), literal(q).op("<%")(Product.title)]
+        score = score.label("score")
+
+        page = (
+            select(Product.id, score)
+            .filter(Product.owner_id == owner_id, or_(*matches))
+            .order_by(score.desc(), Product.id)
+            .offset(skip)
+            .limit(limit)
+            .subquery()
+        )
+
+        description = func.coalesce(Product.description_ai, Product.description_original)
+        query = (
+            select(
+                Product,
+                page.c.score,
+                func.ts_headline(SEARCH_CONFIG, Product.title, tsquery, TITLE_HEADLINE_OPTIONS),
+                func.ts_headline(SEARCH_CONFIG, description, tsquery, SNIPPET_HEADLINE_OPTIONS),
+            )
+            .join(page, page.c.id == Product.id)
+            .order_by(page.c.score.desc(), Product.id)
+        )
+
+        rows = (await db.execute(query)).all()
+        return [
+            ProductSearchHit(
+                **ProductResponse.model_validate(product).model_dump(),
+                score=round(score, 6),
+                title_highlight=_highlight(title_highlight),
+                snippet=_highlight(snippet),
+            )
+            for product, score, title_highlight, snippet in rows
+        ]
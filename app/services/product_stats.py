@@ -0,0 +1,157 @@
+from typing import Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.logger import logger
+from app.models.product_stats import ProductStats
+from app.schemas.product import ProductStatsResponse
+
+# product_stats 每一列对应的单行取值，整列是这些值的 sum
+# 必须和迁移里触发器用的表达式一致，否则对账时每次都会判定为有偏差
+STAT_EXPRESSIONS = {
+    "product_count": "1",
+    "total_stock": "stock_qty",
+    "stock_value": "price::numeric * stock_qty",
+    "stock_cost": "supplier_cost::numeric * stock_qty",
+    "margin_sum": "price::numeric - supplier_cost::numeric",
+    "draft_count": "(status = 'draft')::int",
+    "published_count": "(status = 'published')::int",
+    "archived_count": "(status = 'archived')::int",
+    "ai_optimized_count": "is_ai_optimized::int",
+    "out_of_stock_count": "(stock_qty <= 0)::int",
+}
+
+COLUMNS = ", ".join(STAT_EXPRESSIONS)
+_ACTUAL = ", ".join(f"coalesce(sum({expr}), 0) AS {name}" for name, expr in STAT_EXPRESSIONS.items())
+
+# 实际聚合结果和汇总表不一致的用户 (全表扫描一次，只在定时任务里用)
+DRIFT_SQL = f"""
+WITH actual AS (SELECT owner_id, {_ACTUAL} FROM products GROUP BY owner_id)
+SELECT coalesce(a.owner_id, s.owner_id) AS owner_id
+FROM actual a FULL JOIN product_stats s ON s.owner_id = a.owner_id
+WHERE ({", ".join(f"coalesce(a.{name}, 0)" for name in STAT_EXPRESSIONS)})
+    IS DISTINCT FROM ({", ".join(f"coalesce(s.{name}, 0)" for name in STAT_EXPRESSIONS)})
+ORDER BY 1
+"""
+
+# 按 products 重新计算一个用户的汇总 (没有商品时写入全 0)
+RECOMPUTE_SQL = f"""
+INSERT INTO product_stats (owner_id, {COLUMNS}, updated_at)
+SELECT :owner_id, {_ACTUAL}, now() FROM products WHERE owner_id = :owner_id
+ON CONFLICT (owner_id) DO UPDATE SET
+    {", ".join(f"{name} = EXCLUDED.{name}" for name in STAT_EXPRESSIONS)}, updated_at = EXCLUDED.updated_at
+"""
+
+
+def _delta_sql(sources: list[tuple[str, int]]) -> str:
+    """把 transition table 里的行按用户聚合成增量，合并进 product_stats (增量全为 0 的用户跳过)"""
+    rows = " UNION ALL ".join(
+        f"SELECT owner_id, {', '.join(f'{sign} * ({expr}) AS {name}' for name, expr in STAT_EXPRESSIONS.items())} "
+        f"FROM {table}"
+        for table, sign in sources
+    )
+    return f"""
+        INSERT INTO product_stats AS s (owner_id, {COLUMNS}, updated_at)
+        SELECT owner_id, {', '.join(f'sum({name})' for name in STAT_EXPRESSIONS)}, now()
+        FROM ({rows}) AS d
+        GROUP BY owner_id
+        HAVING {' OR '.join(f'sum({name}) <> 0' for name in STAT_EXPRESSIONS)}
+        ORDER BY owner_id
+        ON CONFLICT (owner_id) DO UPDATE SET
+            {', '.join(f'{name} = s.{name} + EXCLUDED.{name}' for name in STAT_EXPRESSIONS)},
+            updated_at = EXCLUDED.updated_at;
+    """
+
+
+# 语句级触发器，和迁移 f3c8a1d5b902 里的定义一致
+# 开发环境用 create_all 建表时不会建触发器，启动时由 ensure_triggers 补上
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION product_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_delta_sql([("new_rows", 1)])}
+    ELSIF TG_OP = 'UPDATE' THEN
+        {_delta_sql([("new_rows", 1), ("old_rows", -1)])}
+    ELSE
+        {_delta_sql([("old_rows", -1)])}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = {
+    "product_stats_insert": "AFTER INSERT ON products REFERENCING NEW TABLE AS new_rows",
+    "product_stats_update": "AFTER UPDATE ON products REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "product_stats_delete": "AFTER DELETE ON products REFERENCING OLD TABLE AS old_rows",
+}
+
+
+class ProductStatsService:
+    """
+    按用户汇总的库存统计
+    - 读: 直接按主键读 product_stats 的一行，耗时和商品数量无关
+    - 写: products 上的语句级触发器 (见迁移 f3c8a1d5b902) 按每条 SQL 影响的行算出增量，一次 upsert 合并进去，
+      单条增删改、批量接口、导入都覆盖到了
+    - 对账: reconcile 找出和实际聚合结果不一致的用户，逐个重新计算 (定时任务调用)
+    """
+
+    @staticmethod
+    async def ensure_triggers(conn: Union[AsyncConnection, AsyncSession]) -> None:
+        # 维护 product_stats 的触发器 (可重复执行)；products 和 product_stats 表要已经存在
+        await conn.execute(text(TRIGGER_FUNCTION))
+        for name, definition in TRIGGERS.items():
+            await conn.execute(text(
+                f"CREATE OR REPLACE TRIGGER {name} {definition} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION product_stats_apply()"
+            ))
+
+    @staticmethod
+    async def get(db: AsyncSession, owner_id: int) -> ProductStatsResponse:
+        stats = await db.get(ProductStats, owner_id)
+        if stats is None:
+            return ProductStatsResponse()
+
+        return ProductStatsResponse(
+            product_count=stats.product_count,
+            total_stock=stats.total_stock,
+            stock_value=float(stats.stock_value),
+            stock_cost=float(stats.stock_cost),
+            average_margin=float(stats.margin_sum / stats.product_count) if stats.product_count else None,
+            status_counts={
+                "draft": stats.draft_count,
+                "published": stats.published_count,
+                "archived": stats.archived_count,
+            },
+            ai_optimized_count=stats.ai_optimized_count,
+            out_of_stock_count=stats.out_of_stock_count,
+            updated_at=stats.updated_at,
+        )
+
+    @staticmethod
+    async def recompute(db: AsyncSession, owner_id: int) -> None:
+        """
+        重新计算一个用户的汇总并提交
+        先锁住汇总行: 已经改了商品、还没提交的事务此时正持有这一行的锁，等它提交后再聚合才能看到它的修改；
+        之后才开始的写入会等这里提交，再把自己的增量加上去，两边都不会丢
+        还没有汇总行时 FOR UPDATE 什么也锁不到，所以先插入一行全 0 的占位 (已存在则不动):
+        并发的第一次写入要么已经插入了这一行 (这里等它提交)，要么在唯一索引上等这里提交
+        """
+        params = {"owner_id": owner_id}
+        await db.execute(text("INSERT INTO product_stats (owner_id) VALUES (:owner_id) "
+                              "ON CONFLICT (owner_id) DO NOTHING"), params)
+        await db.execute(text("SELECT 1 FROM product_stats WHERE owner_id = :owner_id FOR UPDATE"), params)
+        await db.execute(text(RECOMPUTE_SQL), params)
+        await db.commit()
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> list[int]:
+        """修正所有有偏差的用户，返回修正过的 owner_id"""
+        drifted = (await db.execute(text(DRIFT_SQL))).scalars().all()
+        await db.commit()
+        for owner_id in drifted:
+            await ProductStatsService.recompute(db, owner_id)
+        if drifted:
+            logger.warning(f"商品统计与实际数据不一致，已重新计算 {len(drifted)} 个用户: {drifted[:20]}")
+        return list(drifted)
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import redis_client, subscribe_forever
+from app.models.user import User
+from app.schemas.user import UserPrincipal
+
+# Redis key / 频道
+PRINCIPAL_KEY = "auth:principal:{subject}"
+INVALIDATE_CHANNEL = "auth:invalidate"
+
+# 会话里改过的用户 (session.info 的 key)，提交之后清除他们的缓存
+CHANGED_USERS_KEY = "principal_cache:changed"
+
+
+class PrincipalCache:
+    """
+    登录用户缓存，key 是 JWT 的 sub (邮箱)
+    第一层: 进程内 LRU，命中时一次 IO 都没有
+    第二层: Redis (可关闭)，多个 Worker 共享，进程重启后不用全部回源查库
+    用户信息变更时调用 invalidate，通过 Pub/Sub 通知所有进程删掉本地缓存；
+    通过 ORM 修改 / 删除 User 并提交时会自动调用 (见下面的会话事件)，
+    只有 update(User) 这类不经过 ORM 对象的批量语句需要手动调用
+    """
+    # 提交后异步执行的失效任务 (保留引用，防止还没执行完就被回收)
+    _pending: set[asyncio.Task] = set()
+    _local = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+    @classmethod
+    async def get(cls, subject: str) -> Optional[UserPrincipal]:
+        principal = cls._local.get(subject)
+        if principal is not None or not settings.AUTH_CACHE_REDIS:
+            return principal
+
+        try:
+            raw = await redis_client.get(PRINCIPAL_KEY.format(subject=subject))
+        except RedisError as e:
+            # Redis 挂了不能影响登录，直接回源查库
+            logger.warning(f"读取用户缓存失败: {e}")
+            return None
+        if raw is None:
+            return None
+
+        principal = UserPrincipal.model_validate_json(raw)
+        cls._local.set(subject, principal)
+        return principal
+
+    @classmethod
+    async def set(cls, principal: UserPrincipal) -> None:
+        cls._local.set(principal.email, principal)
+        if not settings.AUTH_CACHE_REDIS:
+            return
+
+        try:
+            await redis_client.set(PRINCIPAL_KEY.format(subject=principal.email), principal.model_dump_json(),
+                                   ex=settings.AUTH_CACHE_REDIS_TTL_SECONDS)
+        except RedisError as e:
+            logger.warning(f"写入用户缓存失败: {e}")
+
+    @classmethod
+    async def invalidate(cls, subject: str) -> None:
+        """用户被禁用、修改资料、开通 VIP 等之后调用"""
+        cls._local.pop(subject)
+        try:
+            await redis_client.delete(PRINCIPAL_KEY.format(subject=subject))
+            await redis_client.publish(INVALIDATE_CHANNEL, subject)
+        except RedisError as e:
+            logger.warning(f"清除用户缓存失败: {e}")
+
+    @classmethod
+    async def listen(cls) -> None:
+        """订阅失效通知 (在 lifespan 里启动)"""
+        await subscribe_forever(INVALIDATE_CHANNEL, cls._local.pop)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # flush 之后 dirty / deleted 还是 flush 之前的状态；改了邮箱的话旧邮箱的缓存也要清掉
+    changed = session.info.setdefault(CHANGED_USERS_KEY, set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            state = inspect(obj)
+            changed.update(email for email in (state.dict.get("email"), *state.attrs.email.history.deleted) if email)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    subjects = session.info.pop(CHANGED_USERS_KEY, None)
+    if not subjects:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # 同步代码 (脚本、迁移) 里没有事件循环，只能等缓存过期
+        logger.warning(f"用户信息已修改，但无法清除缓存: {sorted(subjects)}")
+        return
+    for subject in subjects:
+        # 本进程立即生效，Redis 和其他进程的通知放到任务里
+        PrincipalCache._local.pop(subject)
+        task = loop.create_task(PrincipalCache.invalidate(subject))
+        PrincipalCache._pending.add(task)
+        task.add_done_callback(PrincipalCache._pending.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
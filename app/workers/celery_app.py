@@ -17,13 +17,37 @@ celery_app.conf.beat_schedule = {
     "check-stock-every-hour": {
         "task": "app.workers.tasks.check_low_stock",
         "schedule": crontab(minute=0, hour="*"), # 每小时第0分钟执行
+        # 一小时内没被执行就丢掉，不在 worker 忙的时候堆积多轮
+        "options": {"expires": 3600},
     },
     # 任务2: 每天凌晨1点清理过期日志/临时文件
     "daily-cleanup": {
         "task": "app.workers.tasks.cleanup_temp_files",
         "schedule": crontab(minute=0, hour=1),
     },
-    # 任务3: 每 30 秒测试一下 (开发调试用)
+    # 任务3: 每天凌晨2点维护审计日志分区 (建后续分区、删过期分区)
+    "maintain-audit-partitions": {
+        "task": "app.workers.tasks.maintain_audit_partitions",
+        "schedule": crontab(minute=0, hour=2),
+    },
+    # 任务4: 每 30 分钟对账一次商品统计汇总表
+    "reconcile-product-stats": {
+        "task": "app.workers.tasks.reconcile_product_stats",
+        "schedule": crontab(minute="*/30"),
+    },
+    # 任务5: 每 10 秒发送一次发件箱里的邮件 (一轮最多跑 EMAIL_DRAIN_SECONDS，有任务在发时新的直接跳过)
+    "deliver-emails": {
+        "task": "app.workers.tasks.deliver_emails",
+        "schedule": 10.0,
+        "options": {"expires": 10},
+    },
+    # 任务6: 每 5 分钟给待优化的商品生成 AI 文案 (ai-queue；一轮最多 AI_RUN_SECONDS，上一轮没结束时跳过)
+    "generate-ai-content": {
+        "task": "app.workers.tasks.generate_ai_content",
+        "schedule": crontab(minute="*/5"),
+        "options": {"expires": 300},
+    },
+    # 任务7: 每 30 秒测试一下 (开发调试用)
     "test-heartbeat": {
         "task": "app.workers.tasks.test_task",
         "schedule": 30.0, # 秒
@@ -1,40 +1,112 @@
+import asyncio
 import time
+from pathlib import Path
+from celery.signals import worker_process_shutdown
+from app.core.config import settings
+from app.db.redis import new_redis_client, sync_redis_client
+from app.db.session import task_session
+from app.services.ai_content import AIContentService
+from app.services.audit import AuditPartitionService
+from app.services.email import EmailDelivery, smtp_connection
+from app.services.import_job import ImportJobService
+from app.services.low_stock import LowStockService
+from app.services.product_stats import ProductStatsService
 from app.workers.celery_app import celery_app
 
 
-@celery_app.task(name="generate_ai_content")
-def generate_ai_content_task(product_id: int, product_title: str):
-    """
-    模拟一个耗时的 AI 生成任务
-    真实场景：调用 OpenAI API 生成文案，然后调用 Stable Diffusion 生成图片
-    """
-    print(f"Start AI generation for Product ID: {product_id}...")
-
-    # 模拟耗时 5 秒 (如果不使用 Celery，前端就会卡住 5 秒)
-    time.sleep(5)
+@celery_app.task(name="app.workers.tasks.generate_ai_content")
+def generate_ai_content_task():
+    """给待优化的商品批量生成 AI 文案 (description_ai / seo_keywords)，每轮最多运行 AI_RUN_SECONDS"""
+    async def run():
+        redis = new_redis_client()
+        try:
+            async with task_session() as db:
+                return await AIContentService.run(db, redis)
+        finally:
+            await redis.aclose()
 
-    # TODO: 这里应该连接数据库，更新该产品的 description 字段
-    result = f"AI Optimized Description for {product_title}: Amazing quality..."
-
-    print(f"Finished AI generation for {product_id}")
-    return result
+    summary = asyncio.run(run())
+    print(f"AI content generated: {summary}")
+    return summary
 
 @celery_app.task(name="app.workers.tasks.check_low_stock")
 def check_low_stock():
-    # 注意：这里不能直接用 async 的 db session，需要用同步的方式，
-    # 或者用 asgiref.sync.async_to_sync 包装
-    # 为了简单，通常建议这里只做计算或调用外部 API，
-    # 如果必须查库，建议在该 task 内部单独创建一个同步的 Session
-    print("正在扫描库存不足的商品...")
-    # ... 发邮件逻辑 ...
-    return "Stock Checked"
+    """扫描库存不足的商品，每个用户一封汇总邮件 (只提醒和上次相比有变化的商品)"""
+    async def run():
+        redis = new_redis_client()
+        try:
+            async with task_session() as db:
+                return await LowStockService.run(db, redis)
+        finally:
+            await redis.aclose()
+
+    summary = asyncio.run(run())
+    print(f"Low stock checked: {summary}")
+    return summary
+
+
+@celery_app.task(name="app.workers.tasks.deliver_emails")
+def deliver_emails():
+    """
+    发送发件箱里的邮件 (同步代码: SMTP 连接要跨任务复用，不能绑在每次 asyncio.run 新建的事件循环上)
+    同一时间只有一个任务在发，其余的直接跳过
+    """
+    summary = EmailDelivery.drain(sync_redis_client)
+    if summary.get("sent") or summary.get("retry") or summary.get("dead"):
+        print(f"Emails delivered: {summary}")
+    return summary
+
+
+@worker_process_shutdown.connect
+def close_smtp_connection(**kwargs):
+    smtp_connection.close()
 
 @celery_app.task(name="app.workers.tasks.cleanup_temp_files")
 def cleanup_temp_files():
     print("Daily Cleanup...")
+    # 清理过期的导入落盘文件 (任务状态已经从 Redis 过期，不会再被续传)
+    expire_before = time.time() - settings.IMPORT_JOB_TTL_SECONDS
+    for path in Path(settings.IMPORT_SPOOL_DIR).glob("*"):
+        if path.is_file() and path.stat().st_mtime < expire_before:
+            path.unlink(missing_ok=True)
     return "Daily Cleanup"
 
+
+# acks_late + reject_on_worker_lost: Worker 中途挂掉时任务会重新投递，
+# ImportJobService.run 会从 Redis 里记录的进度继续导入
+@celery_app.task(name="app.workers.tasks.import_products", acks_late=True, reject_on_worker_lost=True)
+def import_products_task(job_id: str):
+    asyncio.run(ImportJobService.run(job_id))
+    return job_id
+
 @celery_app.task(name="app.workers.tasks.test_task")
 def test_task(product_id: int):
     print("Checking test_task...")
     return "test_task"
+
+
+@celery_app.task(name="app.workers.tasks.maintain_audit_partitions")
+def maintain_audit_partitions():
+    """提前创建审计日志的后续分区，删除超过保留期的分区"""
+    async def run():
+        async with task_session() as db:
+            created = await AuditPartitionService.ensure_partitions(db)
+            dropped = await AuditPartitionService.drop_expired(db)
+            await db.commit()
+        return created, dropped
+
+    created, dropped = asyncio.run(run())
+    print(f"Audit partitions ensured: {created}, dropped: {dropped}")
+    return {"ensured": created, "dropped": dropped}
+
+
+@celery_app.task(name="app.workers.tasks.reconcile_product_stats")
+def reconcile_product_stats():
+    """商品统计汇总表和 products 实际数据对账，修正触发器之外 (手工改库、TRUNCATE 等) 造成的偏差"""
+    async def run():
+        async with task_session() as db:
+            return await ProductStatsService.reconcile(db)
+
+    fixed = asyncio.run(run())
+    print(f"Product stats reconciled, fixed owners: {len(fixed)}")
+    return {"fixed": fixed}
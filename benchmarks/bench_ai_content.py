@@ -0,0 +1,47 @@
+"""
+基准: AI 内容生成的吞吐量 (只测生成阶段，不连数据库)
+
+用本地假 provider (固定延迟) 模拟模型调用，对比不同并发数 / 限速下每秒能处理多少个商品
+用法 (需要能加载 .env 配置):
+    python benchmarks/bench_ai_content.py --products 500 --latency-ms 200 --concurrency 1 8 32 --rate 0 50
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.ai_content import AIContentService, FakeAIProvider
+
+PRODUCT = {"title": "Wireless Bluetooth Headphones Noise Cancelling", "description_original": "over-ear"}
+
+
+async def run(products: int, latency_ms: float, concurrency: int, rate: float) -> dict:
+    settings.AI_CONCURRENCY = concurrency
+    settings.AI_RATE_LIMITS = {FakeAIProvider.name: rate}
+    provider = FakeAIProvider(latency_ms=latency_ms)
+    batch = [{"id": i, **PRODUCT} for i in range(products)]
+
+    started = time.perf_counter()
+    for offset in range(0, products, settings.AI_BATCH_SIZE):
+        await AIContentService.generate_batch(provider, batch[offset:offset + settings.AI_BATCH_SIZE])
+    elapsed = time.perf_counter() - started
+
+    return {"concurrency": concurrency, "rate": rate or "unlimited",
+            "seconds": round(elapsed, 2), "products_per_second": round(products / elapsed, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, nargs="+", default=[0], help="每秒请求数，0 表示不限速")
+    args = parser.parse_args()
+
+    for rate in args.rate:
+        for concurrency in args.concurrency:
+            print(await run(args.products, args.latency_ms, concurrency, rate))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
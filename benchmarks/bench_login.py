@@ -0,0 +1,102 @@
+"""
+基准测试: 登录 (bcrypt) 并发进行时 /me 接口的延迟
+
+对比两种模式:
+  inline: 在事件循环里直接调用 bcrypt (改造前的写法)
+  pool:   security.verify_and_update_password，在专用线程池里跑 (当前写法)
+
+不依赖数据库: 用 dependency_overrides 替换 get_db / get_current_user，/me 相当于缓存命中的情况
+用法 (需要能加载 .env 配置):
+    python benchmarks/bench_login.py --logins 8 --duration 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+from httpx import ASGITransport, AsyncClient
+
+from app.api import deps
+from app.core import security
+from app.core.config import settings
+from app.db.session import get_db
+from app.main import app
+from app.schemas.user import UserPrincipal
+
+PASSWORD = "benchmark-password"
+USER = SimpleNamespace(email="bench@example.com", is_active=True,
+                       hashed_password=security.get_password_hash(PASSWORD))
+PRINCIPAL = UserPrincipal(id=1, email=USER.email)
+
+
+class FakeSession:
+    async def execute(self, *args, **kwargs):
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(first=lambda: USER))
+
+    async def commit(self):
+        pass
+
+
+async def fake_db():
+    yield FakeSession()
+
+
+async def inline_verify(plain_password, hashed_password):
+    return security.pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(mode: str, logins: int, duration: float) -> dict:
+    original = security.verify_and_update_password
+    if mode == "inline":
+        security.verify_and_update_password = inline_verify
+
+    latencies = []
+    deadline = time.monotonic() + duration
+    transport = ASGITransport(app=app)
+    try:
+        async with AsyncClient(transport=transport, base_url="http://localhost") as client:
+            async def login_loop():
+                while time.monotonic() < deadline:
+                    await client.post(f"{settings.API_V1_STR}/login/access-token",
+                                      data={"username": USER.email, "password": PASSWORD})
+
+            async def me_loop():
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    await client.get(f"{settings.API_V1_STR}/me")
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(0.005)
+
+            await asyncio.gather(me_loop(), *[login_loop() for _ in range(logins)])
+    finally:
+        security.verify_and_update_password = original
+
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(max(latencies), 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=8, help="并发登录的协程数")
+    parser.add_argument("--duration", type=float, default=5, help="每种模式压测多少秒")
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_db] = fake_db
+    app.dependency_overrides[deps.get_current_user] = lambda: PRINCIPAL
+    for mode in ("inline", "pool"):
+        print(await run(mode, args.logins, args.duration))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+微基准: 认证依赖 get_current_user 每次调用的耗时 (用户缓存命中的情况)
+
+对比两种模式:
+  no-cache:    每次都 jwt.decode (签名校验 + JSON 解析，改造前的写法)
+  token-cache: security.decode_access_token，同一个 token 只校验一次
+用法 (需要能加载 .env 配置):
+    python benchmarks/bench_token_cache.py --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from jose import jwt
+from starlette.requests import Request
+
+from app.api import deps
+from app.core import security
+from app.core.config import settings
+from app.schemas.user import UserPrincipal
+from app.services.user_cache import PrincipalCache
+
+PRINCIPAL = UserPrincipal(id=1, email="bench@example.com")
+# 只读请求，不会触发 read-your-writes 标记
+REQUEST = Request({"type": "http", "method": "GET", "headers": []})
+
+
+def decode_without_cache(token: str) -> dict:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+async def run(mode: str, token: str, iterations: int) -> dict:
+    original = security.decode_access_token
+    if mode == "no-cache":
+        security.decode_access_token = decode_without_cache
+    try:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await deps.get_current_user(request=REQUEST, db=None, token=token)
+        elapsed = time.perf_counter() - started
+    finally:
+        security.decode_access_token = original
+
+    return {"mode": mode, "us_per_request": round(elapsed / iterations * 1e6, 2)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    # 用户缓存预热，只测 token 校验这一段
+    PrincipalCache._local.set(PRINCIPAL.email, PRINCIPAL)
+    token = security.create_access_token(PRINCIPAL.email)
+    for mode in ("no-cache", "token-cache"):
+        print(await run(mode, token, args.iterations))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
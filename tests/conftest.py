@@ -1,7 +1,16 @@
+import uuid
+
 import pytest
 from typing import AsyncGenerator
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.core import security
+from app.db.session import engine, get_db
 from app.main import app
+from app.models.user import User
 
 # 1. 解决 event_loop 问题 (针对 pytest-asyncio)
 @pytest.fixture(scope="session")
@@ -19,4 +28,51 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
     # 这里封装好了 transport 逻辑，以后测试用例里直接用 client 就行
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
-        yield ac
\ No newline at end of file
+        yield ac
+
+
+# 2. 需要数据库的测试: 整个测试跑在一个连接的外层事务里，结束时全部回滚，不留下任何数据
+#    被测代码里的 commit 只是释放 SAVEPOINT (join_transaction_mode="create_savepoint")
+@pytest.fixture
+async def db() -> AsyncGenerator[AsyncSession, None]:
+    try:
+        conn = await engine.connect()
+    except (OSError, SQLAlchemyError) as e:
+        pytest.skip(f"数据库不可用: {e}")
+
+    transaction = await conn.begin()
+    try:
+        async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint",
+                                expire_on_commit=False) as session:
+            yield session
+    finally:
+        await transaction.rollback()
+        await conn.close()
+
+
+@pytest.fixture
+def make_user(db):
+    async def make(**kwargs) -> User:
+        user = User(**{"email": f"{uuid.uuid4().hex}@example.com", "hashed_password": "x",
+                       "is_active": True, "is_superuser": False, **kwargs})
+        db.add(user)
+        await db.flush()
+        return user
+    return make
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {security.create_access_token(user.email)}"}
+
+
+# 3. 接口测试: 主库 / 只读会话都换成上面的 db，Host 用白名单里的 localhost
+@pytest.fixture
+async def api(db) -> AsyncGenerator[AsyncClient, None]:
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[deps.get_read_db] = lambda: db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as ac:
+            yield ac
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(deps.get_read_db, None)
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.db.redis import new_redis_client
+from app.db.session import engine
+from app.services.ai_content import (
+    SEO_KEYWORDS_MAX_LENGTH, AIContent, AIContentService, AIProvider, FakeAIProvider, RateLimiter,
+)
+
+
+class TrackingProvider(FakeAIProvider):
+    """记录同时在途的请求数；标题里带 fail 的商品抛异常"""
+
+    def __init__(self, latency_ms: float = 20):
+        super().__init__(latency_ms=latency_ms)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, product: dict) -> AIContent:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if "fail" in product["title"]:
+                raise RuntimeError("provider error")
+            return await super().generate(product)
+        finally:
+            self.in_flight -= 1
+
+
+def _batch(n: int, fail: tuple[int, ...] = ()) -> list[dict]:
+    return [{"id": i, "title": f"{'fail ' if i in fail else ''}Product {i}", "description_original": None}
+            for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_bounded_concurrency(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CONCURRENCY", 4)
+    provider = TrackingProvider()
+
+    started = time.monotonic()
+    results = await AIContentService.generate_batch(provider, _batch(12, fail=(3,)))
+
+    assert provider.max_in_flight == 4
+    # 12 个、每个 20ms、并发 4: 大约 3 轮，远小于串行的 240ms
+    assert time.monotonic() - started < 0.2
+    assert isinstance(results[3], RuntimeError)
+    assert all(isinstance(results[i], AIContent) for i in range(12) if i != 3)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_per_provider(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CONCURRENCY", 10)
+    monkeypatch.setattr(settings, "AI_RATE_LIMITS", {"fake": 50})
+    provider = FakeAIProvider(latency_ms=0)
+    assert provider.limiter.interval == pytest.approx(0.02)
+
+    started = time.monotonic()
+    await AIContentService.generate_batch(provider, _batch(6))
+    # 每秒 50 个: 第一个立即放行，之后每个间隔 20ms
+    assert time.monotonic() - started >= 0.1
+
+    limiter = RateLimiter(0)
+    started = time.monotonic()
+    await asyncio.gather(*(limiter.acquire() for _ in range(100)))
+    assert time.monotonic() - started < 0.05
+
+
+# 和 test_product_list 一样在同名临时表里跑，不碰真实数据
+SEED_SQL = """
+INSERT INTO products (id, owner_id, sku, title, price, currency, stock_qty, is_ai_optimized, status, supplier_cost)
+SELECT i, i % 3, 'SKU-' || i, CASE WHEN i = 5 THEN 'fail ' ELSE '' END || 'Product ' || i, 1, 'USD', 1,
+       i > 25, 'draft', 0
+FROM generate_series(1, 30) AS i
+"""
+
+
+@pytest.mark.asyncio
+async def test_run_writes_back_in_batches(monkeypatch):
+    monkeypatch.setattr(settings, "AI_BATCH_SIZE", 10)
+    redis = new_redis_client()
+    try:
+        await redis.ping()
+        conn = await engine.connect()
+    except (OSError, SQLAlchemyError, RedisError) as e:
+        await redis.aclose()
+        pytest.skip(f"数据库 / Redis 不可用: {e}")
+
+    # 整个测试固定在一个连接、一个外层事务里: run 里的 commit 只是释放 SAVEPOINT，
+    # 临时表一直可见，结束时全部回滚
+    transaction = await conn.begin()
+    try:
+        await conn.execute(text("CREATE TEMP TABLE products (LIKE public.products INCLUDING DEFAULTS)"))
+        await conn.execute(text(SEED_SQL))
+        async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint") as db:
+            statements = []
+            original = db.execute
+
+            async def counting_execute(statement, *args, **kwargs):
+                statements.append(str(statement))
+                return await original(statement, *args, **kwargs)
+
+            monkeypatch.setattr(db, "execute", counting_execute)
+            summary = await AIContentService.run(db, redis, TrackingProvider(latency_ms=0))
+
+        rows = (await conn.execute(text(
+            "SELECT id, is_ai_optimized, description_ai, seo_keywords FROM products ORDER BY id"
+        ))).all()
+    finally:
+        await transaction.rollback()
+        await conn.close()
+        await redis.aclose()
+
+    assert summary == {"optimized": 24, "failed": 1}
+    # 25 个待优化商品分 3 批读取，每批一条 UPDATE
+    assert sum("UPDATE products" in sql for sql in statements) == 3
+    assert {row.id for row in rows if not row.is_ai_optimized} == {5}
+    assert rows[0].description_ai.startswith("Product 1") and rows[0].seo_keywords
+    assert rows[29].description_ai is None  # 本来就已经优化过的不动
+
+
+def test_provider_must_implement_generate():
+    class Incomplete(AIProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+class RecordingDB:
+    """记录写回的参数，不连数据库"""
+
+    def __init__(self):
+        self.params = None
+
+    async def execute(self, statement, params):
+        self.params = params
+        return Result([])
+
+    async def commit(self):
+        pass
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+@pytest.mark.asyncio
+async def test_write_back_truncates_keywords_for_any_provider():
+    db = RecordingDB()
+    await AIContentService._write_back(db, None, {
+        1: AIContent(description_ai="d", seo_keywords="k" * (SEO_KEYWORDS_MAX_LENGTH + 100)),
+        2: AIContent(description_ai="d", seo_keywords="short"),
+    })
+    assert SEO_KEYWORDS_MAX_LENGTH == 500
+    assert [len(keywords) for keywords in db.params["keywords"]] == [500, 5]
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.models.audit import AuditLog
+from app.services import audit as audit_service
+from app.services.audit import AuditPartitionService, AuditWriter, _take_spilled
+from tests.conftest import auth_headers
+
+
+def _record(i: int) -> dict:
+    return {"user_id": 1, "action": "UPDATE", "target_resource": "product", "target_id": str(i),
+            "details": None, "ip_address": None, "created_at": datetime.now(timezone.utc)}
+
+
+def _spill_line(i: int) -> str:
+    return json.dumps({**_record(i), "created_at": _record(i)["created_at"].isoformat()}) + "\n"
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """不连数据库的 AuditWriter: _flush 记录每一批，gate 关着的时候写入卡住，用来把队列塞满"""
+    monkeypatch.setattr(settings, "AUDIT_SPILL_PATH", str(tmp_path / "audit_spill.jsonl"))
+    monkeypatch.setattr(settings, "AUDIT_QUEUE_SIZE", 2)
+    monkeypatch.setattr(settings, "AUDIT_BATCH_SIZE", 1)
+    writer = AuditWriter()
+    writer.flushed = []
+    writer.gate = asyncio.Event()
+
+    async def flush(batch: list[dict]) -> None:
+        await writer.gate.wait()
+        writer.flushed += [record["target_id"] for record in batch]
+
+    writer._flush = flush
+    return writer
+
+
+async def _fill_queue(writer: AuditWriter) -> None:
+    # 第 0 条被后台任务取走后卡在写入上，1、2 两条占满队列
+    await writer.start()
+    for i in range(3):
+        await writer.put(_record(i))
+        await asyncio.sleep(0.01)
+    assert writer._queue.full()
+
+
+async def test_block_waits_for_space(writer, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_OVERFLOW", "block")
+    await _fill_queue(writer)
+
+    blocked = asyncio.create_task(writer.put(_record(3)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    writer.gate.set()
+    await asyncio.wait_for(blocked, 1)
+    await writer.stop()
+    assert writer.flushed == ["0", "1", "2", "3"]
+
+
+async def test_drop_discards_and_counts(writer, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_OVERFLOW", "drop")
+    await _fill_queue(writer)
+
+    await writer.put(_record(3))
+    assert writer.dropped == 1
+
+    writer.gate.set()
+    await writer.stop()
+    assert writer.flushed == ["0", "1", "2"]
+
+
+async def test_spill_writes_file_and_replays_on_start(writer, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_OVERFLOW", "spill")
+    await _fill_queue(writer)
+
+    await writer.put(_record(3))
+    assert writer.spilled == 1
+    writer.gate.set()
+    await writer.stop()
+    assert writer.flushed == ["0", "1", "2"]
+
+    # 下次启动时先补写溢出的记录
+    await writer.start()
+    await writer.stop()
+    assert writer.flushed == ["0", "1", "2", "3"]
+    assert list(os.listdir(os.path.dirname(settings.AUDIT_SPILL_PATH))) == []
+
+
+async def test_stop_drains_queue(writer, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_BATCH_SIZE", 500)
+    monkeypatch.setattr(settings, "AUDIT_QUEUE_SIZE", 100)
+    writer.gate.set()
+    await writer.start()
+    for i in range(50):
+        await writer.put(_record(i))
+
+    await writer.stop()
+    assert writer.flushed == [str(i) for i in range(50)]
+    assert not writer.running
+
+
+def test_take_spilled_replays_orphaned_files(tmp_path):
+    path = tmp_path / "audit_spill.jsonl"
+    path.write_text(_spill_line(1))
+    orphaned = tmp_path / f"audit_spill.jsonl.{_dead_pid()}.replaying"
+    orphaned.write_text(_spill_line(2))
+    # 还在运行的进程正在重放的文件不能动
+    in_progress = tmp_path / f"audit_spill.jsonl.{os.getppid()}.replaying"
+    in_progress.write_text(_spill_line(3))
+
+    records = _take_spilled(path)
+
+    assert sorted(record["target_id"] for record in records) == ["1", "2"]
+    assert isinstance(records[0]["created_at"], datetime)
+    assert sorted(os.listdir(tmp_path)) == [in_progress.name]
+
+
+def test_take_spilled_skips_file_taken_by_another_process(tmp_path, monkeypatch):
+    path = tmp_path / "audit_spill.jsonl"
+    path.write_text(_spill_line(1))
+    replace = os.replace
+
+    def taken_first(source, target):
+        # 另一个进程在 exists 检查和改名之间抢先取走了文件
+        replace(source, tmp_path / "other")
+        raise FileNotFoundError(source)
+
+    monkeypatch.setattr(audit_service.os, "replace", taken_first)
+    assert _take_spilled(path) == []
+    assert _take_spilled(tmp_path / "missing.jsonl") == []
+
+
+@pytest.fixture
+async def flush_db(db, tmp_path, monkeypatch):
+    """真正写库的 _flush: 会话开在测试事务里 (commit 只是释放 SAVEPOINT)，溢出 / 死信文件写到临时目录"""
+    monkeypatch.setattr(settings, "AUDIT_SPILL_PATH", str(tmp_path / "audit_spill.jsonl"))
+    monkeypatch.setattr(settings, "AUDIT_DEAD_LETTER_PATH", str(tmp_path / "audit_dead_letter.jsonl"))
+    monkeypatch.setattr(audit_service, "AsyncSessionLocal",
+                        lambda: AsyncSession(bind=db.bind, join_transaction_mode="create_savepoint"))
+    await AuditPartitionService.ensure_partitions(db, months_ahead=0)
+    return db
+
+
+async def test_bad_record_goes_to_dead_letter(flush_db, tmp_path):
+    batch = [{**_record(i), "target_id": f"flush-{i}"} for i in range(3)]
+    # action 超长: 数据本身的问题，重试多少次都写不进去
+    batch[1]["action"] = "X" * 100
+
+    await AuditWriter()._flush(batch)
+
+    written = (await flush_db.execute(
+        select(AuditLog.target_id).filter(AuditLog.target_id.like("flush-%")).order_by(AuditLog.target_id)
+    )).scalars().all()
+    assert written == ["flush-0", "flush-2"]
+    dead = (tmp_path / "audit_dead_letter.jsonl").read_text().splitlines()
+    assert [json.loads(line)["target_id"] for line in dead] == ["flush-1"]
+    # 不进溢出文件，否则每次启动补写都会失败、再溢出
+    assert not (tmp_path / "audit_spill.jsonl").exists()
+
+
+async def test_connection_error_spills_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_SPILL_PATH", str(tmp_path / "audit_spill.jsonl"))
+    monkeypatch.setattr(settings, "AUDIT_DEAD_LETTER_PATH", str(tmp_path / "audit_dead_letter.jsonl"))
+    engine = create_async_engine("postgresql+asyncpg://postgres@127.0.0.1:1/unreachable")
+    monkeypatch.setattr(audit_service, "AsyncSessionLocal", async_sessionmaker(engine))
+
+    await AuditWriter()._flush([_record(1), _record(2)])
+    await engine.dispose()
+
+    assert [record["target_id"] for record in _take_spilled(tmp_path / "audit_spill.jsonl")] == ["1", "2"]
+    assert not (tmp_path / "audit_dead_letter.jsonl").exists()
+
+
+async def _partitions(db) -> set[str]:
+    return set((await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'audit_logs'"
+    ))).scalars())
+
+
+async def test_partitions_created_ahead_and_expired_dropped(db):
+    # 都在测试事务里执行，结束时回滚
+    names = await AuditPartitionService.ensure_partitions(db, months_ahead=2)
+    assert len(names) == 3
+    assert set(names) <= await _partitions(db)
+
+    await db.execute(text(
+        "CREATE TABLE audit_logs_y2000m01 PARTITION OF audit_logs "
+        "FOR VALUES FROM ('2000-01-01 00:00:00+00') TO ('2000-02-01 00:00:00+00')"
+    ))
+    await db.execute(insert(AuditLog).values({**_record(1), "created_at": datetime(2000, 1, 15, tzinfo=timezone.utc)}))
+
+    dropped = await AuditPartitionService.drop_expired(db, retention_months=12)
+    assert "audit_logs_y2000m01" in dropped
+    assert not set(names) & set(dropped)
+    assert set(names) <= await _partitions(db)
+    assert await AuditPartitionService.drop_expired(db, retention_months=0) == []
+
+
+async def test_admin_audit_endpoint(db, make_user, api):
+    admin, user = await make_user(is_superuser=True), await make_user()
+    await AuditPartitionService.ensure_partitions(db, months_ahead=0)
+    now = datetime.now(timezone.utc)
+    await db.execute(insert(AuditLog).values([
+        {**_record(i), "user_id": user.id, "action": "DELETE" if i % 2 else "UPDATE",
+         "created_at": now - timedelta(minutes=i)}
+        for i in range(5)
+    ]))
+    url = f"{settings.API_V1_STR}/admin/audit-logs/"
+
+    response = await api.get(url, params={"user_id": user.id}, headers=auth_headers(user))
+    assert response.status_code == 403
+
+    # 按操作类型过滤，按时间倒序游标分页
+    params = {"user_id": user.id, "action": "UPDATE", "limit": 2}
+    first = await api.get(url, params=params, headers=auth_headers(admin))
+    assert first.status_code == 200
+    assert [log["target_id"] for log in first.json()] == ["0", "2"]
+
+    second = await api.get(url, params={**params, "cursor": first.headers["X-Next-Cursor"]},
+                           headers=auth_headers(admin))
+    assert [log["target_id"] for log in second.json()] == ["4"]
+    assert "X-Next-Cursor" not in second.headers
+
+    since = (now - timedelta(minutes=1, seconds=30)).isoformat()
+    response = await api.get(url, params={"user_id": user.id, "since": since}, headers=auth_headers(admin))
+    assert [log["target_id"] for log in response.json()] == ["0", "1"]
+
+    response = await api.get(url, params={"cursor": "garbage"}, headers=auth_headers(admin))
+    assert response.status_code == 400
@@ -0,0 +1,145 @@
+import asyncio
+import random
+import time
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.core.cache import SingleFlight, TTLCache
+from app.db.redis import redis_client
+from app.services.product_cache import VERSION_KEY, ProductCache
+from tests.conftest import auth_headers
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # a 变成最近使用
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1, expires_at=time.monotonic() - 1)  # 指定的过期时间比 ttl 早，以它为准
+    cache.set("b", 2)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+async def test_single_flight_coalesces_concurrent_loads():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*[flight.do("k", load) for _ in range(10)])
+
+    assert calls == 1
+    assert [value for value, _ in results] == ["value"] * 10
+    assert sum(shared for _, shared in results) == 9
+    assert len(flight) == 0
+
+
+async def test_single_flight_shares_errors_and_does_not_cache_them():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return 1
+
+    assert await flight.do("k", ok) == (1, False)
+
+
+@pytest.fixture
+async def owners():
+    """两个不会和真实数据冲突的 owner_id，结束时清掉它们的缓存 key"""
+    try:
+        await redis_client.ping()
+    except (OSError, RedisError) as e:
+        pytest.skip(f"Redis 不可用: {e}")
+    ids = [random.randint(10 ** 9, 2 * 10 ** 9) for _ in range(2)]
+    yield ids
+    for owner_id in ids:
+        keys = await redis_client.keys(f"product_cache:{owner_id}:*")
+        if keys:
+            await redis_client.delete(*keys)
+
+
+class CountingLoader:
+    def __init__(self, value, delay: float = 0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+async def test_product_cache_version_bump_on_write(owners):
+    owner_id, _ = owners
+    loader = CountingLoader({"items": [1]})
+
+    assert await ProductCache.get_or_load(owner_id, "list", loader) == {"items": [1]}
+    assert await ProductCache.get_or_load(owner_id, "list", loader) == {"items": [1]}
+    assert loader.calls == 1
+
+    # 写入之后版本号 +1，旧的缓存不会再被读到
+    await ProductCache.invalidate(owner_id)
+    loader.value = {"items": [1, 2]}
+    assert await ProductCache.get_or_load(owner_id, "list", loader) == {"items": [1, 2]}
+    assert loader.calls == 2
+    assert await redis_client.get(VERSION_KEY.format(owner_id=owner_id)) == "1"
+
+
+async def test_product_cache_isolates_owners(owners):
+    a, b = owners
+    load_a, load_b = CountingLoader("a"), CountingLoader("b")
+    assert await ProductCache.get_or_load(a, "list", load_a) == "a"
+    assert await ProductCache.get_or_load(b, "list", load_b) == "b"
+
+    # 一个用户的写入不影响另一个用户的缓存
+    await ProductCache.invalidate(a)
+    assert await ProductCache.get_or_load(b, "list", load_b) == "b"
+    assert await ProductCache.get_or_load(a, "list", load_a) == "a"
+    assert (load_a.calls, load_b.calls) == (2, 1)
+
+
+async def test_product_cache_coalesces_concurrent_misses(owners):
+    owner_id, _ = owners
+    loader = CountingLoader([1, 2, 3], delay=0.05)
+    coalesced = ProductCache.coalesced
+
+    results = await asyncio.gather(*[ProductCache.get_or_load(owner_id, "list", loader) for _ in range(10)])
+
+    assert results == [[1, 2, 3]] * 10
+    assert loader.calls == 1
+    assert ProductCache.coalesced - coalesced == 9
+
+
+async def test_cache_stats_requires_superuser(api, make_user):
+    admin, user = await make_user(is_superuser=True), await make_user()
+
+    assert (await api.get("/health/cache")).status_code == 401
+    assert (await api.get("/health/cache", headers=auth_headers(user))).status_code == 403
+    response = await api.get("/health/cache", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert "hit_ratio" in response.json()["products"]
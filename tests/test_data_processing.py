@@ -0,0 +1,26 @@
+from io import BytesIO
+
+from app.services.data_processing import DataService
+from app.services.product_import import ImportResult, _validate_row
+
+
+def test_iter_import_chunks_csv():
+    content = "Title,SKU,Price\n" + "".join(f"T{i},SKU{i},{i}\n" for i in range(5))
+    chunks = list(DataService.iter_import_chunks(BytesIO(content.encode("utf-8-sig")), "p.csv", chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    # 行号从 2 开始 (第 1 行是表头)
+    assert chunks[0][0] == (2, {"Title": "T0", "SKU": "SKU0", "Price": "0"})
+
+
+def test_validate_row():
+    assert _validate_row({"Title": "T", "SKU": 1001, "Price": "9.5", "Unknown": "x"})["sku"] == "1001"
+
+    result = ImportResult()
+    for row_number, raw in [(2, {"Title": "", "SKU": "A"}), (3, {"Title": "T", "SKU": "A" * 51})]:
+        try:
+            _validate_row(raw)
+        except ValueError as e:
+            result.reject(row_number, str(e))
+    assert result.rejected == 2
+    assert [e["row"] for e in result.errors] == [2, 3]
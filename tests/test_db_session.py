@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+
+from app.core.config import settings
+from app.db import session as db_session
+from app.db.session import InstrumentedQueuePool, PoolStats, _connect_args, build_engine, get_pool_status
+from tests.conftest import auth_headers
+
+
+def test_connect_args_for_pgbouncer(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    args = _connect_args()
+
+    assert args["statement_cache_size"] == 0
+    assert args["prepared_statement_cache_size"] == 0
+    names = {args["prepared_statement_name_func"]() for _ in range(100)}
+    assert len(names) == 100
+    assert all(name.startswith("__asyncpg_") for name in names)
+
+
+def test_connect_args_without_pgbouncer(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", False)
+    monkeypatch.setattr(settings, "DB_STATEMENT_CACHE_SIZE", 50)
+    assert _connect_args() == {"statement_cache_size": 50, "prepared_statement_cache_size": 50}
+
+
+async def test_pgbouncer_mode_runs_parameterized_queries(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    engine = build_engine(settings.DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            # 同一条语句执行两次: 不缓存预编译语句，每次用新的名字
+            for i in range(2):
+                assert await conn.scalar(text("SELECT CAST(:i AS integer) + 1"), {"i": i}) == i + 1
+    except (OSError, exc.DBAPIError) as e:
+        pytest.skip(f"数据库不可用: {e}")
+    finally:
+        await engine.dispose()
+
+
+async def test_pool_status_reports_waits_and_checkouts(monkeypatch):
+    # 一个连接的小池子: 第二个请求要等第一个归还
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.2)
+    monkeypatch.setattr(db_session, "pool_stats", PoolStats())
+    engine = build_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool)
+    monkeypatch.setattr(db_session, "engine", engine)
+
+    try:
+        first = await engine.connect()
+    except (OSError, exc.DBAPIError) as e:
+        await engine.dispose()
+        pytest.skip(f"数据库不可用: {e}")
+
+    try:
+        assert get_pool_status()["in_use"] == 1
+
+        async def release_later():
+            await asyncio.sleep(0.1)
+            await first.close()
+
+        release = asyncio.create_task(release_later())
+        async with engine.connect() as second:
+            await second.execute(text("SELECT 1"))
+        await release
+
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                async with engine.connect():
+                    pass
+
+        status = get_pool_status()
+        assert status["checkouts"] == 4
+        assert status["timeouts"] == 1
+        assert status["wait_max_ms"] >= 100
+        assert status["wait_avg_ms"] > 0
+        assert (status["size"], status["in_use"], status["idle"]) == (1, 0, 1)
+    finally:
+        await engine.dispose()
+
+
+async def test_db_stats_requires_superuser(api, make_user):
+    admin, user = await make_user(is_superuser=True), await make_user()
+
+    assert (await api.get("/health/db")).status_code == 401
+    assert (await api.get("/health/db", headers=auth_headers(user))).status_code == 403
+    response = await api.get("/health/db", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert {"checkouts", "wait_avg_ms", "replicas"} <= response.json().keys()
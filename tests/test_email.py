@@ -0,0 +1,172 @@
+import json
+import socket
+import time
+
+import pytest
+from aiosmtpd.controller import Controller
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.services import email as email_service
+from app.services.email import DEAD_KEY, LOCK_KEY, OUTBOX_KEY, RETRY_KEY, EmailDelivery, SmtpConnection
+
+
+class RecordingHandler:
+    """本地 SMTP 服务: 记录收到的邮件和所在的会话；temp@ 返回 451，bad@ 返回 550"""
+
+    def __init__(self):
+        self.messages: list[tuple[int, str, str]] = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("temp@"):
+            return "451 try again later"
+        if address.startswith("bad@"):
+            return "550 no such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((id(session), envelope.rcpt_tos[0], envelope.content.decode()))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    monkeypatch.setattr(settings, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(settings, "MAIL_PORT", controller.port)
+    monkeypatch.setattr(settings, "MAIL_TLS", False)
+    monkeypatch.setattr(settings, "MAIL_SSL", False)
+    monkeypatch.setattr(settings, "MAIL_USERNAME", "")
+    monkeypatch.setattr(settings, "EMAIL_RATE_PER_SECOND", 1000)
+    yield handler
+    controller.stop()
+
+
+def _raw(email_to: str, **message) -> str:
+    message.setdefault("body", "<p>hi</p>")
+    return json.dumps({"id": email_to.replace("@", "."), "attempts": 0, "to": email_to, "subject": "s", **message})
+
+
+def test_batch_reuses_one_connection(smtp_server):
+    smtp = SmtpConnection()
+    outcomes = [outcome for _, outcome in EmailDelivery.send_batch([_raw(f"u{i}@example.com") for i in range(5)], smtp)]
+    smtp.close()
+
+    assert outcomes == ["sent"] * 5
+    assert len({session for session, _, _ in smtp_server.messages}) == 1
+
+
+def test_transient_and_permanent_failures(smtp_server):
+    smtp = SmtpConnection()
+    raw = [_raw("temp@example.com"), _raw("bad@example.com"), _raw("ok@example.com")]
+    outcomes = [outcome for _, outcome in EmailDelivery.send_batch(raw, smtp)]
+    smtp.close()
+
+    assert outcomes == ["retry", "dead", "sent"]
+    assert [to for _, to, _ in smtp_server.messages] == ["ok@example.com"]
+
+
+def test_server_down_stops_batch(monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(settings, "MAIL_PORT", _free_port())
+    monkeypatch.setattr(settings, "MAIL_SSL", False)
+
+    outcomes = list(EmailDelivery.send_batch([_raw("a@example.com"), _raw("b@example.com")], SmtpConnection()))
+    assert [outcome for _, outcome in outcomes] == ["offline"]
+
+
+def test_template_rendered_once_per_batch(smtp_server, monkeypatch):
+    calls = []
+    get_template = email_service.templates.get_template
+
+    def counting_get_template(name):
+        template = get_template(name)
+        render = template.render
+        template.render = lambda *args, **kwargs: calls.append(name) or render(*args, **kwargs)
+        return template
+
+    monkeypatch.setattr(email_service.templates, "get_template", counting_get_template)
+    context = {"threshold": 5, "items": [{"sku": "S1", "title": "<b>t</b>", "stock_qty": 1}], "more": 0, "total": 1}
+    raw = [_raw(f"u{i}@example.com", body=None, template="low_stock_digest.html", context=context) for i in range(3)]
+
+    smtp = SmtpConnection()
+    assert [outcome for _, outcome in EmailDelivery.send_batch(raw, smtp)] == ["sent"] * 3
+    smtp.close()
+
+    assert calls == ["low_stock_digest.html"]
+    assert all("&lt;b&gt;t&lt;/b&gt;" in content for _, _, content in smtp_server.messages)
+
+
+def test_rate_limit(smtp_server, monkeypatch):
+    monkeypatch.setattr(settings, "EMAIL_RATE_PER_SECOND", 20)
+    smtp = SmtpConnection()
+    started = time.monotonic()
+    list(EmailDelivery.send_batch([_raw(f"u{i}@example.com") for i in range(6)], smtp))
+    smtp.close()
+
+    # 6 封、每秒 20 封: 第一封立即发，之后每封间隔 0.05 秒
+    assert time.monotonic() - started >= 0.25
+
+
+def test_zero_rate_means_unlimited(smtp_server, monkeypatch):
+    monkeypatch.setattr(settings, "EMAIL_RATE_PER_SECOND", 0)
+    smtp = SmtpConnection()
+    outcomes = [outcome for _, outcome in EmailDelivery.send_batch([_raw(f"u{i}@example.com") for i in range(3)], smtp)]
+    smtp.close()
+    assert outcomes == ["sent"] * 3
+
+
+@pytest.fixture
+def outbox_redis(monkeypatch):
+    redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        redis.ping()
+    except (OSError, RedisError) as e:
+        pytest.skip(f"Redis 不可用: {e}")
+
+    # 用独立的 key，不碰真实发件箱
+    keys = {name: f"test:{key}" for name, key in
+            {"OUTBOX_KEY": OUTBOX_KEY, "RETRY_KEY": RETRY_KEY, "DEAD_KEY": DEAD_KEY, "LOCK_KEY": LOCK_KEY}.items()}
+    for name, key in keys.items():
+        monkeypatch.setattr(email_service, name, key)
+    redis.delete(*keys.values())
+    yield redis, keys
+    redis.delete(*keys.values())
+    redis.close()
+
+
+def test_drain_moves_failures_out_of_outbox(smtp_server, outbox_redis):
+    redis, keys = outbox_redis
+    redis.rpush(keys["OUTBOX_KEY"], _raw("ok@example.com"), _raw("temp@example.com"), _raw("bad@example.com"))
+    smtp = SmtpConnection()
+    summary = EmailDelivery.drain(redis, smtp)
+    smtp.close()
+
+    assert summary == {"sent": 1, "retry": 1, "dead": 1}
+    assert redis.llen(keys["OUTBOX_KEY"]) == 0
+    assert json.loads(redis.zrange(keys["RETRY_KEY"], 0, -1)[0])["attempts"] == 1
+    assert json.loads(redis.lrange(keys["DEAD_KEY"], 0, -1)[0])["to"] == "bad@example.com"
+    assert not redis.exists(keys["LOCK_KEY"])
+
+
+def test_drain_releases_only_its_own_lock(smtp_server, outbox_redis, monkeypatch):
+    redis, keys = outbox_redis
+
+    def lock_taken_over(redis):
+        # 本轮跑得太久锁过期了，另一个消费者拿到了锁
+        redis.set(keys["LOCK_KEY"], "other-drain")
+
+    monkeypatch.setattr(EmailDelivery, "_requeue_due", staticmethod(lock_taken_over))
+    EmailDelivery.drain(redis, SmtpConnection())
+    assert redis.get(keys["LOCK_KEY"]) == "other-drain"
+    assert EmailDelivery.drain(redis, SmtpConnection()) == {"skipped": True}
@@ -0,0 +1,19 @@
+from app.schemas.user import UserPrincipal
+from app.services.feature import FeatureService, FlagRule
+
+
+def _user(user_id: int) -> UserPrincipal:
+    return UserPrincipal(id=user_id, email=f"u{user_id}@example.com")
+
+
+def test_percentage_rollout_is_deterministic(monkeypatch):
+    monkeypatch.setattr(FeatureService, "_flags", {
+        "new-editor": FlagRule("new-editor", False, 20, frozenset({3})),
+    })
+
+    enabled = [i for i in range(1000) if FeatureService.is_enabled("new-editor", _user(i))]
+    assert 150 < len(enabled) < 250  # 约 20%
+    assert enabled == [i for i in range(1000) if FeatureService.is_enabled("new-editor", _user(i))]
+    assert FeatureService.is_enabled("new-editor", _user(3))  # 白名单
+    assert not FeatureService.is_enabled("new-editor")
+    assert not FeatureService.is_enabled("unknown", _user(3))
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core import logger as logger_module
+from app.core.logger import LogFilter, QueueSink, format_text
+
+
+def test_repeated_log_lines_are_suppressed(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_REPEAT_LIMIT", 3)
+    monkeypatch.setattr(settings, "LOG_REPEAT_WINDOW_SECONDS", 60)
+    messages = []
+    handler_id = logger.add(lambda m: messages.append(m.record), filter=LogFilter(), format="{message}")
+    try:
+        for i in range(10):
+            logger.info("same line {}", i)
+        logger.info("another line")
+    finally:
+        logger.remove(handler_id)
+
+    assert [r["message"] for r in messages] == ["same line 0", "same line 1", "same line 2", "another line"]
+
+
+def test_queue_sink_never_blocks_on_slow_writer():
+    release = threading.Event()
+    written = []
+
+    def slow_writer(line):
+        release.wait()
+        written.append(line)
+
+    sink = QueueSink(formatter=format_text, writers=[slow_writer], maxsize=10)
+    handler_id = logger.add(sink, format="{message}")
+    try:
+        started = time.perf_counter()
+        for i in range(1000):
+            logger.info("message {}", i)
+        elapsed = time.perf_counter() - started
+    finally:
+        logger.remove(handler_id)
+        release.set()
+        sink.stop()
+
+    assert elapsed < 1  # 写出线程卡住时，调用方也不会被阻塞
+    assert 0 < len(written) <= 11  # 队列满了之后的日志被丢弃
+
+
+def test_file_per_process_and_expired_files_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger_module, "LOG_PATH", tmp_path)
+    monkeypatch.setattr(settings, "LOG_JSON", False)
+    expired = tmp_path / "app.1.log.2026-01-01"
+    expired.write_text("old")
+    os.utime(expired, (0, 0))
+    recent = tmp_path / "app.2.log"
+    recent.write_text("recent")
+
+    write = logger_module._file_writer()
+    write("hello")
+
+    assert not expired.exists()
+    assert recent.exists()
+    assert (tmp_path / f"app.{os.getpid()}.log").read_text(encoding="utf-8") == "hello\n"
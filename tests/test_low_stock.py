@@ -0,0 +1,161 @@
+import asyncio
+import uuid
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.db.redis import new_redis_client
+from app.models.product import Product
+from app.services import low_stock
+from app.services.email import EmailService, templates
+from app.services.low_stock import LowStockService
+
+
+def _item(product_id: int, stock_qty: int) -> dict:
+    return {"id": product_id, "sku": f"SKU-{product_id}", "title": f"<b>{product_id}</b>", "stock_qty": stock_qty}
+
+
+def test_changes_only_reports_new_and_newly_out_of_stock():
+    items = {1: _item(1, 3), 2: _item(2, 0), 3: _item(3, 2)}
+    alerted = {1: 3, 2: 4, 4: 1}  # 1 已提醒过且没变；2 提醒之后降到 0；4 库存已恢复
+
+    new, recovered = LowStockService.changes(items, alerted)
+    assert sorted(item["id"] for item in new) == [2, 3]
+    assert recovered == [4]
+
+    # 已经按 0 提醒过的不再重复提醒
+    assert LowStockService.changes({2: _item(2, 0)}, {2: 0}) == ([], [])
+
+
+def test_render_digest_limits_and_escapes(monkeypatch):
+    monkeypatch.setattr(settings, "LOW_STOCK_DIGEST_MAX_ITEMS", 2)
+    context = LowStockService.digest_context([_item(1, 4), _item(2, 0), _item(3, 1)], total=10)
+    body = templates.get_template("low_stock_digest.html").render(**context)
+
+    assert body.index("SKU-2") < body.index("SKU-3")  # 库存少的排前面
+    assert "SKU-1" not in body
+    assert "另有 1 个商品未列出" in body
+    assert "&lt;b&gt;2&lt;/b&gt;" in body
+    assert "当前共有 10 个商品库存不足" in body
+
+
+@pytest.fixture
+async def redis(monkeypatch):
+    client = new_redis_client()
+    try:
+        await client.ping()
+    except (OSError, RedisError) as e:
+        await client.aclose()
+        pytest.skip(f"Redis 不可用: {e}")
+
+    # 用独立的 key，不碰真实的提醒记录
+    for name in ("ALERTED_KEY", "OWNERS_KEY", "LOCK_KEY"):
+        monkeypatch.setattr(low_stock, name, f"test:{getattr(low_stock, name)}")
+    yield client
+    keys = await client.keys("test:low_stock:*")
+    if keys:
+        await client.delete(*keys)
+    await client.aclose()
+
+
+class FakeOutbox(list):
+    """代替发件箱: 记录收件人；failing 为 True 时模拟放进发件箱失败"""
+    failing = False
+
+    async def send_template(self, subject, email_to, template, context, redis=None):
+        if self.failing:
+            raise RedisError("outbox unavailable")
+        self.append(email_to)
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    outbox = FakeOutbox()
+    monkeypatch.setattr(EmailService, "send_template", outbox.send_template)
+    return outbox
+
+
+async def test_alert_recorded_only_after_email_queued(db, make_user, redis, outbox):
+    owner = await make_user()
+    product = Product(owner_id=owner.id, sku=uuid.uuid4().hex, title="t", price=1.0, stock_qty=1)
+    db.add(product)
+    await db.flush()
+    alerted_key = low_stock.ALERTED_KEY.format(owner_id=owner.id)
+
+    # 邮件没放进发件箱: 不能记成已提醒，锁也要释放
+    outbox.failing = True
+    with pytest.raises(RedisError):
+        await LowStockService.run(db, redis)
+    assert await redis.hgetall(alerted_key) == {}
+    assert not await redis.exists(low_stock.LOCK_KEY)
+
+    # 下一轮重新提醒，成功后记下
+    outbox.failing = False
+    await LowStockService.run(db, redis)
+    assert owner.email in outbox
+    assert await redis.hgetall(alerted_key) == {str(product.id): "1"}
+
+    # 已经提醒过的不再重复
+    outbox.clear()
+    await LowStockService.run(db, redis)
+    assert owner.email not in outbox
+
+
+async def test_lock_released_only_by_its_holder(db, redis, outbox, monkeypatch):
+    async def lock_taken_over(*args, **kwargs):
+        # 本轮跑得太久锁过期了，另一个进程拿到了锁
+        await redis.set(low_stock.LOCK_KEY, "other-run")
+        return {}
+
+    monkeypatch.setattr(LowStockService, "_alerted", staticmethod(lock_taken_over))
+    await LowStockService.run(db, redis)
+    assert await redis.get(low_stock.LOCK_KEY) == "other-run"
+
+    assert await LowStockService.run(db, redis) == {"skipped": True}
+
+
+async def _low_stock_owners(db, make_user, count: int) -> None:
+    for _ in range(count):
+        owner = await make_user()
+        db.add(Product(owner_id=owner.id, sku=uuid.uuid4().hex, title="t", price=1.0, stock_qty=1))
+    await db.flush()
+
+
+async def test_lock_renewed_while_scanning(db, make_user, redis, outbox, monkeypatch):
+    monkeypatch.setattr(settings, "LOW_STOCK_LOCK_SECONDS", 1)
+    await _low_stock_owners(db, make_user, 3)
+    ttls = []
+    alerted = LowStockService._alerted
+
+    async def slow_alerted(redis_, owner_id):
+        # 每个用户处理得慢一点，不续期的话锁在扫描中途就过期了
+        await asyncio.sleep(0.4)
+        ttls.append(await redis.pttl(low_stock.LOCK_KEY))
+        return await alerted(redis_, owner_id)
+
+    monkeypatch.setattr(LowStockService, "_alerted", staticmethod(slow_alerted))
+    summary = await LowStockService.run(db, redis)
+
+    assert "aborted" not in summary
+    assert len(ttls) >= 3 and all(ttl > 0 for ttl in ttls)
+    assert not await redis.exists(low_stock.LOCK_KEY)
+
+
+async def test_run_stops_when_lock_lost(db, make_user, redis, outbox, monkeypatch):
+    monkeypatch.setattr(settings, "LOW_STOCK_LOCK_SECONDS", 1)
+    await _low_stock_owners(db, make_user, 2)
+
+    async def lock_taken_over(*args, **kwargs):
+        # 锁过期后被另一个进程拿到，下次续期时发现
+        await redis.set(low_stock.LOCK_KEY, "other-run")
+        await asyncio.sleep(0.4)
+        return {}
+
+    monkeypatch.setattr(LowStockService, "_alerted", staticmethod(lock_taken_over))
+    summary = await LowStockService.run(db, redis)
+
+    assert summary["aborted"]
+    assert summary["owners"] == 1
+    assert outbox == []
+    assert await redis.get(low_stock.LOCK_KEY) == "other-run"
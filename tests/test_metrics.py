@@ -0,0 +1,34 @@
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.core.metrics import UNMATCHED_ROUTE
+from app.main import app
+
+
+def _requests(route: str, status: int) -> float:
+    labels = {"method": "GET", "route": route, "status": str(status)}
+    return REGISTRY.get_sample_value("http_requests_total", labels) or 0.0
+
+
+async def test_metrics_use_route_template_not_raw_path():
+    template = f"{settings.API_V1_STR}/products/{{product_id}}"
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as client:
+        before = {
+            "product": _requests(template, 401),
+            "unmatched": _requests(UNMATCHED_ROUTE, 404),
+        }
+
+        # 带参数的路由 (没登录 401，但已经匹配到了路由)，以及没有匹配到任何路由的 404
+        for product_id in (123456789, 987654321):
+            response = await client.get(f"{settings.API_V1_STR}/products/{product_id}")
+            assert response.status_code == 401
+        for path in ("/no/such/path/123456789", "/another-missing-page"):
+            assert (await client.get(path)).status_code == 404
+
+        metrics = (await client.get("/metrics")).text
+
+    assert _requests(template, 401) - before["product"] == 2
+    assert _requests(UNMATCHED_ROUTE, 404) - before["unmatched"] == 2
+    assert f'route="{template}"' in metrics
+    assert "123456789" not in metrics and "987654321" not in metrics and "another-missing-page" not in metrics
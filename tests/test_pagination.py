@@ -0,0 +1,14 @@
+import pytest
+from app.core.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"id": 42})
+    assert "=" not in cursor  # 放进 URL 参数时不需要转义
+    assert decode_cursor(cursor) == {"id": 42}
+
+
+@pytest.mark.parametrize("cursor", ["zzz", "bm90LWpzb24", "WzFd"])  # 乱码 / 非 JSON / 非 dict
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,170 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.product import Product
+from app.schemas.product import MAX_BULK_OPERATIONS, ProductBulkRequest
+from app.services.product_bulk import ConcurrentChange, ProductBulkService
+
+
+async def _product(db, owner, sku: str, **kwargs) -> Product:
+    product = Product(owner_id=owner.id, sku=sku, title=f"title {sku}", price=10.0, stock_qty=5, **kwargs)
+    db.add(product)
+    await db.flush()
+    return product
+
+
+async def _apply(db, owner, operations: list[dict], allow_partial: bool = False):
+    request = ProductBulkRequest(operations=operations, allow_partial=allow_partial)
+    return await ProductBulkService.apply(db, owner if isinstance(owner, int) else owner.id, request)
+
+
+async def _skus(db, owner) -> dict[int, str]:
+    rows = (await db.execute(select(Product.id, Product.sku).filter(Product.owner_id == owner.id))).all()
+    return dict(rows)
+
+
+def _statuses(response) -> list[tuple[str, str | None]]:
+    return [(r.status, r.error) for r in response.results]
+
+
+async def test_not_owned_and_not_found_reject_whole_batch(db, make_user):
+    owner, other = await make_user(), await make_user()
+    mine = await _product(db, owner, "BULK-MINE")
+    theirs = await _product(db, other, "BULK-THEIRS")
+
+    response, audit = await _apply(db, owner, [
+        {"op": "update", "id": mine.id, "data": {"price": 99}},
+        {"op": "delete", "id": theirs.id},
+        {"op": "update", "id": 2_000_000_000, "data": {"price": 1}},
+    ])
+
+    assert _statuses(response) == [("skipped", None), ("error", "Product not found"), ("error", "Product not found")]
+    assert audit == []
+    await db.refresh(mine)
+    assert mine.price == 10.0
+    assert theirs.id in await _skus(db, other)
+
+
+async def test_duplicates_in_one_batch(db, make_user):
+    owner = await make_user()
+    product = await _product(db, owner, "BULK-DUP")
+
+    response, _ = await _apply(db, owner, [
+        {"op": "update", "id": product.id, "data": {"price": 1}},
+        {"op": "delete", "id": product.id},
+        {"op": "create", "data": {"sku": "BULK-NEW", "title": "a", "price": 1}},
+        {"op": "create", "data": {"sku": "BULK-NEW", "title": "b", "price": 1}},
+        {"op": "create", "data": {"sku": "BULK-DUP", "title": "c", "price": 1}},
+    ], allow_partial=True)
+
+    assert [r.status for r in response.results] == ["ok", "error", "ok", "error", "error"]
+    assert "重复" in response.results[3].error
+    assert "已存在" in response.results[4].error
+
+
+async def test_allow_partial_commits_valid_items_with_audit(db, make_user):
+    owner = await make_user()
+    keep, drop = await _product(db, owner, "BULK-KEEP"), await _product(db, owner, "BULK-DROP")
+
+    response, audit = await _apply(db, owner, [
+        {"op": "update", "id": keep.id, "data": {"price": 20, "title": "renamed"}},
+        {"op": "delete", "id": drop.id},
+        {"op": "create", "data": {"sku": "BULK-CREATED", "title": "new", "price": 3}},
+        {"op": "update", "id": keep.id, "data": {"title": None}},
+    ], allow_partial=True)
+
+    assert (response.succeeded, response.failed) == (3, 1)
+    created_id = response.results[2].id
+    assert await _skus(db, owner) == {keep.id: "BULK-KEEP", created_id: "BULK-CREATED"}
+    assert audit == [
+        {"action": "UPDATE", "resource_id": keep.id, "details": {"bulk": True, "fields": ["price", "title"]}},
+        {"action": "DELETE", "resource_id": drop.id, "details": {"bulk": True}},
+        {"action": "CREATE", "resource_id": created_id, "details": {"bulk": True}},
+    ]
+
+
+async def test_sku_reuse_rules(db, make_user):
+    owner = await make_user()
+    a, b = await _product(db, owner, "BULK-A"), await _product(db, owner, "BULK-B")
+    c = await _product(db, owner, "BULK-C")
+
+    # 同一批里互换 SKU 提前拒绝，不会等到数据库唯一约束报错
+    response, _ = await _apply(db, owner, [
+        {"op": "update", "id": a.id, "data": {"sku": "BULK-B"}},
+        {"op": "update", "id": b.id, "data": {"sku": "BULK-A"}},
+    ])
+    assert all(r.status == "error" and "互换" in r.error for r in response.results)
+
+    # 被删除的商品让出的 SKU 可以给更新用；被改名的商品让出的 SKU 可以给新增用
+    response, _ = await _apply(db, owner, [
+        {"op": "delete", "id": a.id},
+        {"op": "update", "id": b.id, "data": {"sku": "BULK-A"}},
+        {"op": "update", "id": c.id, "data": {"sku": "BULK-C2"}},
+        {"op": "create", "data": {"sku": "BULK-C", "title": "new", "price": 1}},
+    ])
+    assert response.failed == 0, response.results
+    assert sorted((await _skus(db, owner)).values()) == ["BULK-A", "BULK-C", "BULK-C2"]
+
+
+@pytest.mark.parametrize("allow_partial", [False, True])
+async def test_database_error_falls_back_to_savepoints(db, make_user, allow_partial):
+    owner = await make_user()
+    good, bad = await _product(db, owner, "BULK-GOOD"), await _product(db, owner, "BULK-BAD")
+    # allow_partial=False 出错时会整体 rollback (ORM 对象随之过期)，准备的数据要先提交
+    owner_id, good_id, bad_id = owner.id, good.id, bad.id
+    await db.commit()
+
+    # stock_qty 超出 integer 范围: 通过了预校验，整体执行时数据库报错
+    response, audit = await _apply(db, owner_id, [
+        {"op": "update", "id": good_id, "data": {"stock_qty": 7}},
+        {"op": "update", "id": bad_id, "data": {"stock_qty": 2 ** 40}},
+    ], allow_partial=allow_partial)
+
+    stock = dict((await db.execute(select(Product.id, Product.stock_qty).filter(Product.owner_id == owner_id))).all())
+    if allow_partial:
+        # 逐项重试: 只有出错的那一项失败
+        assert _statuses(response) == [("ok", None), ("error", "数据库写入失败")]
+        assert [entry["resource_id"] for entry in audit] == [good_id]
+        assert stock == {good_id: 7, bad_id: 5}
+    else:
+        assert [r.status for r in response.results] == ["error", "error"]
+        assert response.results[0].error == "数据库写入失败，整批已回滚"
+        assert audit == []
+        assert stock == {good_id: 5, bad_id: 5}
+
+
+async def test_writes_are_scoped_to_owner(db, make_user):
+    owner, other = await make_user(), await make_user()
+    theirs = await _product(db, other, "BULK-SCOPED")
+    request = ProductBulkRequest(operations=[{"op": "update", "id": theirs.id, "data": {"price": 1}},
+                                             {"op": "delete", "id": theirs.id}], allow_partial=True)
+
+    # 校验之后商品换了主人 (或者被删掉): 写入时按 owner_id 过滤，一行都不会改到
+    with pytest.raises(ConcurrentChange) as exc_info:
+        await ProductBulkService._execute_set(db, owner.id, request.operations, {0: {"price": 1}},
+                                              [None, None], [0, 1])
+    assert exc_info.value.indexes == [0, 1]
+    await db.refresh(theirs)
+    assert theirs.price == 10.0
+
+
+async def test_max_batch_stays_under_bind_param_limit(db, make_user):
+    owner = await make_user()
+    # 一条语句装不下 (asyncpg 上限 32767 个参数)，要拆成几条执行
+    fields = {"title": "t", "price": 2.5, "currency": "EUR", "stock_qty": 3, "supplier_cost": 1.0,
+              "description_original": "d", "source_url": "https://example.com"}
+    response, _ = await _apply(db, owner, [
+        {"op": "create", "data": {**fields, "sku": f"BULK-MAX-{i}"}} for i in range(MAX_BULK_OPERATIONS)
+    ])
+    assert response.succeeded == MAX_BULK_OPERATIONS, response.results[:3]
+    ids = [r.id for r in response.results]
+    assert len(set(ids)) == MAX_BULK_OPERATIONS
+
+    response, _ = await _apply(db, owner, [
+        {"op": "update", "id": product_id, "data": {**fields, "stock_qty": 9, "title": f"renamed {i}"}}
+        for i, product_id in enumerate(ids)
+    ])
+    assert response.succeeded == MAX_BULK_OPERATIONS, response.results[:3]
+    rows = (await db.execute(select(Product.title, Product.stock_qty).filter(Product.owner_id == owner.id))).all()
+    assert len(rows) == MAX_BULK_OPERATIONS
+    assert all(stock_qty == 9 and title.startswith("renamed ") for title, stock_qty in rows)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+
+from app.core.pagination import decode_cursor
+from app.db.session import task_session
+from app.models.product import Product
+from app.schemas.product import ProductListFilter
+from app.services.product_list import ProductListService
+
+
+def _sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_cursor_round_trip_with_sort():
+    product = Product(id=7, price=9.5, title="b", updated_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    cursor = decode_cursor(ProductListService.next_cursor(product, "-updated_at"))
+
+    sql = _sql(ProductListService.build_query(1, ProductListFilter(sort="-updated_at"), cursor))
+    assert "(products.updated_at, products.id) < ('2026-01-01 00:00:00+00:00', 7)" in sql
+    assert "ORDER BY products.updated_at DESC, products.id DESC" in sql
+
+    # 游标只能用于发出它的排序
+    with pytest.raises(ValueError):
+        ProductListService.build_query(1, ProductListFilter(sort="price"), cursor)
+
+
+def test_page_key_depends_on_filters():
+    plain = ProductListService.page_key(ProductListFilter(), None, 0, 10)
+    assert plain == ProductListService.page_key(ProductListFilter(), None, 0, 10)
+    assert plain != ProductListService.page_key(ProductListFilter(status="draft"), None, 0, 10)
+    assert plain != ProductListService.page_key(ProductListFilter(sort="-price"), None, 0, 10)
+
+
+# EXPLAIN 检查: 在同名临时表 (pg_temp 优先于 public) 里按模型定义建索引、造一份分布接近线上的数据，
+# 事务结束后回滚，不碰真实数据
+SEED_SQL = """
+INSERT INTO products (id, owner_id, sku, title, price, currency, stock_qty, is_ai_optimized, status,
+                      supplier_cost, created_at, updated_at)
+SELECT i, i % 50, 'SKU-' || i, 'Product ' || md5(i::text), (i % 1000) / 10.0, 'USD', i % 100, i % 10 <> 0,
+       (ARRAY['draft', 'published', 'archived'])[i % 3 + 1], 0,
+       now() - make_interval(mins => i * 30), now() - make_interval(mins => i * 30)
+FROM generate_series(1, 20000) AS i
+"""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("filters, index", [
+    (ProductListFilter(status="published", updated_since=datetime.now(timezone.utc) - timedelta(days=7)),
+     "ix_products_owner_id_status_updated_at"),
+    (ProductListFilter(price_min=10, price_max=20, sort="price"), "ix_products_owner_id_price_id"),
+    (ProductListFilter(sort="-updated_at"), "ix_products_owner_id_updated_at_id"),
+    (ProductListFilter(sort="title"), "ix_products_owner_id_title_id"),
+    (ProductListFilter(is_ai_optimized=False), "ix_products_owner_id_id_not_optimized"),
+])
+async def test_list_query_uses_index(filters, index):
+    async with task_session() as db:
+        try:
+            await db.connection()
+        except (OSError, SQLAlchemyError) as e:
+            pytest.skip(f"数据库不可用: {e}")
+
+        # 会话结束时回滚，临时表随之删除
+        await db.execute(text("CREATE TEMP TABLE products (LIKE public.products INCLUDING DEFAULTS)"))
+        await db.execute(text("ALTER TABLE products ADD PRIMARY KEY (id)"))
+        for model_index in Product.__table__.indexes:
+            if model_index.name.startswith("ix_products_owner_id"):
+                await db.execute(text(str(CreateIndex(model_index).compile(dialect=postgresql.dialect()))))
+        await db.execute(text(SEED_SQL))
+        await db.execute(text("ANALYZE products"))
+
+        query = ProductListService.build_query(7, filters).limit(10)
+        plan = "\n".join(row[0] for row in (await db.execute(text("EXPLAIN " + _sql(query)))).all())
+
+    assert index in plan, plan
@@ -0,0 +1,109 @@
+import pytest
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services.product_search import ProductSearchService
+from tests.conftest import auth_headers
+
+
+@pytest.fixture
+async def search_db(db, monkeypatch):
+    # pg_trgm 装不上时模糊匹配关闭，全文检索照常；触发器建在测试事务里，结束时一起回滚
+    monkeypatch.setattr(ProductSearchService, "fuzzy_enabled", True)
+    await ProductSearchService.ensure_extension(db)
+    await ProductSearchService.ensure_trigger(db)
+    return db
+
+
+@pytest.fixture
+async def fuzzy_db(search_db):
+    if not ProductSearchService.fuzzy_enabled:
+        pytest.skip("pg_trgm 不可用")
+    return search_db
+
+
+async def _product(db, owner, sku: str, title: str, **kwargs) -> Product:
+    product = Product(owner_id=owner.id, sku=sku, title=title, price=10.0, stock_qty=1, **kwargs)
+    db.add(product)
+    await db.flush()
+    return product
+
+
+async def test_search_ranking_highlight_and_owner_isolation(search_db, make_user):
+    db = search_db
+    owner, other = await make_user(), await make_user()
+    in_title = await _product(db, owner, "SRCH-1", "Wireless Bluetooth Headphones",
+                              description_original="Noise cancelling over-ear headphones with a long battery life")
+    in_description = await _product(db, owner, "SRCH-2", "Phone Case",
+                                    description_original="Slim case that also fits wireless headphones in the pocket")
+    await _product(db, owner, "SRCH-3", "USB Cable")
+    await _product(db, other, "SRCH-4", "Wireless Bluetooth Headphones")
+
+    hits = await ProductSearchService.search(db, owner.id, "wireless headphones", 0, 20)
+
+    # 标题 (权重 A) 命中的排在只有描述 (权重 C) 命中的前面；别人的商品不出现
+    assert [hit.id for hit in hits] == [in_title.id, in_description.id]
+    assert hits[0].score > hits[1].score
+    assert hits[0].title_highlight == "<mark>Wireless</mark> Bluetooth <mark>Headphones</mark>"
+    assert "<mark>wireless</mark>" in hits[1].snippet and "<mark>headphones</mark>" in hits[1].snippet
+    # 只有描述命中时标题原样返回
+    assert hits[1].title_highlight == "Phone Case"
+
+    # 分页
+    assert [hit.id for hit in await ProductSearchService.search(db, owner.id, "wireless headphones", 1, 20)] \
+        == [in_description.id]
+
+
+async def test_search_fuzzy_sku_and_title(fuzzy_db, make_user):
+    db = fuzzy_db
+    owner = await make_user()
+    cable = await _product(db, owner, "ZX-98765", "Braided Charging Cable")
+    await _product(db, owner, "AB-11111", "Desk Lamp")
+
+    # SKU 打错两位 (trgm 相似度)，全文检索不会命中
+    hits = await ProductSearchService.search(db, owner.id, "ZX-98756", 0, 20)
+    assert [hit.id for hit in hits] == [cable.id]
+    assert hits[0].snippet is None
+
+    # 标题里的词拼错
+    hits = await ProductSearchService.search(db, owner.id, "chargng", 0, 20)
+    assert [hit.id for hit in hits] == [cable.id]
+
+
+async def test_highlight_escapes_html(search_db, make_user):
+    db = search_db
+    owner = await make_user()
+    await _product(db, owner, "SRCH-XSS", "<script>alert(1)</script> Wireless & Co",
+                   description_original='Wireless <img src=x onerror="alert(1)"> speaker & "bass"')
+
+    [hit] = await ProductSearchService.search(db, owner.id, "wireless", 0, 20)
+
+    # 原文里的标签被转义，只留下高亮用的 <mark>
+    assert hit.title_highlight == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>Wireless</mark> &amp; Co"
+    assert "<img" not in hit.snippet
+    assert hit.snippet.startswith("<mark>Wireless</mark>") and "&amp; &quot;bass" in hit.snippet
+
+
+async def test_search_without_pg_trgm(search_db, make_user, monkeypatch):
+    db = search_db
+    monkeypatch.setattr(ProductSearchService, "fuzzy_enabled", False)
+    owner = await make_user()
+    cable = await _product(db, owner, "ZX-98765", "Braided Charging Cable")
+
+    # 模糊匹配关闭后只剩全文检索，不会用到 similarity() / % 运算符
+    assert [hit.id for hit in await ProductSearchService.search(db, owner.id, "charging cable", 0, 20)] \
+        == [cable.id]
+    assert await ProductSearchService.search(db, owner.id, "ZX-98756", 0, 20) == []
+
+
+async def test_search_endpoint(search_db, make_user, api):
+    owner, other = await make_user(), await make_user()
+    product = await _product(search_db, owner, "SRCH-API", "Ceramic Coffee Mug")
+    await _product(search_db, other, "SRCH-API-2", "Ceramic Coffee Mug")
+
+    response = await api.get(f"{settings.API_V1_STR}/products/search", params={"q": "coffee mug"},
+                             headers=auth_headers(owner))
+
+    assert response.status_code == 200
+    assert [hit["id"] for hit in response.json()] == [product.id]
+    assert response.json()[0]["title_highlight"] == "Ceramic <mark>Coffee</mark> <mark>Mug</mark>"
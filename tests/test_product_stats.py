@@ -0,0 +1,120 @@
+import importlib.util
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, insert, text, update
+
+from app.core.config import settings
+from app.models.product import Product
+from app.models.user import User
+from app.services import product_stats
+from app.services.product_stats import STAT_EXPRESSIONS, ProductStatsService
+
+MIGRATION = Path(__file__).resolve().parent.parent / "alembic" / "versions" / "f3c8a1d5b902_add_product_stats.py"
+
+
+def test_stat_expressions_match_trigger_migration():
+    # 对账用的聚合表达式和触发器里的必须一致，否则每次对账都会判定为有偏差
+    spec = importlib.util.spec_from_file_location("product_stats_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    assert migration.STAT_EXPRESSIONS == STAT_EXPRESSIONS
+    # 开发环境启动时补建的触发器和迁移里的一致
+    assert migration.TRIGGER_FUNCTION == product_stats.TRIGGER_FUNCTION
+    assert migration.TRIGGERS == product_stats.TRIGGERS
+
+
+@pytest.mark.asyncio
+async def test_stats_without_login(client):
+    response = await client.get(f"{settings.API_V1_STR}/products/stats")
+    assert response.status_code == 400
+
+
+ACTUAL_SQL = text(
+    f"SELECT {', '.join(f'coalesce(sum({expr}), 0) AS {name}' for name, expr in STAT_EXPRESSIONS.items())} "
+    f"FROM products WHERE owner_id = :owner_id"
+)
+
+
+async def _stats(db, owner_id: int) -> dict:
+    row = (await db.execute(text(f"SELECT {product_stats.COLUMNS} FROM product_stats WHERE owner_id = :owner_id"),
+                            {"owner_id": owner_id})).mappings().first()
+    return dict(row) if row else None
+
+
+async def _assert_matches_products(db, *owner_ids: int) -> None:
+    for owner_id in owner_ids:
+        actual = dict((await db.execute(ACTUAL_SQL, {"owner_id": owner_id})).mappings().one())
+        assert await _stats(db, owner_id) == actual
+
+
+def _rows(owner_id: int, *stock: int) -> list[dict]:
+    return [{"owner_id": owner_id, "sku": uuid.uuid4().hex, "title": "t", "price": 10.0, "supplier_cost": 4.0,
+             "stock_qty": qty, "status": "draft", "is_ai_optimized": False} for qty in stock]
+
+
+@pytest.fixture
+async def stats_db(db):
+    # 触发器建在测试事务里 (CREATE OR REPLACE)，结束时一起回滚
+    await ProductStatsService.ensure_triggers(db)
+    return db
+
+
+async def test_triggers_follow_every_statement(stats_db, make_user):
+    db = stats_db
+    a, b = await make_user(), await make_user()
+
+    # 一条多行 INSERT
+    ids = (await db.execute(insert(Product).values(_rows(a.id, 3, 0, 5)).returning(Product.id))).scalars().all()
+    await _assert_matches_products(db, a.id)
+    stats = await _stats(db, a.id)
+    assert (stats["product_count"], stats["total_stock"], stats["out_of_stock_count"]) == (3, 8, 1)
+    assert stats["stock_value"] == 80 and stats["margin_sum"] == 18
+
+    # 单行 UPDATE
+    await db.execute(update(Product).filter(Product.id == ids[1]).values(stock_qty=2, price=12.5))
+    await _assert_matches_products(db, a.id)
+    assert (await _stats(db, a.id))["out_of_stock_count"] == 0
+
+    # 换了所属用户: 一边减一边加
+    await db.execute(update(Product).filter(Product.id == ids[0]).values(owner_id=b.id))
+    await _assert_matches_products(db, a.id, b.id)
+    assert ((await _stats(db, a.id))["product_count"], (await _stats(db, b.id))["product_count"]) == (2, 1)
+
+    # 一条语句改多行、多个用户
+    await db.execute(update(Product).filter(Product.owner_id.in_([a.id, b.id])).values(status="published"))
+    await _assert_matches_products(db, a.id, b.id)
+    assert (await _stats(db, a.id))["published_count"] == 2
+
+    # DELETE
+    await db.execute(delete(Product).filter(Product.owner_id.in_([a.id, b.id])))
+    await _assert_matches_products(db, a.id, b.id)
+    assert (await _stats(db, b.id))["product_count"] == 0
+
+
+async def test_reconcile_fixes_drift(stats_db, make_user):
+    db = stats_db
+    owner, empty = await make_user(), await make_user()
+    await db.execute(insert(Product).values(_rows(owner.id, 1, 2)))
+    await db.execute(text("UPDATE product_stats SET product_count = 99, stock_value = 0 WHERE owner_id = :owner_id"),
+                     {"owner_id": owner.id})
+
+    assert owner.id in await ProductStatsService.reconcile(db)
+    await _assert_matches_products(db, owner.id)
+
+    # 还没有汇总行的用户也能重新计算 (写入全 0 的一行)
+    await ProductStatsService.recompute(db, empty.id)
+    assert (await _stats(db, empty.id))["product_count"] == 0
+
+
+async def test_deleting_user_removes_summary(stats_db, make_user):
+    db = stats_db
+    owner = await make_user()
+    await db.execute(insert(Product).values(_rows(owner.id, 1)))
+    await db.execute(delete(Product).filter(Product.owner_id == owner.id))
+    assert await _stats(db, owner.id) is not None
+
+    # 汇总行的外键是 ON DELETE CASCADE，不会挡住删除用户
+    await db.execute(delete(User).filter(User.id == owner.id))
+    assert await _stats(db, owner.id) is None
@@ -7,4 +7,38 @@ async def test_create_product_without_login(client): # <--- 直接注入 client
         f"{settings.API_V1_STR}/products/",
         json={"title": "test", "sku": "test_001", "price": 10.0}
     )
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_bulk_without_login(client):
+    response = await client.post(
+        f"{settings.API_V1_STR}/products/bulk",
+        json={"operations": [{"op": "delete", "id": 1}]}
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_request_validation():
+    from pydantic import ValidationError
+    from app.schemas.product import BulkUpdate, MAX_BULK_OPERATIONS, ProductBulkRequest
+
+    request = ProductBulkRequest(operations=[{"op": "update", "id": 1, "data": {"price": 1}}])
+    assert isinstance(request.operations[0], BulkUpdate)
+    assert request.allow_partial is False
+
+    with pytest.raises(ValidationError):
+        ProductBulkRequest(operations=[])
+    with pytest.raises(ValidationError):
+        ProductBulkRequest(operations=[{"op": "delete", "id": i} for i in range(MAX_BULK_OPERATIONS + 1)])
+
+
+@pytest.mark.asyncio
+async def test_patch_product_without_login(client):
+    response = await client.patch(f"{settings.API_V1_STR}/products/1", json={"price": 1.0})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_products_without_login(client):
+    response = await client.get(f"{settings.API_V1_STR}/products/search", params={"q": "shoes"})
+    assert response.status_code == 400
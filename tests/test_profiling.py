@@ -0,0 +1,46 @@
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.profiling import QueryBudgetExceeded, QueryProfilerMiddleware, profile_queries, query_budget
+
+
+def _fake_query(seconds: float = 0.001) -> None:
+    # 模拟引擎事件: 执行前检查预算，执行后记录耗时
+    profiling.before_query("SELECT 1")
+    profiling.record_query("SELECT 1", seconds)
+
+
+async def test_budget_is_enforced_only_in_strict_mode(monkeypatch):
+    with profile_queries() as stats:
+        await query_budget(1)()
+        _fake_query()
+        _fake_query()  # 非严格模式只统计
+        assert stats.count == 2
+
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_STRICT", True)
+    with profile_queries():
+        await query_budget(1)()
+        _fake_query()
+        with pytest.raises(QueryBudgetExceeded):
+            _fake_query()
+
+
+async def test_debug_mode_adds_query_headers(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", True)
+    app = FastAPI()
+    app.add_middleware(QueryProfilerMiddleware)
+
+    @app.get("/items", dependencies=[Depends(query_budget(5))])
+    async def items():
+        _fake_query(0.002)
+        _fake_query(0.003)
+        return []
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/items")
+
+    assert response.headers["x-db-queries"] == "2"
+    assert response.headers["x-db-time"] == "5.00"
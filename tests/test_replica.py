@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.api import deps
+from app.core.config import settings
+from app.db.replica import ReplicaRouter
+from app.db.session import AsyncSessionLocal, build_engine
+from app.schemas.user import UserPrincipal
+
+# 只创建引擎不连接，路由逻辑不需要真的数据库
+REPLICA_URLS = [
+    "postgresql+asyncpg://postgres@replica-1:5432/saas_db",
+    "postgresql+asyncpg://postgres@replica-2:5432/saas_db",
+]
+
+
+async def test_without_replicas_reads_go_to_primary():
+    router = ReplicaRouter(AsyncSessionLocal, [])
+    assert await router.session_factory_for(1) is AsyncSessionLocal
+
+
+async def test_reads_rotate_over_healthy_replicas_only():
+    router = ReplicaRouter(AsyncSessionLocal, REPLICA_URLS)
+    assert await router.session_factory_for(1) is AsyncSessionLocal  # 还没检查过延迟
+
+    router.lag = [0.0, 0.5]
+    picked = [await router.session_factory_for(1) for _ in range(4)]
+    assert picked == [router.sessions[0], router.sessions[1]] * 2
+
+    router.lag = [60.0, 0.5]  # 副本 0 延迟过大
+    assert {await router.session_factory_for(1) for _ in range(4)} == {router.sessions[1]}
+
+    router.lag = [60.0, None]  # 都不可用
+    assert await router.session_factory_for(1) is AsyncSessionLocal
+
+
+async def test_user_reads_own_writes_from_primary():
+    router = ReplicaRouter(AsyncSessionLocal, REPLICA_URLS)
+    router.lag = [0.0, 0.0]
+
+    await router.mark_write(1)
+    assert await router.session_factory_for(1) is AsyncSessionLocal
+    assert await router.session_factory_for(2) in router.sessions
+
+
+@pytest.fixture
+async def sqlite_router(tmp_path):
+    # 两个真实的数据库 (SQLite 文件): 主库和副本各有一份 products，副本上的数据比主库旧
+    pytest.importorskip("aiosqlite")
+    primary_engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    primary = sessionmaker(bind=primary_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    router = ReplicaRouter(primary, [f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    for engine in (primary_engine, router.engines[0]):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE products (owner_id INTEGER, title TEXT)"))
+            await conn.execute(text("INSERT INTO products VALUES (1, 'replicated')"))
+    yield router
+    await router.dispose()
+    await primary_engine.dispose()
+
+
+async def _read_titles(router: ReplicaRouter, user_id: int, monkeypatch) -> list[str]:
+    # 走真实的 get_read_db 依赖
+    monkeypatch.setattr(deps, "replica_router", router)
+    principal = UserPrincipal(id=user_id, email=f"{user_id}@example.com")
+    sessions = deps.get_read_db(current_user=principal)
+    db = await anext(sessions)
+    try:
+        return list((await db.execute(text("SELECT title FROM products ORDER BY title"))).scalars())
+    finally:
+        await sessions.aclose()
+
+
+async def test_routing_with_real_databases(sqlite_router, monkeypatch):
+    router = sqlite_router
+    await router.check()
+    assert router.lag == [0.0]
+
+    # 写入走主库 (get_db / router.primary)，副本还没同步到
+    async with router.primary() as db:
+        await db.execute(text("INSERT INTO products VALUES (1, 'new')"))
+        await db.commit()
+    await router.mark_write(1)
+
+    # 刚写过的用户读主库 (read-your-writes)，其他用户读副本
+    assert await _read_titles(router, 1, monkeypatch) == ["new", "replicated"]
+    assert await _read_titles(router, 2, monkeypatch) == ["replicated"]
+
+    # 副本延迟超过阈值: 所有读请求回到主库
+    router.lag = [settings.REPLICA_MAX_LAG_SECONDS + 1]
+    assert await _read_titles(router, 2, monkeypatch) == ["new", "replicated"]
+
+    # 下一次检查延迟恢复正常后重新使用副本
+    await router.check()
+    assert await _read_titles(router, 2, monkeypatch) == ["replicated"]
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import bcrypt
+import pytest
+from datetime import timedelta
+from fastapi import HTTPException
+from jose import JWTError
+
+from app.core import security
+from app.core.config import settings
+
+
+def test_decode_access_token_is_cached():
+    token = security.create_access_token("a@example.com")
+    claims = security.decode_access_token(token)
+
+    assert claims["sub"] == "a@example.com"
+    assert security.decode_access_token(token) is claims  # 第二次直接命中缓存
+
+
+def test_decode_access_token_rejects_expired_token():
+    token = security.create_access_token("a@example.com", expires_delta=timedelta(seconds=-1))
+    with pytest.raises(JWTError):
+        security.decode_access_token(token)
+
+
+def test_secret_rotation_clears_token_cache(monkeypatch):
+    token = security.create_access_token("a@example.com")
+    security.decode_access_token(token)
+
+    monkeypatch.setattr(settings, "SECRET_KEY", settings.SECRET_KEY + "-rotated")
+    with pytest.raises(JWTError):
+        security.decode_access_token(token)
+
+
+async def test_hash_pool_sheds_load_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 2)
+    release = threading.Event()
+    busy = [asyncio.create_task(security._run_in_hash_pool(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await security._run_in_hash_pool(lambda: None)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "1"}
+
+    release.set()
+    await asyncio.gather(*busy)
+    assert security._hash_pending == 0
+    assert await security._run_in_hash_pool(lambda: "ok") == "ok"
+
+
+def _hash_with_rounds(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+async def test_verify_returns_new_hash_when_rounds_differ():
+    old_hash = _hash_with_rounds("secret", 4)
+    verified, new_hash = await security.verify_and_update_password("secret", old_hash)
+    assert verified
+    assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    # 已经是当前参数的 hash 不需要更新；密码错误时不返回新 hash
+    assert await security.verify_and_update_password("secret", new_hash) == (True, None)
+    assert await security.verify_and_update_password("wrong", old_hash) == (False, None)
+
+
+async def test_login_rehashes_password_with_old_rounds(api, make_user):
+    user = await make_user(hashed_password=_hash_with_rounds("secret", 4))
+
+    response = await api.post(f"{settings.API_V1_STR}/login/access-token",
+                              data={"username": user.email, "password": "secret"})
+
+    assert response.status_code == 200
+    assert user.hashed_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert security.verify_password("secret", user.hashed_password)
@@ -0,0 +1,119 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from app.api import deps
+from app.core import security
+from app.db.redis import new_redis_client
+from app.db.session import engine
+from app.models.user import User
+from app.schemas.user import UserPrincipal
+from app.services.user_cache import INVALIDATE_CHANNEL, PrincipalCache
+
+# 只读请求，不会触发 read-your-writes 标记
+REQUEST = Request({"type": "http", "method": "GET", "headers": []})
+
+
+class NoQueryDB:
+    """缓存命中时不应该碰数据库"""
+
+    async def execute(self, *args, **kwargs):
+        raise AssertionError("缓存命中时不应该查库")
+
+
+def _principal(**kwargs) -> UserPrincipal:
+    return UserPrincipal(id=1, email=f"{uuid.uuid4().hex}@example.com", **kwargs)
+
+
+async def test_cache_hit_makes_no_db_query():
+    principal = _principal()
+    PrincipalCache._local.set(principal.email, principal)
+    token = security.create_access_token(principal.email)
+
+    assert await deps.get_current_user(request=REQUEST, db=NoQueryDB(), token=token) is principal
+
+
+async def test_inactive_user_is_rejected():
+    principal = _principal(is_active=False)
+    PrincipalCache._local.set(principal.email, principal)
+    token = security.create_access_token(principal.email)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await deps.get_current_user(request=REQUEST, db=NoQueryDB(), token=token)
+    assert exc_info.value.status_code == 400
+
+
+async def _wait_until(condition, timeout: float = 2) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def test_invalidation_over_pubsub_evicts_other_processes():
+    publisher = new_redis_client()
+    try:
+        await publisher.ping()
+    except (OSError, RedisError) as e:
+        await publisher.aclose()
+        pytest.skip(f"Redis 不可用: {e}")
+
+    listener = asyncio.create_task(PrincipalCache.listen())
+    try:
+        # 等订阅建立好
+        for _ in range(200):
+            if (await publisher.pubsub_numsub(INVALIDATE_CHANNEL))[0][1]:
+                break
+            await asyncio.sleep(0.01)
+
+        principal = _principal()
+        PrincipalCache._local.set(principal.email, principal)
+        # 模拟另一个进程发出的失效通知 (不经过本进程的 invalidate)
+        await publisher.publish(INVALIDATE_CHANNEL, principal.email)
+
+        assert await _wait_until(lambda: PrincipalCache._local.get(principal.email) is None)
+    finally:
+        listener.cancel()
+        await publisher.aclose()
+
+
+async def test_committing_user_change_invalidates_cache():
+    try:
+        conn = await engine.connect()
+    except (OSError, SQLAlchemyError) as e:
+        pytest.skip(f"数据库不可用: {e}")
+
+    email = f"{uuid.uuid4().hex}@example.com"
+    transaction = await conn.begin()
+    try:
+        async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False) as db:
+            user = User(email=email, hashed_password="x", is_active=True, is_superuser=False)
+            db.add(user)
+            await db.commit()
+            PrincipalCache._local.set(email, UserPrincipal.model_validate(user))
+
+            user.is_active = False
+            await db.commit()
+            # 本进程立即生效
+            assert PrincipalCache._local.get(email) is None
+            await asyncio.gather(*PrincipalCache._pending, return_exceptions=True)
+
+            # 回滚的修改不触发
+            principal = UserPrincipal.model_validate(user)
+            PrincipalCache._local.set(email, principal)
+            user.full_name = "rolled back"
+            await db.flush()
+            await db.rollback()
+            assert PrincipalCache._local.get(email) is not None
+    finally:
+        PrincipalCache._local.pop(email)
+        await transaction.rollback()
+        await conn.close()